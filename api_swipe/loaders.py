@@ -0,0 +1,140 @@
+from collections import defaultdict
+from collections.abc import Mapping
+from contextvars import ContextVar
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+
+from rest_framework.serializers import ListSerializer
+
+
+_current_loader = ContextVar('loader', default=None)
+
+
+class Loader:
+    """
+    Request-scoped identity map of model instances, which are referenced by
+    ids in request data. Ids may be registered beforehand, and then all
+    pending ids of the model are fetched by one in_bulk() on first load, so
+    list payloads do not make query per item and repeated references are
+    fetched only once.
+    """
+
+    def __init__(self):
+        self.instances = defaultdict(dict)  # (model, field) -> {key: instance or None, if it does not exist}
+        self.pending = defaultdict(set)
+
+    @staticmethod
+    def normalize(queryset, key, field: str):
+        """
+        :return: key converted to python type of the field or None, if key is invalid
+        """
+        meta = queryset.model._meta
+        model_field = meta.pk if field == 'pk' else meta.get_field(field)
+        try:
+            return model_field.to_python(key)
+        except (DjangoValidationError, TypeError):
+            return None
+
+    def register(self, queryset, keys, field: str = 'pk') -> None:
+        """
+        Remembers keys, which will be fetched together with the next load.
+        :param queryset: QuerySet, from which objects are taken
+        :param keys: iterable of ids or values of unique field
+        :param field: unique field
+        :return: None
+        """
+        cache = self.instances[(queryset.model, field)]
+        for key in keys:
+            key = self.normalize(queryset, key, field)
+            if key is not None and key not in cache:
+                self.pending[(queryset.model, field)].add(key)
+
+    def load(self, queryset, key, field: str = 'pk'):
+        """
+        :param queryset: QuerySet, from which objects are taken
+        :param key: id or value of unique field
+        :param field: unique field
+        :return: instance or None, if it does not exist
+        """
+        key = self.normalize(queryset, key, field)
+        if key is None:
+            return None
+        cache = self.instances[(queryset.model, field)]
+        if key not in cache:
+            keys = self.pending.pop((queryset.model, field), set()) | {key}
+            found = queryset.in_bulk(keys, field_name=field)
+            for pending_key in keys:
+                cache[pending_key] = found.get(pending_key)
+        return cache[key]
+
+
+def get_loader() -> Loader:
+    """
+    :return: loader of current request, or new one outside of requests
+    """
+    return _current_loader.get() or Loader()
+
+
+class LoaderMiddleware:
+    """
+    Gives every request its own Loader.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _current_loader.set(Loader())
+        try:
+            return self.get_response(request)
+        finally:
+            _current_loader.reset(token)
+
+
+class LoadedRelationMixin:
+    """
+    For serializers and fields, which accept id of related object instead
+    of the object. Instances are taken from request-scoped loader.
+    """
+    loader_queryset = None
+    loader_field = 'pk'
+
+    def prime(self, keys) -> None:
+        get_loader().register(self.loader_queryset, keys, self.loader_field)
+
+    def load(self, key):
+        return get_loader().load(self.loader_queryset, key, self.loader_field)
+
+
+def prime(serializer, items) -> None:
+    """
+    Registers ids of related objects of all items in the loader, before
+    items are validated one by one.
+    :param serializer: child serializer of the list
+    :param items: list of raw items
+    :return: None
+    """
+    if isinstance(serializer, LoadedRelationMixin):
+        serializer.prime(key for key in items if not isinstance(key, (list, Mapping)))
+        return
+
+    for field in getattr(serializer, 'fields', {}).values():
+        if field.read_only:
+            continue
+        values = [item.get(field.field_name) for item in items if isinstance(item, Mapping)]
+        if isinstance(field, ListSerializer):
+            field, values = field.child, [value for nested in values if isinstance(nested, list) for value in nested]
+        if isinstance(field, LoadedRelationMixin):
+            field.prime(value for value in values if value is not None and not isinstance(value, (list, Mapping)))
+
+
+class PrimingListSerializer(ListSerializer):
+    """
+    List serializer, which resolves related objects of all items by one
+    query per model.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            prime(self.child, data)
+        return super().to_internal_value(data)
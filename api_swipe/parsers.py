@@ -0,0 +1,44 @@
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+from django.conf import settings
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+
+class ORJSONParser(JSONParser):
+    """
+    JSON parser on top of orjson, which falls back to JSONParser if orjson
+    is not installed or request body is not in UTF-8.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class MessagePackParser(BaseParser):
+    """
+    Parses request body in MessagePack format.
+    """
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (msgpack.UnpackException, msgpack.ExtraData, ValueError) as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
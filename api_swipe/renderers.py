@@ -0,0 +1,58 @@
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON renderer on top of orjson. Output matches JSONRenderer: values,
+    which orjson does not know or formats differently (lazy translations,
+    Decimals, datetimes, querysets), are passed to DRF's encoder. Falls back
+    to JSONRenderer if orjson is not installed or indent other than 2 is
+    requested, e.g. by browsable API.
+    """
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY \
+        if orjson else None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent not in (None, 2):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        options = self.options | orjson.OPT_INDENT_2 if indent else self.options
+        ret = orjson.dumps(data, default=JSONEncoder().default, option=options)
+        # same escaping as JSONRenderer, so that output is valid javascript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Renders the same data as JSON renderers in compact binary MessagePack
+    format for clients, which send Accept: application/msgpack. Values
+    unknown to msgpack are converted by DRF's JSON encoder, so the payload
+    decodes into exactly the same structure as JSON.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=JSONEncoder().default, use_bin_type=True)
@@ -1,5 +1,6 @@
 import os.path
 from datetime import timedelta
+from importlib.util import find_spec
 from pathlib import Path
 import environ
 from celery.schedules import crontab
@@ -65,6 +66,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api_swipe.loaders.LoaderMiddleware',
 ]
 
 ROOT_URLCONF = 'api_swipe.urls'
@@ -171,10 +173,23 @@ REST_AUTH = {
 }
 
 
+# binary format is offered to clients only if msgpack is installed
+MSGPACK_RENDERER_CLASSES = ('api_swipe.renderers.MessagePackRenderer',) if find_spec('msgpack') else ()
+MSGPACK_PARSER_CLASSES = ('api_swipe.parsers.MessagePackParser',) if find_spec('msgpack') else ()
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api_swipe.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ) + MSGPACK_RENDERER_CLASSES,
+    'DEFAULT_PARSER_CLASSES': (
+        'api_swipe.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ) + MSGPACK_PARSER_CLASSES,
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20
@@ -235,6 +250,10 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND')
 CELERY_TIMEZONE = 'Europe/Kiev'
 
+REDIS_URL = env('REDIS_URL', default=CELERY_BROKER_URL)
+
+SIMILARITY_INDEX_DIR = env('SIMILARITY_INDEX_DIR', default=str(BASE_DIR / 'var' / 'similarity'))
+
 CELERY_BEAT_SCHEDULE = {
     'every-day-carrying-on-subscription': {
         'task': 'users.tasks.carry_on_activation',
@@ -243,6 +262,50 @@ CELERY_BEAT_SCHEDULE = {
     'every-day-deactivating-subscription': {
         'task': 'users.tasks.deactivate_subscription',
         'schedule': crontab(minute=3, hour=0)
+    },
+    'every-15-minutes-recomputing-rank-scores': {
+        'task': 'flats.tasks.recompute_rank_scores',
+        'schedule': crontab(minute='*/15')
+    },
+    'every-5-minutes-expiring-promotions': {
+        'task': 'flats.tasks.expire_promotions',
+        'schedule': crontab(minute='*/5')
+    },
+    'every-5-seconds-flushing-swipe-events': {
+        'task': 'flats.tasks.flush_swipe_events',
+        'schedule': timedelta(seconds=5)
+    },
+    'every-10-minutes-updating-similarity-index': {
+        'task': 'flats.tasks.update_similarity_index',
+        'schedule': crontab(minute='*/10')
+    },
+    'every-day-rebuilding-similarity-index': {
+        'task': 'flats.tasks.rebuild_similarity_index',
+        'schedule': crontab(minute=30, hour=3)
+    },
+    'every-day-sending-saved-filter-digests': {
+        'task': 'users.tasks.send_saved_filter_digest_emails',
+        'schedule': crontab(minute=0, hour=9)
+    },
+    'every-day-reconciling-saved-filters': {
+        'task': 'users.tasks.reconcile_saved_filters',
+        'schedule': crontab(minute=0, hour=4)
+    },
+    'every-day-cleaning-tombstones': {
+        'task': 'flats.tasks.clean_tombstones',
+        'schedule': crontab(minute=30, hour=4)
+    },
+    'every-day-archiving-announcements': {
+        'task': 'flats.tasks.archive_dead_announcements',
+        'schedule': crontab(minute=0, hour=5)
+    },
+    'every-day-creating-message-partitions': {
+        'task': 'users.tasks.create_upcoming_message_partitions',
+        'schedule': crontab(minute=15, hour=0)
+    },
+    'every-hour-resuming-purges': {
+        'task': 'flats.tasks.resume_purges',
+        'schedule': crontab(minute=45)
     }
 }
 
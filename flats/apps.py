@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FlatsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'flats'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,77 @@
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ArchivedAnnouncement, ArchivedFavorite, ArchivedPromotion, ChessBoardFlat, Favorite, Promotion
+
+
+ARCHIVE_RETENTION = timedelta(days=180)
+ARCHIVE_BATCH_SIZE = 1000
+
+
+def get_archivable_queryset(now=None):
+    """
+    :return: QuerySet<ChessBoardFlat>, which have been called off or rejected
+    longer than retention period. Announcements waiting for moderation are
+    not archived, however old they are.
+    """
+    now = now or timezone.now()
+    return ChessBoardFlat.all_objects \
+        .filter(Q(called_off=True) | Q(rejection_reason__isnull=False), updated_at__lt=now - ARCHIVE_RETENTION)
+
+
+def copy_rows(source, target, column: str, ids: list, archived_at) -> None:
+    """
+    Copies rows by INSERT ... SELECT, without loading them into python.
+    Columns of the archive table are the same as in the source one.
+    :param source: model of live table
+    :param target: model of archive table
+    :param column: column of the source table, which is compared with ids
+    :param ids: list of ids of announcements
+    :param archived_at: datetime
+    :return: None
+    """
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in target._meta.concrete_fields
+                        if field.column != 'archived_at')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {connection.ops.quote_name(target._meta.db_table)} ({columns}, archived_at) '
+            f'SELECT {columns}, %s FROM {connection.ops.quote_name(source._meta.db_table)} '
+            f'WHERE {connection.ops.quote_name(column)} = ANY(%s)',
+            [archived_at, ids]
+        )
+
+
+def archive_announcements(batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Moves dead announcements with their promotions and favorites to
+    archive tables in batches. Every batch is copied and deleted in one
+    transaction, rows locked by concurrent run are skipped.
+    :param batch_size: int
+    :return: amount of archived announcements
+    """
+    now = timezone.now()
+    archived = 0
+
+    while True:
+        with transaction.atomic():
+            ids = list(get_archivable_queryset(now)
+                       .order_by('id')
+                       .select_for_update(skip_locked=True)
+                       .values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+
+            copy_rows(ChessBoardFlat, ArchivedAnnouncement, 'id', ids, now)
+            copy_rows(Promotion, ArchivedPromotion, 'chessboard_flat_id', ids, now)
+            copy_rows(Favorite, ArchivedFavorite, 'chessboard_flat_id', ids, now)
+
+            # favorites are deleted through ORM, so owners get tombstones for delta sync
+            Favorite.objects.filter(chessboard_flat_id__in=ids).delete()
+            Promotion.objects.filter(chessboard_flat_id__in=ids).delete()
+            ChessBoardFlat.all_objects.filter(id__in=ids).delete()
+        archived += len(ids)
+
+    return archived
@@ -0,0 +1,67 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+class NotModified(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag and Last-Modified validators to read actions of a viewset and
+    answers 304 Not Modified right after permission checks, before object is
+    fetched and serialized. Viewset defines get_<action>_validator() for
+    every action listed in conditional_actions, which returns tuple of
+    values cheaply fetched from database, e.g. change-tracking columns and
+    aggregates, or None if object does not exist.
+    """
+    conditional_actions = ()
+
+    def get_conditional_validator(self):
+        """
+        :return: (values, last modification datetime or None) or None
+        """
+        return getattr(self, f'get_{self.action}_validator')()
+
+    def get_etag(self, values) -> str:
+        # representation depends on query params (pagination) and negotiated format
+        source = repr((values, sorted(self.request.query_params.lists()), self.request.accepted_media_type))
+        return quote_etag(hashlib.md5(source.encode()).hexdigest())
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.conditional_headers = self.conditional_validator = None
+        if request.method not in ('GET', 'HEAD') or self.action not in self.conditional_actions:
+            return
+
+        # kept for the action, which may reuse it, e.g. as cache key
+        validator = self.conditional_validator = self.get_conditional_validator()
+        if validator is None:
+            return
+        values, last_modified = validator
+        etag = self.get_etag(values)
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+        self.conditional_headers = {'ETag': etag}
+        if last_modified:
+            self.conditional_headers['Last-Modified'] = http_date(last_modified)
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'conditional_headers', None) and response.status_code in (200, 304):
+            for header, value in self.conditional_headers.items():
+                response[header] = value
+            # clients have to revalidate instead of using heuristic freshness
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,161 @@
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+
+from users.matching import unmatch_announcements
+from users.models import Conversation, Message, SavedFilter, SavedFilterMatch, User, UserSubscription
+from .models import AdditionInComplex, ArchivedAnnouncement, ArchivedFavorite, ArchivedPromotion, ChessBoard, \
+    ChessBoardFlat, Corps, Document, Favorite, Flat, FlatImport, Floor, Gallery, News, Photo, Promotion, \
+    ResidentialComplex, Section
+
+
+PURGE_CHUNK_SIZE = 500
+
+
+def mark_for_deletion(obj) -> None:
+    """
+    Hides user or RC from all querysets at once. Rows, which depend on it,
+    are removed later by purge task.
+    :param obj: User or ResidentialComplex
+    :return: None
+    """
+    type(obj)._base_manager.filter(pk=obj.pk).update(pending_deletion=True)
+
+
+def remove_files(names: list) -> None:
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except OSError:
+            pass
+
+
+def get_file_names(model, ids: list) -> list:
+    """
+    :return: names of files stored in file fields of the rows
+    """
+    file_fields = [field.attname for field in model._meta.concrete_fields if isinstance(field, models.FileField)]
+    if not file_fields:
+        return []
+    rows = model._base_manager.filter(pk__in=ids).values_list(*file_fields)
+    return [name for row in rows for name in row if name]
+
+
+def delete_in_chunks(queryset, before_delete=None, chunk_size: int = PURGE_CHUNK_SIZE) -> int:
+    """
+    Deletes rows of the queryset by chunks of primary keys, every chunk in
+    its own short transaction, so neither memory nor locks grow with amount
+    of rows. Galleries of deleted rows are deleted as well, files are
+    removed from the storage after commit. Rows, which were deleted by
+    previous run, are just not found again, so it is safe to retry.
+    :param queryset: QuerySet of rows to delete
+    :param before_delete: function, which takes ids of the chunk before it is deleted
+    :param chunk_size: int
+    :return: amount of deleted rows
+    """
+    model = queryset.model
+    has_gallery = any(isinstance(field, models.OneToOneField) and field.related_model is Gallery
+                      for field in model._meta.concrete_fields)
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                return deleted
+            if before_delete is not None:
+                before_delete(ids)
+
+            names = get_file_names(model, ids)
+            gallery_ids = list(model._base_manager.filter(pk__in=ids).values_list('gallery_id', flat=True)) \
+                if has_gallery else []
+            model._base_manager.filter(pk__in=ids).delete()
+            if gallery_ids:
+                names += get_file_names(Photo, list(Photo.objects.filter(gallery_id__in=gallery_ids)
+                                                    .values_list('id', flat=True)))
+                Photo.objects.filter(gallery_id__in=gallery_ids).delete()
+                Gallery.objects.filter(id__in=gallery_ids).delete()
+            transaction.on_commit(lambda names=names: remove_files(names))
+        deleted += len(ids)
+
+
+def nullify_in_chunks(queryset, field: str, chunk_size: int = PURGE_CHUNK_SIZE) -> int:
+    """
+    Sets nullable foreign key to NULL by chunks, as on_delete=SET_NULL does
+    for all rows at once.
+    :return: amount of updated rows
+    """
+    updated = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return updated
+        queryset.model._base_manager.filter(pk__in=ids).update(**{field: None})
+        updated += len(ids)
+
+
+def delete_announcement_dependents(ids: list) -> None:
+    """
+    Removes matches of saved filters and promotions with their logos
+    before announcements are deleted.
+    """
+    unmatch_announcements(ids)
+    delete_in_chunks(Promotion.objects.filter(chessboard_flat_id__in=ids))
+
+
+def delete_archived_dependents(ids: list) -> None:
+    delete_in_chunks(ArchivedPromotion.objects.filter(chessboard_flat_id__in=ids))
+
+
+def purge_residential_complex(residential_complex_id: int) -> bool:
+    """
+    Deletes RC, which is pending deletion, with all its announcements,
+    flats, chessboards, documents and files.
+    :param residential_complex_id: int
+    :return: False, if there is no such RC pending deletion
+    """
+    residential_complex = ResidentialComplex.all_objects \
+        .filter(pk=residential_complex_id, pending_deletion=True) \
+        .first()
+    if residential_complex is None:
+        return False
+
+    delete_in_chunks(ChessBoardFlat.all_objects.filter(residential_complex_id=residential_complex_id),
+                     before_delete=delete_announcement_dependents)
+    delete_in_chunks(ArchivedAnnouncement.objects.filter(residential_complex_id=residential_complex_id),
+                     before_delete=delete_archived_dependents)
+    for model in (Favorite, Flat, ChessBoard, Floor, Section, Corps, Document, News, AdditionInComplex,
+                  FlatImport):
+        delete_in_chunks(model.objects.filter(residential_complex_id=residential_complex_id))
+    delete_in_chunks(ResidentialComplex.all_objects.filter(pk=residential_complex_id))
+    return True
+
+
+def purge_user(user_id: int) -> bool:
+    """
+    Deletes user, who is pending deletion, with RC, announcements,
+    favorites, saved filters, subscriptions and files. Messages of the
+    user stay without sender or receiver.
+    :param user_id: int
+    :return: False, if there is no such user pending deletion
+    """
+    user = User.all_objects.filter(pk=user_id, pending_deletion=True).first()
+    if user is None:
+        return False
+
+    for residential_complex_id in ResidentialComplex.all_objects.filter(owner_id=user_id).values_list('id', flat=True):
+        mark_for_deletion(ResidentialComplex(pk=residential_complex_id))
+        purge_residential_complex(residential_complex_id)
+
+    delete_in_chunks(ChessBoardFlat.all_objects.filter(creator_id=user_id),
+                     before_delete=delete_announcement_dependents)
+    delete_in_chunks(ArchivedAnnouncement.objects.filter(creator_id=user_id), before_delete=delete_archived_dependents)
+    nullify_in_chunks(ChessBoardFlat.all_objects.filter(claimed_by_id=user_id), 'claimed_by')
+    nullify_in_chunks(Message.objects.filter(sender_id=user_id), 'sender')
+    nullify_in_chunks(Message.objects.filter(receiver_id=user_id), 'receiver')
+    nullify_in_chunks(Conversation.objects.filter(user_id=user_id), 'user')
+    nullify_in_chunks(Conversation.objects.filter(manager_id=user_id), 'manager')
+    delete_in_chunks(SavedFilterMatch.objects.filter(saved_filter__user_id=user_id))
+    for model in (Favorite, ArchivedFavorite, SavedFilter, UserSubscription):
+        delete_in_chunks(model.objects.filter(user_id=user_id))
+    delete_in_chunks(FlatImport.objects.filter(creator_id=user_id))
+    delete_in_chunks(User.all_objects.filter(pk=user_id))
+    return True
@@ -0,0 +1,103 @@
+import csv
+import io
+
+from django.db import transaction
+
+from api_swipe.renderers import ORJSONRenderer
+
+
+EXPORT_CHUNK_SIZE = 2000    # rows fetched from server-side cursor at once
+EXPORT_FORMATS = ['csv', 'ndjson']
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# column name -> lookup
+EXPORT_COLUMNS = {
+    'id': 'id',
+    'residential_complex': 'residential_complex_id',
+    'residential_complex_name': 'residential_complex__name',
+    'chessboard': 'chessboard_id',
+    'flat': 'flat_id',
+    'creator': 'creator_id',
+    'creator_email': 'creator__email',
+    'accepted': 'accepted',
+    'called_off': 'called_off',
+    'rejection_reason': 'rejection_reason',
+    'address': 'address',
+    'purpose': 'purpose',
+    'room_amount': 'room_amount',
+    'planning': 'planning',
+    'house_condition': 'house_condition',
+    'overall_square': 'overall_square',
+    'kitchen_square': 'kitchen_square',
+    'has_balcony': 'has_balcony',
+    'heating_type': 'heating_type',
+    'payment_option': 'payment_option',
+    'agent_commission': 'agent_commission',
+    'communication_method': 'communication_method',
+    'price': 'price',
+    'rank_score': 'rank_score',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+
+def iter_rows(queryset):
+    """
+    Reads rows of announcements through server-side cursor, so memory does
+    not depend on amount of rows. Cursor lives inside transaction, otherwise
+    postgres would materialize the whole result for WITH HOLD cursor.
+    :param queryset: QuerySet<ChessBoardFlat>
+    :return: generator of tuples in order of EXPORT_COLUMNS
+    """
+    with transaction.atomic():
+        yield from queryset.order_by('id') \
+            .values_list(*EXPORT_COLUMNS.values()) \
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def iter_csv(rows):
+    """
+    :param rows: iterable of tuples
+    :return: generator of str, one chunk per EXPORT_CHUNK_SIZE rows
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for number, row in enumerate(rows, start=1):
+        writer.writerow(value.isoformat() if hasattr(value, 'isoformat') else value for value in row)
+        if number % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(rows):
+    """
+    :param rows: iterable of tuples
+    :return: generator of bytes, one chunk per EXPORT_CHUNK_SIZE rows
+    """
+    renderer = ORJSONRenderer()
+    columns = list(EXPORT_COLUMNS)
+    lines = []
+    for row in rows:
+        lines.append(renderer.render(dict(zip(columns, row))))
+        if len(lines) == EXPORT_CHUNK_SIZE:
+            yield b'\n'.join(lines) + b'\n'
+            lines = []
+    if lines:
+        yield b'\n'.join(lines) + b'\n'
+
+
+def export_announcements(queryset, file_format: str):
+    """
+    :param queryset: QuerySet<ChessBoardFlat>
+    :param file_format: one of EXPORT_FORMATS
+    :return: generator of chunks of the file
+    """
+    if file_format == 'ndjson':
+        return iter_ndjson(iter_rows(queryset))
+    return iter_csv(iter_rows(queryset))
@@ -1,6 +1,13 @@
+import re
+
 from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import ValidationError
 
-from flats.models import Photo
+from flats.models import ChessBoardFlat, Gallery, Photo, ResidentialComplex
 
 
 def update_gallery_photos(instance, gallery_photos, use_sequence=False):
@@ -33,3 +40,120 @@ def update_gallery_photos(instance, gallery_photos, use_sequence=False):
             instance.gallery.refresh_from_db(fields=['photo_set'])  # refresh prefetched photo_set
         except FieldDoesNotExist:
             pass
+
+
+def create_numbered_objects(model, residential_complex: ResidentialComplex, prefix: str, count: int = 1,
+                            names: list = None) -> list:
+    """
+    Creates corps, sections or floors of RC by one insert. Row of RC is
+    locked, so concurrent requests are numbered one after another, without
+    gaps and duplicates. Numbers continue from the largest '<prefix> <n>'.
+    :param model: Corps, Section or Floor
+    :param residential_complex: ResidentialComplex
+    :param prefix: name of objects without number, e.g. 'Поверх'
+    :param count: amount of objects, if names are not given
+    :param names: names of objects
+    :return: list of created objects
+    """
+    with transaction.atomic():
+        list(ResidentialComplex.objects.select_for_update().filter(pk=residential_complex.pk).values_list('id'))
+        existing = set(model.objects.filter(residential_complex=residential_complex).values_list('name', flat=True))
+
+        if names:
+            used = [name for name in names if name in existing]
+            if used:
+                raise ValidationError({'names': _('Назви вже використовуються: %(names)s.')
+                                       % {'names': ', '.join(used)}})
+        else:
+            pattern = re.compile(rf'^{re.escape(prefix)} (\d+)$')
+            numbers = [int(match.group(1)) for match in map(pattern.match, existing) if match]
+            last = max(numbers, default=0)
+            names = [f'{prefix} {last + number}' for number in range(1, count + 1)]
+
+        return model.objects.bulk_create([model(residential_complex=residential_complex, name=name) for name in names])
+
+
+def commit_files(objects: list, field_names) -> None:
+    """
+    Saves new files of objects to the storage. bulk_update() does not call
+    pre_save() of fields, so uploaded files would not be written otherwise.
+    :param objects: model instances
+    :param field_names: names of fields, which are going to be updated
+    :return: None
+    """
+    if not objects:
+        return
+    file_fields = [field for field in objects[0]._meta.concrete_fields
+                   if field.name in field_names and hasattr(field, 'attr_class')]
+    for obj in objects:
+        for field in file_fields:
+            field.pre_save(obj, add=False)
+
+
+def create_announcements(creator, items: list) -> list:
+    """
+    Creates announcements with their galleries and photos by three inserts
+    in one transaction.
+    :param creator: User
+    :param items: validated data of announcements
+    :return: list of created ChessBoardFlat
+    """
+    photos = [item.pop('gallery_photos', None) or [] for item in items]
+    with transaction.atomic():
+        galleries = Gallery.objects.bulk_create([Gallery() for _ in items])
+        instances = ChessBoardFlat.objects.bulk_create([
+            ChessBoardFlat(gallery=gallery, creator=creator, **item) for gallery, item in zip(galleries, items)
+        ])
+        Photo.objects.bulk_create([
+            Photo(gallery=gallery, sequence_number=index + 1,
+                  **{field: value for field, value in photo.items() if field != 'id'})
+            for gallery, gallery_photos in zip(galleries, photos)
+            for index, photo in enumerate(gallery_photos)
+        ])
+    return instances
+
+
+def update_announcements(instances: list, items: list) -> list:
+    """
+    Updates announcements and their photos by one statement per table, as
+    update_gallery_photos() does for single announcement: photos without id
+    are added, listed photos change their sequence number and file.
+    :param instances: ChessBoardFlat in order of items
+    :param items: validated data of announcements
+    :return: list of updated ChessBoardFlat
+    """
+    now = timezone.now()
+    fields = {'updated_at'}
+    existing_photos = {}
+    gallery_ids = [instance.gallery_id for instance, item in zip(instances, items) if item.get('gallery_photos')]
+    for photo in Photo.objects.filter(gallery_id__in=gallery_ids):
+        existing_photos[photo.id] = photo
+
+    new_photos, changed_photos = [], []
+    for instance, item in zip(instances, items):
+        gallery_photos = item.pop('gallery_photos', None) or []
+        for field, value in item.items():
+            setattr(instance, field, value)
+            fields.add(field)
+        instance.updated_at = now
+
+        for index, photo in enumerate(gallery_photos):
+            photo = dict(photo)
+            photo_id = photo.pop('id', None)
+            photo_instance = existing_photos.get(photo_id)
+            if not photo_id:
+                new_photos.append(Photo(gallery_id=instance.gallery_id, sequence_number=index, **photo))
+            elif photo_instance is not None and photo_instance.gallery_id == instance.gallery_id and \
+                    (photo_instance.sequence_number != index or photo.get('photo')):
+                photo_instance.sequence_number = index
+                if photo.get('photo'):
+                    photo_instance.photo = photo.get('photo')
+                changed_photos.append(photo_instance)
+
+    commit_files(instances, fields)
+    commit_files(changed_photos, ['photo'])
+    with transaction.atomic():
+        ChessBoardFlat.objects.bulk_update(instances, fields)
+        Photo.objects.bulk_create(new_photos)
+        Photo.objects.bulk_update(changed_photos, ['sequence_number', 'photo'])
+    return instances
@@ -0,0 +1,151 @@
+from django.db.models import Avg, Count, Max
+from django.db.models.functions import Substr
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import ValidationError
+
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_LENGTH = 9
+
+# geohash precision used for clustering on every zoom level of the map,
+# so that one viewport contains at most a few hundred cells
+ZOOM_PRECISION = {
+    0: 1, 1: 1, 2: 1,
+    3: 2, 4: 2, 5: 2,
+    6: 3, 7: 3,
+    8: 4, 9: 4, 10: 4,
+    11: 5, 12: 5,
+    13: 6, 14: 6, 15: 6,
+    16: 7, 17: 7,
+}
+MAX_ZOOM = 20
+
+
+def encode_geohash(latitude: float, longitude: float, length: int = GEOHASH_LENGTH) -> str:
+    """
+    Encodes coordinates into geohash string of given length.
+    :param latitude: float
+    :param longitude: float
+    :param length: int
+    :return: str
+    """
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    result = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(result) < length:
+        current_range, value = (longitude_range, longitude) if even else (latitude_range, latitude)
+        middle = (current_range[0] + current_range[1]) / 2
+        if value >= middle:
+            bits = (bits << 1) | 1
+            current_range[0] = middle
+        else:
+            bits = bits << 1
+            current_range[1] = middle
+        even = not even
+        bit_count += 1
+
+        if bit_count == 5:
+            result.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(result)
+
+
+def get_precision_by_zoom(zoom: int) -> int:
+    """
+    Returns length of geohash prefix to group pins by on given map zoom.
+    :param zoom: int
+    :return: int
+    """
+    zoom = max(0, min(zoom, MAX_ZOOM))
+    return ZOOM_PRECISION.get(zoom, GEOHASH_LENGTH)
+
+
+def get_map_parameters(query_params) -> dict:
+    """
+    Parses viewport of the map from query params: min_latitude,
+    min_longitude, max_latitude, max_longitude, zoom and optional geohash
+    prefix of the cluster, which is being opened.
+    :param query_params: QueryDict
+    :return: dict
+    """
+    try:
+        parameters = {
+            'min_latitude': float(query_params['min_latitude']),
+            'min_longitude': float(query_params['min_longitude']),
+            'max_latitude': float(query_params['max_latitude']),
+            'max_longitude': float(query_params['max_longitude']),
+            'zoom': int(query_params.get('zoom', MAX_ZOOM)),
+        }
+    except (KeyError, TypeError, ValueError):
+        raise ValidationError({'detail': _('Неправильно вказано межі карти.')})
+
+    if parameters['min_latitude'] > parameters['max_latitude'] \
+            or parameters['min_longitude'] > parameters['max_longitude']:
+        raise ValidationError({'detail': _('Неправильно вказано межі карти.')})
+
+    geohash = query_params.get('geohash', '')
+    if any(symbol not in GEOHASH_ALPHABET for symbol in geohash):
+        raise ValidationError({'geohash': _('Неправильно вказано geohash.')})
+    parameters['geohash'] = geohash
+
+    return parameters
+
+
+def filter_by_bounding_box(queryset, min_latitude, min_longitude, max_latitude, max_longitude,
+                           geohash: str = '', prefix: str = '', **kwargs):
+    """
+    Filters queryset by rectangle of the map viewport. Uses composite
+    (latitude, longitude) index and geohash index for narrowing down to
+    the chosen cluster.
+    :param queryset: QuerySet
+    :param geohash: prefix of the cluster
+    :param prefix: lookup prefix to coordinates, e.g. 'residential_complex__'
+    :return: QuerySet
+    """
+    queryset = queryset.filter(**{
+        f'{prefix}latitude__range': (min_latitude, max_latitude),
+        f'{prefix}longitude__range': (min_longitude, max_longitude),
+    })
+    if geohash:
+        queryset = queryset.filter(**{f'{prefix}geohash__startswith': geohash})
+    return queryset
+
+
+def cluster_queryset(queryset, zoom: int, prefix: str = '') -> list:
+    """
+    Groups already filtered queryset into geohash cells of precision, that
+    corresponds to map zoom. Aggregation is made by database in one query.
+    :param queryset: QuerySet
+    :param zoom: int
+    :param prefix: lookup prefix to coordinates, e.g. 'residential_complex__'
+    :return: list of clusters
+    """
+    precision = get_precision_by_zoom(zoom)
+    clusters = queryset \
+        .order_by() \
+        .annotate(cell=Substr(f'{prefix}geohash', 1, precision)) \
+        .values('cell') \
+        .annotate(count=Count('id'),
+                  center_latitude=Avg(f'{prefix}latitude'),
+                  center_longitude=Avg(f'{prefix}longitude'),
+                  object_id=Max('id')) \
+        .order_by('cell')
+
+    return [
+        {
+            'geohash': cluster.get('cell'),
+            'count': cluster.get('count'),
+            'latitude': cluster.get('center_latitude'),
+            'longitude': cluster.get('center_longitude'),
+            # single pin is not a cluster, so client can open it directly
+            'id': cluster.get('object_id') if cluster.get('count') == 1 else None,
+        }
+        for cluster in clusters
+    ]
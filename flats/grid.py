@@ -0,0 +1,95 @@
+import hashlib
+import json
+
+import numpy as np
+
+from .models import ChessBoardFlat
+from .swipes import get_redis_connection
+
+
+GRID_CACHE_PREFIX = 'chessboard:grid'
+GRID_CACHE_TIMEOUT = 60 * 60 * 24   # stale versions are never read again, so just let them expire
+
+# status codes of cells of the grid
+STATUS_EMPTY = 0
+STATUS_MODERATION = 1
+STATUS_PUBLISHED = 2
+STATUS_CALLED_OFF = 3
+
+
+def build_grid(chessboard_id: int) -> dict:
+    """
+    Builds chessboard as floor x position matrices in one query. Rows are
+    floors in order of their ids, positions are ordered by flat. Empty cells
+    have id 0 and status 0.
+    :param chessboard_id: int
+    :return: dict of floors and matrices of ids, prices, prices per meter and statuses
+    """
+    rows = list(
+        ChessBoardFlat.objects
+        .filter(chessboard_id=chessboard_id)
+        .order_by('flat__floor_id', 'flat_id', 'id')
+        .values_list('id', 'flat__floor_id', 'flat__floor__name', 'price', 'overall_square', 'accepted',
+                     'called_off')
+    )
+    if not rows:
+        return {'id': chessboard_id, 'floors': [], 'floor_names': [], 'width': 0,
+                'ids': [], 'prices': [], 'price_per_meter': [], 'statuses': []}
+
+    ids, floor_ids, floor_names, prices, squares, accepted, called_off = zip(*rows)
+    # announcements without flat go to the last row
+    floor_keys = np.array([floor_id if floor_id is not None else np.iinfo(np.int64).max for floor_id in floor_ids],
+                          dtype=np.int64)
+    # rows are already sorted by floor, stable sort only guards against other ordering of nulls
+    order = np.argsort(floor_keys, kind='stable')
+    floor_keys = floor_keys[order]
+    ids = np.array(ids, dtype=np.int64)[order]
+    prices = np.array(prices, dtype=np.int64)[order]
+    squares = np.array(squares, dtype=np.float64)[order]
+    accepted = np.array(accepted, dtype=bool)[order]
+    called_off = np.array(called_off, dtype=bool)[order]
+    floor_ids = np.array(floor_ids, dtype=object)[order]
+    floor_names = np.array(floor_names, dtype=object)[order]
+
+    floors, row_index = np.unique(floor_keys, return_inverse=True)
+    counts = np.bincount(row_index)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    positions = np.arange(len(ids)) - starts[row_index]
+    shape = (len(floors), int(counts.max()))
+
+    statuses = np.where(called_off, STATUS_CALLED_OFF, np.where(accepted, STATUS_PUBLISHED, STATUS_MODERATION))
+    grid = {}
+    for name, values, dtype in (('ids', ids, np.int64), ('prices', prices, np.int64),
+                                ('price_per_meter', np.round(prices / squares, 2), np.float64),
+                                ('statuses', statuses, np.int8)):
+        matrix = np.zeros(shape, dtype=dtype)
+        matrix[row_index, positions] = values
+        grid[name] = matrix.tolist()
+
+    return {
+        'id': chessboard_id,
+        'floors': floor_ids[starts].tolist(),
+        'floor_names': floor_names[starts].tolist(),
+        'width': shape[1],
+        **grid,
+    }
+
+
+def get_grid(chessboard_id: int, version) -> dict:
+    """
+    Returns cached grid of the chessboard. Cache key contains version of the
+    chessboard, e.g. amount and last modification of its flats, so grid is
+    rebuilt after any flat changes.
+    :param chessboard_id: int
+    :param version: values, which change with any of flats of the chessboard
+    :return: dict
+    """
+    key = f'{GRID_CACHE_PREFIX}:{chessboard_id}:{hashlib.md5(repr(version).encode()).hexdigest()}'
+    connection = get_redis_connection()
+    cached = connection.get(key)
+    if cached is not None:
+        return json.loads(cached)
+
+    grid = build_grid(chessboard_id)
+    connection.set(key, json.dumps(grid), ex=GRID_CACHE_TIMEOUT)
+    return grid
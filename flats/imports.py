@@ -0,0 +1,146 @@
+import csv
+import io
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from .models import Corps, Flat, FlatImport, Floor, Gallery, Section
+from .serializers import FlatImportRowSerializer
+
+
+FLAT_IMPORT_COLUMNS = ['corps', 'section', 'floor', 'district', 'micro_district', 'room_amount', 'square', 'price',
+                       'condition']
+FLAT_IMPORT_MAX_ROWS = 5000
+FLAT_IMPORT_PROGRESS_STEP = 200     # rows between updates of progress
+FLAT_IMPORT_BATCH_SIZE = 500
+
+
+def resolve_names(residential_complex_id: int) -> dict:
+    """
+    Loads names of corps, sections and floors of RC at once, instead of
+    query per row. Names, which are not unique inside RC, map to None.
+    :param residential_complex_id: int
+    :return: dict column -> {name: id or None}
+    """
+    names = {}
+    for column, model in (('corps', Corps), ('section', Section), ('floor', Floor)):
+        names[column] = {}
+        for pk, name in model.objects.filter(residential_complex_id=residential_complex_id).values_list('id', 'name'):
+            names[column][name] = None if name in names[column] else pk
+    return names
+
+
+def validate_rows(rows, names: dict, on_progress=None):
+    """
+    Validates all rows before anything is created, so that builder gets all
+    errors of the file at once.
+    :param rows: list of dicts from csv.DictReader
+    :param names: result of resolve_names()
+    :param on_progress: called with amount of validated rows
+    :return: (list of validated data, list of errors)
+    """
+    messages = {
+        'corps': _('Корпусу з такою назвою немає у вашому ЖК.'),
+        'section': _('Секції з такою назвою немає у вашому ЖК.'),
+        'floor': _('Поверху з такою назвою немає у вашому ЖК.'),
+    }
+    ambiguous = _('Назва не унікальна у вашому ЖК.')
+    validated, errors = [], []
+
+    # first row of the file is header
+    for number, row in enumerate(rows, start=2):
+        serializer = FlatImportRowSerializer(data=row)
+        row_errors = {} if serializer.is_valid() else dict(serializer.errors)
+        data = dict(serializer.validated_data) if not row_errors else {}
+        for column, message in messages.items():
+            name = (row.get(column) or '').strip()
+            if column in row_errors or not name:
+                continue
+            if name not in names[column]:
+                row_errors[column] = [message]
+            elif names[column][name] is None:
+                row_errors[column] = [ambiguous]
+            elif data:
+                data[f'{column}_id'] = names[column][name]
+                data.pop(column)
+
+        if row_errors:
+            errors.append({'row': number, 'errors': {column: [str(message) for message in column_errors]
+                                                     for column, column_errors in row_errors.items()}})
+        else:
+            validated.append(data)
+        if on_progress and (number - 1) % FLAT_IMPORT_PROGRESS_STEP == 0:
+            on_progress(number - 1)
+    return validated, errors
+
+
+def read_rows(flat_import: FlatImport) -> list:
+    """
+    :param flat_import: FlatImport
+    :return: list of dicts
+    :raise ValueError: if file can not be read as CSV with expected columns
+    """
+    with flat_import.file.open('rb') as file:
+        content = file.read().decode('utf-8-sig')
+    reader = csv.DictReader(io.StringIO(content))
+    missing = set(FLAT_IMPORT_COLUMNS) - set(reader.fieldnames or [])
+    if missing:
+        raise ValueError(_('У файлі бракує колонок: %(columns)s.') % {'columns': ', '.join(sorted(missing))})
+    rows = list(reader)
+    if not rows:
+        raise ValueError(_('Файл не містить жодної квартири.'))
+    if len(rows) > FLAT_IMPORT_MAX_ROWS:
+        raise ValueError(_('Файл може містити не більше %(amount)s квартир.') % {'amount': FLAT_IMPORT_MAX_ROWS})
+    return rows
+
+
+def run_flat_import(flat_import_id: int) -> FlatImport:
+    """
+    Validates rows of the import and creates all flats with their galleries
+    by bulk inserts in one transaction. If any row is invalid, nothing is
+    created and errors of all rows are saved. Only pending import is run,
+    so redelivered task does not create flats again.
+    :param flat_import_id: int
+    :return: FlatImport
+    """
+    queryset = FlatImport.objects.filter(pk=flat_import_id)
+    with transaction.atomic():
+        flat_import = queryset.select_for_update().get()
+        if flat_import.status != FlatImport.StatusChoice.pending:
+            return flat_import
+        flat_import.status = FlatImport.StatusChoice.validating
+        flat_import.save(update_fields=['status'])
+
+    def finish(**fields):
+        fields['finished_at'] = timezone.now()
+        queryset.update(**fields)
+        flat_import.refresh_from_db()
+        return flat_import
+
+    try:
+        rows = read_rows(flat_import)
+    except (ValueError, csv.Error) as error:
+        message = str(error) if not isinstance(error, UnicodeDecodeError) else _('Файл має бути у кодуванні UTF-8.')
+        return finish(status=FlatImport.StatusChoice.failed, errors=[{'row': 0, 'errors': {'file': [message]}}])
+
+    queryset.update(total_rows=len(rows))
+    validated, errors = validate_rows(rows, resolve_names(flat_import.residential_complex_id),
+                                      on_progress=lambda amount: queryset.update(processed_rows=amount))
+    if errors:
+        return finish(status=FlatImport.StatusChoice.failed, processed_rows=len(rows), errors=errors)
+
+    queryset.update(status=FlatImport.StatusChoice.importing, processed_rows=len(rows))
+    with transaction.atomic():
+        # row stays locked until flats are committed together with status
+        if queryset.select_for_update().values_list('status', flat=True).get() != FlatImport.StatusChoice.importing:
+            flat_import.refresh_from_db()
+            return flat_import
+        # postgres returns ids of bulk-inserted rows
+        galleries = Gallery.objects.bulk_create([Gallery() for _row in validated], batch_size=FLAT_IMPORT_BATCH_SIZE)
+        Flat.objects.bulk_create(
+            [Flat(residential_complex_id=flat_import.residential_complex_id, gallery=gallery, **data)
+             for gallery, data in zip(galleries, validated)],
+            batch_size=FLAT_IMPORT_BATCH_SIZE
+        )
+        return finish(status=FlatImport.StatusChoice.done, created_rows=len(validated))
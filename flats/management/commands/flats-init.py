@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 from faker import Faker
-from random import choice, randint
+from random import choice, randint, uniform
 
 from flats.models import *
 
@@ -39,7 +39,9 @@ class Command(BaseCommand):
                     payment=choice(['mortgage', 'parent-capital']),
                     purpose='living-building',
                     sum_in_contract='full',
-                    gallery=Gallery.objects.create()
+                    gallery=Gallery.objects.create(),
+                    latitude=uniform(46.35, 46.60),
+                    longitude=uniform(30.60, 30.80)
                 )
 
                 for i in range(1, 4):
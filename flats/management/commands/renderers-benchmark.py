@@ -0,0 +1,80 @@
+import time
+from io import BytesIO
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api_swipe.parsers import MessagePackParser, ORJSONParser, msgpack
+from api_swipe.renderers import MessagePackRenderer, ORJSONRenderer
+from flats.models import ChessBoard, ChessBoardFlat
+from flats.serializers import ChessBoardFlatAnnouncementListSerializer, ChessBoardFlatAnnouncementSerializer, \
+    ChessBoardSerializer
+
+
+# format -> (renderer, parser)
+FORMATS = {
+    'json': (JSONRenderer, JSONParser),
+    'orjson': (ORJSONRenderer, ORJSONParser),
+}
+if msgpack is not None:
+    FORMATS['msgpack'] = (MessagePackRenderer, MessagePackParser)
+
+
+class Command(BaseCommand):
+    help = 'Compares size and time of encoding and decoding of feed and chessboard pages by available formats.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=5)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--chessboards', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def get_payloads(self, pages: int, page_size: int, chessboards: int) -> dict:
+        queryset = ChessBoardFlat.objects \
+            .select_related('residential_complex', 'creator', 'promotion__promotion_type',
+                            'chessboard__corps', 'chessboard__section') \
+            .prefetch_related('gallery__photo_set') \
+            .filter(accepted=True, called_off=False) \
+            .order_by('-rank_score', '-id')
+        announcements = list(queryset[:pages * page_size])
+        chunks = [announcements[start:start + page_size] for start in range(0, len(announcements), page_size)]
+        # the biggest chessboards are the worst case
+        boards = ChessBoard.objects \
+            .select_related('section', 'corps') \
+            .prefetch_related('chessboardflat_set') \
+            .annotate(flats_amount=Count('chessboardflat')) \
+            .order_by('-flats_amount')[:chessboards]
+        return {
+            'feed page': [ChessBoardFlatAnnouncementListSerializer(chunk, many=True).data for chunk in chunks],
+            'page with galleries': [ChessBoardFlatAnnouncementSerializer(chunk, many=True).data for chunk in chunks],
+            'chessboard': [ChessBoardSerializer(board).data for board in boards],
+        }
+
+    def handle(self, *args, **options):
+        payloads = self.get_payloads(options.get('pages'), options.get('page_size'), options.get('chessboards'))
+        for payload_name, pages in payloads.items():
+            if not pages:
+                self.stderr.write(f'{payload_name}: nothing to render.')
+                continue
+            for format_name, (renderer_class, parser_class) in FORMATS.items():
+                renderer, parser = renderer_class(), parser_class()
+                encoding, decoding, size = [], [], 0
+                for _ in range(options.get('repeat')):
+                    size = 0
+                    for page in pages:
+                        started = time.perf_counter()
+                        content = renderer.render(page, renderer.media_type)
+                        encoding.append((time.perf_counter() - started) * 1000)
+
+                        started = time.perf_counter()
+                        parser.parse(BytesIO(content), parser.media_type, {})
+                        decoding.append((time.perf_counter() - started) * 1000)
+                        size += len(content)
+                self.stdout.write(f'{payload_name}, {format_name}: {size // len(pages)} bytes, '
+                                  f'encoding p50 {np.percentile(encoding, 50):.3f} ms, '
+                                  f'p99 {np.percentile(encoding, 99):.3f} ms, '
+                                  f'decoding p50 {np.percentile(decoding, 50):.3f} ms, '
+                                  f'p99 {np.percentile(decoding, 99):.3f} ms')
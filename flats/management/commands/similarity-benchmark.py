@@ -0,0 +1,52 @@
+import time
+from random import choice, randint
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from flats.similarity import (HOUSE_CONDITION_CHOICES, METRICS, NUMERIC_FEATURES, PLANNING_CHOICES, build_vectors,
+                              top_k)
+
+
+class Command(BaseCommand):
+    help = 'Measures latency of search of similar announcements on synthetic matrix.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--batch', type=int, default=32)
+        parser.add_argument('-k', type=int, default=10)
+
+    def handle(self, *args, **options):
+        rows = [
+            (pk, randint(500000, 10000000), randint(20, 200), randint(5, 30), randint(1, 5),
+             choice(PLANNING_CHOICES), choice(HOUSE_CONDITION_CHOICES), f'district-{randint(1, 12)}',
+             randint(1, 300))
+            for pk in range(1, options.get('rows') + 1)
+        ]
+        numeric = np.array([row[1:len(NUMERIC_FEATURES) + 1] for row in rows], dtype=np.float64)
+        numeric[:, 0] = np.log1p(numeric[:, 0])
+
+        started = time.perf_counter()
+        matrix = build_vectors(rows, numeric.min(axis=0), numeric.max(axis=0))
+        self.stdout.write(f'built {matrix.shape} matrix in {(time.perf_counter() - started) * 1000:.1f} ms')
+
+        ids = np.arange(1, len(rows) + 1, dtype=np.int64)
+        norms = np.linalg.norm(matrix, axis=1)
+        query_ids = np.random.choice(ids, size=options.get('queries'))
+        for metric in METRICS:
+            latencies = []
+            for pk in query_ids:
+                started = time.perf_counter()
+                top_k(matrix, norms, ids, matrix[[pk - 1]], options.get('k'), metric, exclude=np.array([pk]))
+                latencies.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(f'{metric}, single: p50 {np.percentile(latencies, 50):.2f} ms, '
+                              f'p99 {np.percentile(latencies, 99):.2f} ms')
+
+            batch = options.get('batch')
+            started = time.perf_counter()
+            for start in range(0, len(query_ids), batch):
+                chunk = np.sort(query_ids[start:start + batch])
+                top_k(matrix, norms, ids, matrix[chunk - 1], options.get('k'), metric, exclude=chunk)
+            per_query = (time.perf_counter() - started) * 1000 / len(query_ids)
+            self.stdout.write(f'{metric}, batches of {batch}: {per_query:.2f} ms per announcement')
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.15 on 2026-10-19 04:50
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flats', '0019_alter_chessboardflat_called_off'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='residentialcomplex',
+            name='geohash',
+            field=models.CharField(blank=True, default='', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='residentialcomplex',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90.0), django.core.validators.MaxValueValidator(90.0)]),
+        ),
+        migrations.AddField(
+            model_name='residentialcomplex',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180.0), django.core.validators.MaxValueValidator(180.0)]),
+        ),
+        migrations.AddIndex(
+            model_name='residentialcomplex',
+            index=models.Index(fields=['latitude', 'longitude'], name='rc_coordinates_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='residentialcomplex',
+            index=models.Index(fields=['geohash'], name='rc_geohash_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
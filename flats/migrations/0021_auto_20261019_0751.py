@@ -0,0 +1,22 @@
+# Generated by Django 3.2.15 on 2026-10-19 04:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flats', '0020_auto_20261019_0750'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chessboardflat',
+            name='rank_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='chessboardflat',
+            index=models.Index(condition=models.Q(('accepted', True), ('called_off', False)), fields=['-rank_score', '-id'], name='feed_rank_idx'),
+        ),
+    ]
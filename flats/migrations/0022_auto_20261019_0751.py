@@ -0,0 +1,48 @@
+# Generated by Django 3.2.15 on 2026-10-19 04:51
+
+import django.core.validators
+from django.db import migrations, models
+import django.utils.timezone
+from datetime import timedelta
+
+
+def set_expiration_of_existing_promotions(apps, schema_editor):
+    # promotions bought before validity window existed are given one more
+    # full period of their type, starting from the moment of migration
+    Promotion = apps.get_model('flats', 'Promotion')
+    now = django.utils.timezone.now()
+    for promotion in Promotion.objects.select_related('promotion_type').filter(expires_at__isnull=True):
+        duration = promotion.promotion_type.duration if promotion.promotion_type else 30
+        promotion.expires_at = now + timedelta(days=duration)
+        promotion.save(update_fields=['expires_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flats', '0021_auto_20261019_0751'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promotion',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='promotion',
+            name='starts_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='promotiontype',
+            name='duration',
+            field=models.IntegerField(default=30, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.RunPython(set_expiration_of_existing_promotions, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='promotion',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
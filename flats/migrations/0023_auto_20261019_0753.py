@@ -0,0 +1,32 @@
+# Generated by Django 3.2.15 on 2026-10-19 04:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('flats', '0022_auto_20261019_0751'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SwipeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.UUIDField(unique=True)),
+                ('action', models.CharField(choices=[('left', 'Пропущено'), ('right', 'Сподобалось'), ('favorite', 'Додано в улюблені')], max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('chessboard_flat', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='flats.chessboardflat')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='swipeevent',
+            index=models.Index(fields=['user', 'created_at'], name='swipe_event_user_idx'),
+        ),
+    ]
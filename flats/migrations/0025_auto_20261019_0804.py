@@ -0,0 +1,23 @@
+# Generated by Django 3.2.15 on 2026-10-19 05:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flats', '0024_auto_20261019_0802'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flat',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='news',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
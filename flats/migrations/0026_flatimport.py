@@ -0,0 +1,32 @@
+# Generated by Django 3.2.15 on 2026-10-19 05:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('flats', '0025_auto_20261019_0804'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlatImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='flats/imports/')),
+                ('status', models.CharField(choices=[('pending', 'Очікує'), ('validating', 'Перевірка'), ('importing', 'Імпорт'), ('done', 'Завершено'), ('failed', 'Помилка')], default='pending', max_length=15)),
+                ('total_rows', models.IntegerField(default=0)),
+                ('processed_rows', models.IntegerField(default=0)),
+                ('created_rows', models.IntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('creator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('residential_complex', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='flats.residentialcomplex')),
+            ],
+        ),
+    ]
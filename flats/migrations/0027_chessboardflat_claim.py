@@ -0,0 +1,30 @@
+# Generated by Django 3.2.15 on 2026-10-19 05:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('flats', '0026_flatimport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chessboardflat',
+            name='claim_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chessboardflat',
+            name='claimed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claimed_announcements', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='chessboardflat',
+            index=models.Index(condition=models.Q(('accepted', False), ('called_off', False)), fields=['residential_complex', 'created_at', 'id'], name='moderation_queue_idx'),
+        ),
+    ]
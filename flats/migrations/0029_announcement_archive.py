@@ -0,0 +1,73 @@
+# Generated by Django 3.2.15 on 2026-10-19 05:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('flats', '0028_residentialcomplex_pending_deletion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAnnouncement',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('accepted', models.BooleanField()),
+                ('address', models.TextField()),
+                ('purpose', models.CharField(choices=[('apartments', 'Квартири')], max_length=20)),
+                ('room_amount', models.IntegerField()),
+                ('planning', models.CharField(choices=[('studio-bathroom', 'Студія і ванна'), ('studio', 'Студія')], max_length=30)),
+                ('house_condition', models.CharField(choices=[('repair-required', 'Потрібен ремонт'), ('good', 'Задовільний')], max_length=30)),
+                ('overall_square', models.FloatField()),
+                ('kitchen_square', models.FloatField()),
+                ('has_balcony', models.BooleanField()),
+                ('heating_type', models.CharField(choices=[('gas', 'Газ'), ('centralized', 'Централізоване')], max_length=20)),
+                ('payment_option', models.CharField(choices=[('parent-capital', 'Материнський капітал')], max_length=20)),
+                ('agent_commission', models.IntegerField()),
+                ('communication_method', models.CharField(choices=[('phone-messages', 'Телефон і повідомлення'), ('phone', 'Тільки телефон'), ('messages', 'Тільки повідомлення')], max_length=40)),
+                ('description', models.TextField()),
+                ('price', models.IntegerField()),
+                ('main_photo', models.ImageField(upload_to='chessboard/main_photos/')),
+                ('created_at', models.DateTimeField()),
+                ('rejection_reason', models.CharField(choices=[('incorrect-price', 'Некоректна ціна'), ('incorrect-photo', 'Некоректне фото'), ('incorrect-description', 'Некоректний опис')], max_length=25, null=True)),
+                ('called_off', models.BooleanField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('chessboard', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='flats.chessboard')),
+                ('creator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_announcements', to=settings.AUTH_USER_MODEL)),
+                ('flat', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='flats.flat')),
+                ('gallery', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, to='flats.gallery')),
+                ('residential_complex', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='flats.residentialcomplex')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedPromotion',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('logo', models.ImageField(upload_to='promotions/')),
+                ('header', models.CharField(max_length=200, null=True)),
+                ('color', models.CharField(blank=True, choices=[('green', 'Зелений'), ('red', 'Червоний')], max_length=15, null=True)),
+                ('starts_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('chessboard_flat', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='promotion', to='flats.archivedannouncement')),
+                ('promotion_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='flats.promotiontype')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedFavorite',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('chessboard_flat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to='flats.archivedannouncement')),
+                ('residential_complex', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='flats.residentialcomplex')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_favorites', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
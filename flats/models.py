@@ -1,13 +1,22 @@
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.utils import timezone
 
 from users.models import User
+from .geo import encode_geohash
 
 
 class Gallery(models.Model):
     pass
 
 
+class ResidentialComplexManager(models.Manager):
+
+    def get_queryset(self):
+        # RCs pending deletion are purged by background task, until then they are hidden
+        return super().get_queryset().filter(pending_deletion=False)
+
+
 class ResidentialComplex(models.Model):
     owner = models.OneToOneField(User, on_delete=models.PROTECT)
     name = models.CharField(max_length=200)
@@ -100,6 +109,32 @@ class ResidentialComplex(models.Model):
 
     sum_in_contract = models.CharField(max_length=20, choices=ContractSumChoice.choices)
     gallery = models.OneToOneField(Gallery, on_delete=models.PROTECT)
+    latitude = models.FloatField(validators=[MinValueValidator(-90.0), MaxValueValidator(90.0)],
+                                 blank=True, null=True)
+    longitude = models.FloatField(validators=[MinValueValidator(-180.0), MaxValueValidator(180.0)],
+                                  blank=True, null=True)
+    geohash = models.CharField(max_length=12, blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    pending_deletion = models.BooleanField(default=False)
+
+    objects = ResidentialComplexManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='rc_coordinates_idx'),
+            models.Index(fields=['geohash'], name='rc_geohash_idx', opclasses=['varchar_pattern_ops']),
+        ]
+
+    def save(self, *args, **kwargs):
+        # geohash is kept in sync with coordinates for clustering pins on map
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'geohash'}
+        return super().save(*args, **kwargs)
 
 
 class Document(models.Model):
@@ -113,6 +148,7 @@ class News(models.Model):
     header = models.CharField(max_length=200)
     body = models.TextField()
     date = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
 
 class Addition(models.Model):
@@ -168,6 +204,7 @@ class Flat(models.Model):
 
     condition = models.CharField(max_length=20, choices=ConditionType.choices)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
 
 class ChessBoard(models.Model):
@@ -177,6 +214,14 @@ class ChessBoard(models.Model):
     created_at = models.DateField(auto_now_add=True)
 
 
+class ChessBoardFlatManager(models.Manager):
+
+    def get_queryset(self):
+        # announcements of RCs and users pending deletion are hidden until they are purged
+        return super().get_queryset().filter(residential_complex__pending_deletion=False,
+                                             creator__pending_deletion=False)
+
+
 class ChessBoardFlat(models.Model):
     residential_complex = models.ForeignKey(ResidentialComplex, on_delete=models.PROTECT)
     flat = models.OneToOneField(Flat, on_delete=models.PROTECT, blank=True, null=True)
@@ -241,12 +286,33 @@ class ChessBoardFlat(models.Model):
 
     rejection_reason = models.CharField(max_length=25, choices=RejectionOptions.choices, null=True)
     called_off = models.BooleanField(default=False)
+    rank_score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    # moderator, who is reviewing the announcement, until the lease expires
+    claimed_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True,
+                                   related_name='claimed_announcements')
+    claim_expires_at = models.DateTimeField(blank=True, null=True)
+
+    objects = ChessBoardFlatManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            # feed is an index-ordered scan over announcements visible to users
+            models.Index(fields=['-rank_score', '-id'], name='feed_rank_idx',
+                         condition=models.Q(accepted=True, called_off=False)),
+            models.Index(fields=['updated_at', 'id'], name='announcement_sync_idx'),
+            # moderation queue of RC in order of creation
+            models.Index(fields=['residential_complex', 'created_at', 'id'], name='moderation_queue_idx',
+                         condition=models.Q(accepted=False, called_off=False)),
+        ]
 
 
 class PromotionType(models.Model):
     name = models.CharField(max_length=200)
     price = models.FloatField(validators=[MinValueValidator(0.00)])
     efficiency = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(100)])
+    duration = models.IntegerField(validators=[MinValueValidator(1)], default=30)  # in days
 
 
 class Promotion(models.Model):
@@ -260,9 +326,152 @@ class Promotion(models.Model):
         red = ('red', 'Червоний')
 
     color = models.CharField(max_length=15, choices=ColorChoice.choices, blank=True, null=True)
+    starts_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
 
 
 class Favorite(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     chessboard_flat = models.ForeignKey(ChessBoardFlat, on_delete=models.CASCADE, blank=True, null=True)
     residential_complex = models.ForeignKey(ResidentialComplex, on_delete=models.CASCADE, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'updated_at', 'id'], name='favorite_sync_idx'),
+        ]
+
+
+class SwipeEvent(models.Model):
+    """
+    Append-only log of swipes. Rows are inserted in batches from the
+    buffer, so foreign keys are not enforced by database and deletion of
+    related rows does not touch the log.
+    """
+    event_id = models.UUIDField(unique=True)
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
+    chessboard_flat = models.ForeignKey(ChessBoardFlat, on_delete=models.DO_NOTHING, db_constraint=False)
+
+    class ActionChoice(models.TextChoices):
+        left = ('left', 'Пропущено')
+        right = ('right', 'Сподобалось')
+        favorite = ('favorite', 'Додано в улюблені')
+
+    action = models.CharField(max_length=10, choices=ActionChoice.choices)
+    created_at = models.DateTimeField()
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='swipe_event_user_idx'),
+        ]
+
+
+class Tombstone(models.Model):
+    """
+    Log of objects, which have disappeared for clients: deleted ones and
+    announcements called off from the feed. Read by delta sync, so clients
+    can drop them from offline cache. Old rows are removed periodically.
+    """
+    class KindChoice(models.TextChoices):
+        announcement = ('announcement', 'Оголошення')
+        favorite = ('favorite', 'Обране')
+        residential_complex = ('residential-complex', 'ЖК')
+
+    kind = models.CharField(max_length=25, choices=KindChoice.choices)
+    object_id = models.BigIntegerField()
+    # owner of deleted favorite, other tombstones are visible to everybody
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='tombstone_sync_idx'),
+        ]
+
+
+class FlatImport(models.Model):
+    """
+    CSV file with flats uploaded by builder. Rows are validated and created
+    by celery task, which reports progress and per-row errors here.
+    """
+    residential_complex = models.ForeignKey(ResidentialComplex, on_delete=models.CASCADE)
+    creator = models.ForeignKey(User, on_delete=models.CASCADE)
+    file = models.FileField(upload_to='flats/imports/')
+
+    class StatusChoice(models.TextChoices):
+        pending = ('pending', 'Очікує')
+        validating = ('validating', 'Перевірка')
+        importing = ('importing', 'Імпорт')
+        done = ('done', 'Завершено')
+        failed = ('failed', 'Помилка')
+
+    status = models.CharField(max_length=15, choices=StatusChoice.choices, default=StatusChoice.pending)
+    total_rows = models.IntegerField(default=0)
+    processed_rows = models.IntegerField(default=0)
+    created_rows = models.IntegerField(default=0)
+    # list of {'row': number of row in the file, 'errors': {column: [messages]}}
+    errors = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+
+class ArchivedAnnouncement(models.Model):
+    """
+    Announcement, which has been called off or rejected longer than
+    retention period. Rows are moved here from ChessBoardFlat with the same
+    ids by flats.archive, so the live table and its indexes stay small.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    residential_complex = models.ForeignKey(ResidentialComplex, on_delete=models.PROTECT)
+    # flats and chessboards are reused by new announcements, so archive does not hold them
+    flat = models.ForeignKey(Flat, on_delete=models.DO_NOTHING, db_constraint=False, blank=True, null=True,
+                             related_name='+')
+    chessboard = models.ForeignKey(ChessBoard, on_delete=models.DO_NOTHING, db_constraint=False, blank=True,
+                                   null=True, related_name='+')
+    gallery = models.OneToOneField(Gallery, on_delete=models.PROTECT)
+    accepted = models.BooleanField()
+    address = models.TextField()
+    purpose = models.CharField(max_length=20, choices=ChessBoardFlat.PurposeChoice.choices)
+    room_amount = models.IntegerField()
+    planning = models.CharField(max_length=30, choices=ChessBoardFlat.PlanningChoice.choices)
+    house_condition = models.CharField(max_length=30, choices=ChessBoardFlat.HouseCondition.choices)
+    overall_square = models.FloatField()
+    kitchen_square = models.FloatField()
+    has_balcony = models.BooleanField()
+    heating_type = models.CharField(max_length=20, choices=ChessBoardFlat.HeatingType.choices)
+    payment_option = models.CharField(max_length=20, choices=ChessBoardFlat.PaymentOption.choices)
+    agent_commission = models.IntegerField()
+    communication_method = models.CharField(max_length=40, choices=ChessBoardFlat.CommunicationMethod.choices)
+    description = models.TextField()
+    price = models.IntegerField()
+    main_photo = models.ImageField(upload_to='chessboard/main_photos/')
+    creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_announcements')
+    created_at = models.DateTimeField()
+    rejection_reason = models.CharField(max_length=25, choices=ChessBoardFlat.RejectionOptions.choices, null=True)
+    called_off = models.BooleanField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+
+class ArchivedPromotion(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    chessboard_flat = models.OneToOneField(ArchivedAnnouncement, on_delete=models.CASCADE,
+                                           related_name='promotion')
+    promotion_type = models.ForeignKey(PromotionType, on_delete=models.PROTECT, blank=True, null=True)
+    logo = models.ImageField(upload_to='promotions/')
+    header = models.CharField(max_length=200, null=True)
+    color = models.CharField(max_length=15, choices=Promotion.ColorChoice.choices, blank=True, null=True)
+    starts_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+
+class ArchivedFavorite(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_favorites')
+    chessboard_flat = models.ForeignKey(ArchivedAnnouncement, on_delete=models.CASCADE, related_name='favorites')
+    residential_complex = models.ForeignKey(ResidentialComplex, on_delete=models.DO_NOTHING, db_constraint=False,
+                                            blank=True, null=True, related_name='+')
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
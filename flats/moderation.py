@@ -0,0 +1,176 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from users.tasks import match_saved_filters
+from .models import ChessBoard, ChessBoardFlat, Flat
+from .ranking import refresh_rank_scores
+
+
+MODERATION_LEASE = timedelta(minutes=15)    # claim is released after this time, if moderator has left
+MODERATION_BATCH_MAX_SIZE = 100
+
+STATUS_NOT_CLAIMED = 'not_claimed'
+STATUS_INVALID_FLAT = 'invalid_flat'
+
+
+def get_moderation_queryset(owner=None):
+    """
+    :param owner: builder, whose queue is moderated, or None for queue of all RCs
+    :return: QuerySet<ChessBoardFlat> waiting for approval
+    """
+    queryset = ChessBoardFlat.objects.filter(accepted=False, called_off=False)
+    if owner is not None:
+        queryset = queryset.filter(residential_complex__owner=owner)
+    return queryset
+
+
+def get_claimed_queryset(owner, moderator):
+    """
+    :return: QuerySet<ChessBoardFlat>, which are still claimed by the moderator
+    """
+    return get_moderation_queryset(owner).filter(claimed_by=moderator, claim_expires_at__gte=timezone.now())
+
+
+def claim_announcements(owner, moderator, amount: int) -> list:
+    """
+    Takes next announcements of the queue, which are not claimed or whose
+    claim has expired. Announcements, already claimed by the moderator, are
+    not taken again, so concurrent sessions get different ones. Rows locked
+    by concurrent claims are skipped as well.
+    :param owner: builder, whose queue is moderated, or None for queue of all RCs
+    :param moderator: User
+    :param amount: int
+    :return: list of ids of claimed ChessBoardFlat
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            get_moderation_queryset(owner)
+            .filter(Q(claimed_by__isnull=True) | Q(claim_expires_at__lt=now))
+            .order_by('created_at', 'id')
+            .select_for_update(skip_locked=True, of=('self',))
+            .values_list('id', flat=True)[:amount]
+        )
+        ChessBoardFlat.objects.filter(id__in=ids).update(claimed_by=moderator, claim_expires_at=now + MODERATION_LEASE)
+    return ids
+
+
+def lock_claimed(owner, moderator, ids: list) -> dict:
+    """
+    Locks announcements, which are still claimed by the moderator. Should be
+    called inside the transaction.
+    :return: dict of id -> ChessBoardFlat
+    """
+    return get_claimed_queryset(owner, moderator) \
+        .filter(id__in=ids) \
+        .select_for_update(of=('self',)) \
+        .in_bulk()
+
+
+def get_chessboards(flats) -> dict:
+    """
+    Gets or creates chessboards of all corps and sections of flats by one
+    select and one insert.
+    :param flats: iterable of Flat
+    :return: dict of (residential_complex_id, corps_id, section_id) -> ChessBoard
+    """
+    keys = {(flat.residential_complex_id, flat.corps_id, flat.section_id) for flat in flats}
+    if not keys:
+        return {}
+    chessboards = {
+        (chessboard.residential_complex_id, chessboard.corps_id, chessboard.section_id): chessboard
+        for chessboard in ChessBoard.objects.filter(residential_complex_id__in={key[0] for key in keys},
+                                                    corps_id__in={key[1] for key in keys},
+                                                    section_id__in={key[2] for key in keys})
+    }
+    created = ChessBoard.objects.bulk_create([
+        ChessBoard(residential_complex_id=residential_complex_id, corps_id=corps_id, section_id=section_id)
+        for residential_complex_id, corps_id, section_id in keys - set(chessboards)
+    ])
+    chessboards.update({
+        (chessboard.residential_complex_id, chessboard.corps_id, chessboard.section_id): chessboard
+        for chessboard in created
+    })
+    return chessboards
+
+
+def approve_announcements(owner, moderator, announcements: list) -> dict:
+    """
+    Publishes claimed announcements and binds them to flats of the RC. Flats
+    must be free and belong to the RC of the announcement.
+    :param owner: builder or None
+    :param moderator: User
+    :param announcements: list of dicts with id of announcement and id of flat
+    :return: dict of id of announcement -> status
+    """
+    statuses = {}
+    with transaction.atomic():
+        instances = lock_claimed(owner, moderator, [item.get('id') for item in announcements])
+        residential_complex_ids = {instance.residential_complex_id for instance in instances.values()}
+        flats = Flat.objects \
+            .filter(id__in=[item.get('flat') for item in announcements],
+                    residential_complex_id__in=residential_complex_ids,
+                    chessboardflat__isnull=True) \
+            .select_for_update(of=('self',)) \
+            .in_bulk()
+        chessboards = get_chessboards(flats.values())
+
+        approved, used_flats = [], set()
+        for item in announcements:
+            instance, flat = instances.get(item.get('id')), flats.get(item.get('flat'))
+            if instance is None:
+                statuses[item.get('id')] = STATUS_NOT_CLAIMED
+            elif flat is None or flat.id in used_flats or \
+                    flat.residential_complex_id != instance.residential_complex_id:
+                statuses[item.get('id')] = STATUS_INVALID_FLAT
+            else:
+                used_flats.add(flat.id)
+                instance.flat = flat
+                instance.chessboard = chessboards.get((flat.residential_complex_id, flat.corps_id, flat.section_id))
+                instance.accepted = True
+                instance.claimed_by = instance.claim_expires_at = None
+                instance.updated_at = timezone.now()
+                approved.append(instance)
+                statuses[instance.id] = 'approved'
+
+        ChessBoardFlat.objects.bulk_update(approved, ['flat', 'chessboard', 'accepted', 'claimed_by',
+                                                      'claim_expires_at', 'updated_at'])
+        ids = [instance.id for instance in approved]
+        if ids:
+            refresh_rank_scores(ids=ids)
+            transaction.on_commit(lambda: match_saved_filters.delay(ids))
+    return statuses
+
+
+def call_off_announcements(owner, moderator, announcements: list, rejection_reason: str) -> dict:
+    """
+    Rejects claimed announcements. They have not been published yet, so
+    there are no matches of saved filters to remove.
+    :param owner: builder or None
+    :param moderator: User
+    :param announcements: ids of claimed announcements
+    :param rejection_reason: ChessBoardFlat.RejectionOptions
+    :return: dict of id of announcement -> status
+    """
+    with transaction.atomic():
+        called_off = list(lock_claimed(owner, moderator, announcements))
+        ChessBoardFlat.objects.filter(id__in=called_off).update(called_off=True, rejection_reason=rejection_reason,
+                                                                claimed_by=None, claim_expires_at=None,
+                                                                updated_at=timezone.now())
+    return {pk: 'called_off' if pk in called_off else STATUS_NOT_CLAIMED for pk in announcements}
+
+
+def delete_announcements(owner, moderator, announcements: list) -> dict:
+    """
+    :param owner: builder or None
+    :param moderator: User
+    :param announcements: ids of claimed announcements
+    :return: dict of id of announcement -> status
+    """
+    with transaction.atomic():
+        deleted = list(lock_claimed(owner, moderator, announcements))
+        ChessBoardFlat.objects.filter(id__in=deleted).delete()
+    return {pk: 'deleted' if pk in deleted else STATUS_NOT_CLAIMED for pk in announcements}
@@ -1,6 +1,27 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CustomPageNumberPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     page_size = 4
+
+
+class MessageCursorPagination(CursorPagination):
+    """
+    Keyset pagination of conversation backwards from the newest message, so
+    every page is an index range scan regardless of length of history.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 30
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ConversationCursorPagination(CursorPagination):
+    """
+    Keyset pagination of inbox from the most recently active conversation.
+    """
+    ordering = ('-last_message_at', '-id')
+    page_size = 30
+    page_size_query_param = 'page_size'
+    max_page_size = 100
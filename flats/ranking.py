@@ -0,0 +1,103 @@
+import math
+
+from django.db.models import Case, Count, When
+from django.utils import timezone
+
+from .models import ChessBoardFlat
+
+
+# weights of the components of the rank score. Promotion efficiency is in
+# range 1..100, so promoted announcements are always above organic ones,
+# while freshness and engagement order announcements inside the same tier
+PROMOTION_WEIGHT = 1.0
+FRESHNESS_WEIGHT = 0.5
+ENGAGEMENT_WEIGHT = 0.1
+FRESHNESS_HALF_LIFE_DAYS = 7
+
+RANK_BATCH_SIZE = 1000
+
+
+def compute_rank_score(efficiency, created_at, favorites_amount=0, now=None) -> float:
+    """
+    Calculates position of announcement in the feed. The bigger score is,
+    the higher announcement is displayed.
+    :param efficiency: efficiency of promotion type or None
+    :param created_at: datetime
+    :param favorites_amount: how many users added announcement to favorites
+    :param now: datetime
+    :return: float
+    """
+    now = now or timezone.now()
+    age_days = max((now - created_at).total_seconds(), 0) / 86400
+    freshness = 0.5 ** (age_days / FRESHNESS_HALF_LIFE_DAYS)
+
+    return PROMOTION_WEIGHT * (efficiency or 0) \
+        + FRESHNESS_WEIGHT * freshness \
+        + ENGAGEMENT_WEIGHT * math.log1p(favorites_amount)
+
+
+def get_rank_queryset(now=None):
+    """
+    Returns rows needed for calculation of rank score. Promotion is taken
+    into account only inside its validity window.
+    :param now: datetime
+    :return: QuerySet
+    """
+    now = now or timezone.now()
+    active_efficiency = Case(
+        When(promotion__starts_at__lte=now, promotion__expires_at__gt=now,
+             then='promotion__promotion_type__efficiency'),
+        default=None
+    )
+    return ChessBoardFlat.objects \
+        .filter(accepted=True, called_off=False) \
+        .annotate(favorites_amount=Count('favorite'), efficiency=active_efficiency) \
+        .values_list('id', 'created_at', 'efficiency', 'favorites_amount', 'rank_score')
+
+
+def refresh_rank_scores(ids=None, batch_size=RANK_BATCH_SIZE) -> int:
+    """
+    Recalculates rank_score of announcements of the feed in batches,
+    walking through the table by primary key.
+    :param ids: list of ids of announcements to refresh, all if None
+    :param batch_size: int
+    :return: amount of updated announcements
+    """
+    now = timezone.now()
+    updated = 0
+    last_id = 0
+
+    while True:
+        queryset = get_rank_queryset(now).filter(id__gt=last_id)
+        if ids is not None:
+            queryset = queryset.filter(id__in=ids)
+        rows = list(queryset.order_by('id')[:batch_size])
+        if not rows:
+            break
+
+        to_update = []
+        for pk, created_at, efficiency, favorites_amount, rank_score in rows:
+            new_score = compute_rank_score(efficiency, created_at, favorites_amount, now)
+            if not math.isclose(new_score, rank_score):
+                to_update.append(ChessBoardFlat(id=pk, rank_score=new_score))
+
+        ChessBoardFlat.objects.bulk_update(to_update, ['rank_score'])
+        updated += len(to_update)
+        last_id = rows[-1][0]
+
+    return updated
+
+
+def refresh_rank_score(chessboard_flat_id) -> None:
+    """
+    Recalculates rank_score of a single announcement, e.g. after it was
+    approved or its promotion changed. Announcements, which are out of the
+    feed, get zero score.
+    :param chessboard_flat_id: int
+    :return: None
+    """
+    if not refresh_rank_scores(ids=[chessboard_flat_id]):
+        ChessBoardFlat.objects \
+            .filter(id=chessboard_flat_id) \
+            .exclude(accepted=True, called_off=False) \
+            .update(rank_score=0)
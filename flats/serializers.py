@@ -1,16 +1,23 @@
+from datetime import timedelta
+
 from django.db import IntegrityError
 from django.db.models import Max, Min
 from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from drf_spectacular.utils import extend_schema_serializer, OpenApiExample
 
 from rest_framework.exceptions import ValidationError
-from rest_framework.fields import CharField, IntegerField, BooleanField, ImageField, DateField
+from rest_framework.fields import CharField, IntegerField, BooleanField, ImageField, DateField, ListField, UUIDField, \
+    ChoiceField, DateTimeField, FileField
 from rest_framework.serializers import ModelSerializer, PrimaryKeyRelatedField, Serializer
 
 from drf_extra_fields.fields import Base64ImageField
 
-from .functions import update_gallery_photos
+from api_swipe.loaders import LoadedRelationMixin, PrimingListSerializer, get_loader
+
+from .functions import create_announcements, update_announcements, update_gallery_photos
+from .moderation import MODERATION_BATCH_MAX_SIZE
 from .models import *
 from users.serializers import AuthRegistrationSerializer
 
@@ -26,16 +33,19 @@ from users.serializers import AuthRegistrationSerializer
         )
     ]
 )
-class ResidentialComplexDisplaySerializer(ModelSerializer):
+class ResidentialComplexDisplaySerializer(LoadedRelationMixin, ModelSerializer):
+    loader_queryset = ResidentialComplex.objects.all()
+
     class Meta:
         model = ResidentialComplex
         fields = ['id', 'name']
+        list_serializer_class = PrimingListSerializer
 
     def to_internal_value(self, data: int) -> ResidentialComplex:
-        try:
-            return ResidentialComplex.objects.get(pk=data)
-        except ResidentialComplex.DoesNotExist:
+        instance = self.load(data)
+        if instance is None:
             raise ValidationError({'detail': _('Вказаного ЖК не існує.')})
+        return instance
 
 
 class PhotoSerializer(ModelSerializer):
@@ -74,15 +84,17 @@ class FlatSquarePriceSerializer(Serializer):
         }
 
 
-class CustomAdditionSerializer(ModelSerializer):
+class CustomAdditionSerializer(LoadedRelationMixin, ModelSerializer):
+    loader_queryset = Addition.objects.all()
+
     class Meta:
         model = Addition
         fields = '__all__'
+        list_serializer_class = PrimingListSerializer
 
     def to_internal_value(self, data):
-        try:
-            instance = Addition.objects.get(pk=data)
-        except Addition.DoesNotExist:
+        instance = self.load(data)
+        if instance is None:
             raise ValidationError({'detail': _('Вказаного додатку немає.')})
         return instance
 
@@ -103,6 +115,23 @@ class AdditionInComplexSerializer(ModelSerializer):
         return addition
 
 
+class NumberedObjectsCreationSerializer(Serializer):
+    """
+    Body of creation of corps, sections or floors. Without fields, one object
+    is created, as before.
+    """
+    count = IntegerField(min_value=1, max_value=100, required=False)
+    names = ListField(child=CharField(max_length=200), min_length=1, max_length=100, required=False)
+
+    def validate(self, attrs):
+        if attrs.get('count') and attrs.get('names'):
+            raise ValidationError({'detail': _('Вкажіть або кількість, або назви.')})
+        names = attrs.get('names') or []
+        if len(set(names)) != len(names):
+            raise ValidationError({'names': _('Назви повторюються.')})
+        return attrs
+
+
 class CorpsSerializer(ModelSerializer):
     name = CharField(read_only=True)
     residential_complex = ResidentialComplexDisplaySerializer(read_only=True)
@@ -209,7 +238,7 @@ class ResidentialComplexListSerializer(ModelSerializer):
 
     class Meta:
         model = ResidentialComplex
-        fields = ['id', 'photo', 'name', 'address', 'flats_information']
+        fields = ['id', 'photo', 'name', 'address', 'latitude', 'longitude', 'flats_information']
 
 
 class ResidentialComplexSerializer(ModelSerializer):
@@ -221,6 +250,15 @@ class ResidentialComplexSerializer(ModelSerializer):
     class Meta:
         model = ResidentialComplex
         exclude = ['gallery']
+        read_only_fields = ['geohash', 'pending_deletion']
+
+    def validate(self, attrs):
+        latitude = attrs.get('latitude', getattr(self.instance, 'latitude', None))
+        longitude = attrs.get('longitude', getattr(self.instance, 'longitude', None))
+        if (latitude is None) != (longitude is None):
+            raise ValidationError({'latitude': _('Широта та довгота повинні бути вказані разом.'),
+                                   'longitude': _('Широта та довгота повинні бути вказані разом.')})
+        return super().validate(attrs)
 
     def create(self, validated_data: dict):
         gallery = validated_data.pop('gallery_photos', None)
@@ -256,6 +294,8 @@ class ResidentialComplexSerializer(ModelSerializer):
 
     def to_representation(self, instance: ResidentialComplex):
         data = super().to_representation(instance=instance)
+        if 'gallery_photos' not in self.fields:
+            return data
         data.update(
             {
                 'gallery_photos': PhotoSerializer(instance=instance.gallery.photo_set.all(), many=True).data,
@@ -273,69 +313,88 @@ class FloorSerializer(ModelSerializer):
         fields = '__all__'
 
 
-class SectionFlatSerializer(ModelSerializer):
+class SectionFlatSerializer(LoadedRelationMixin, ModelSerializer):
+    loader_queryset = Section.objects.select_related('residential_complex')
+
     class Meta:
         model = Section
         fields = ['id', 'name']
+        list_serializer_class = PrimingListSerializer
 
     def to_internal_value(self, data: int):
         try:
             pk = data[0] if isinstance(data, list) else data
-            return Section.objects.select_related('residential_complex').get(pk=pk)
-        except Section.DoesNotExist:
-            raise ValidationError({'section': _('Вказана секція не існує.')})
-        except (TypeError, IndexError):
+        except IndexError:
+            raise ValidationError({'section': _('Неправильно вказано секцію.')})
+        if pk is None or isinstance(pk, (list, dict)):
             raise ValidationError({'section': _('Неправильно вказано секцію.')})
+        instance = self.load(pk)
+        if instance is None:
+            raise ValidationError({'section': _('Вказана секція не існує.')})
+        return instance
+
 
+class FloorFlatSerializer(LoadedRelationMixin, ModelSerializer):
+    loader_queryset = Floor.objects.select_related('residential_complex')
 
-class FloorFlatSerializer(ModelSerializer):
     class Meta:
         model = Floor
         fields = ['id', 'name']
+        list_serializer_class = PrimingListSerializer
 
     def to_internal_value(self, data: int):
         try:
             pk = data[0] if isinstance(data, list) else data
-            return Floor.objects.select_related('residential_complex').get(pk=pk)
-        except Floor.DoesNotExist:
-            raise ValidationError({'floor': _('Вказаний поверх не існує.')})
-        except (TypeError, IndexError):
+        except IndexError:
+            raise ValidationError({'floor': _('Неправильно вказано поверх.')})
+        if pk is None or isinstance(pk, (list, dict)):
             raise ValidationError({'floor': _('Неправильно вказано поверх.')})
+        instance = self.load(pk)
+        if instance is None:
+            raise ValidationError({'floor': _('Вказаний поверх не існує.')})
+        return instance
+
 
+class CorpsFlatSerializer(LoadedRelationMixin, ModelSerializer):
+    loader_queryset = Corps.objects.select_related('residential_complex')
 
-class CorpsFlatSerializer(ModelSerializer):
     class Meta:
         model = Corps
         fields = ['id', 'name']
+        list_serializer_class = PrimingListSerializer
 
     def to_internal_value(self, data: int):
         try:
             pk = data[0] if isinstance(data, list) else data
-            return Corps.objects.select_related('residential_complex').get(pk=pk)
-        except Corps.DoesNotExist:
-            raise ValidationError({'corps': _('Вказаний корпус не існує.')})
-        except (TypeError, IndexError):
+        except IndexError:
+            raise ValidationError({'corps': _('Неправильно вказано корпус.')})
+        if pk is None or isinstance(pk, (list, dict)):
             raise ValidationError({'corps': _('Неправильно вказано корпус.')})
+        instance = self.load(pk)
+        if instance is None:
+            raise ValidationError({'corps': _('Вказаний корпус не існує.')})
+        return instance
 
 
-class FlatListSerializer(ModelSerializer):
+class FlatListSerializer(LoadedRelationMixin, ModelSerializer):
     corps = CorpsFlatSerializer()
     floor = FloorFlatSerializer()
     section = SectionFlatSerializer()
     residential_complex = ResidentialComplexDisplaySerializer()
+    loader_queryset = Flat.objects.select_related('residential_complex', 'section', 'corps')
 
     class Meta:
         model = Flat
         fields = ['id', 'corps', 'floor', 'section', 'scheme', 'residential_complex']
+        list_serializer_class = PrimingListSerializer
 
     def to_internal_value(self, data: int):
-        try:
-            flat = Flat.objects.select_related('residential_complex', 'section', 'corps').get(pk=data)
-            return flat
-        except Flat.DoesNotExist:
-            raise ValidationError({'detail': _('Вказаної квартири не існує.')})
-        except TypeError:
+        if data is None or isinstance(data, (list, dict)):
             raise ValidationError({'detail': _('Неправильно вказано квартиру.')})
+        flat = self.load(data)
+        if flat is None:
+            raise ValidationError({'detail': _('Вказаної квартири не існує.')})
+        return flat
 
 
 class FlatBuilderSerializer(ModelSerializer):
@@ -506,7 +565,23 @@ class PromotionTypeDisplaySerializer(ModelSerializer):
 
     class Meta:
         model = PromotionType
-        fields = ['name', 'price', 'efficiency']
+        fields = ['name', 'price', 'efficiency', 'duration']
+
+
+ANNOUNCEMENT_BATCH_MAX_SIZE = 100
+
+
+class AnnouncementBatchSerializer(PrimingListSerializer):
+    """
+    Creates and updates list of announcements together, by few bulk
+    statements instead of statements per announcement and photo.
+    """
+
+    def create(self, validated_data):
+        return create_announcements(self.context.get('user'), validated_data)
+
+    def update(self, instance, validated_data):
+        return update_announcements(instance, validated_data)
 
 
 @extend_schema_serializer(
@@ -560,6 +635,8 @@ class ChessBoardFlatAnnouncementSerializer(ModelSerializer):
     class Meta:
         model = ChessBoardFlat
         exclude = ['flat', 'gallery']
+        read_only_fields = ['rank_score', 'claimed_by', 'claim_expires_at']
+        list_serializer_class = AnnouncementBatchSerializer
 
     def create(self, validated_data):
         gallery_photos = validated_data.pop('gallery_photos', None)
@@ -592,6 +669,8 @@ class ChessBoardFlatAnnouncementSerializer(ModelSerializer):
 
     def to_representation(self, instance: ChessBoardFlat):
         data = super().to_representation(instance)
+        if 'gallery_photos' not in self.fields:
+            return data
         data.update(
             {
                 'gallery_photos': PhotoSerializer(instance=instance.gallery.photo_set.all().order_by('sequence_number'),
@@ -628,6 +707,7 @@ class AnnouncementApproveSerializer(ModelSerializer):
     class Meta:
         model = ChessBoardFlat
         exclude = ['gallery']
+        read_only_fields = ['rank_score', 'claimed_by', 'claim_expires_at']
 
     def validate(self, attrs):
         # checking whether flat is absent while 'accepted' set to True
@@ -712,6 +792,7 @@ class PromotionSerializer(ModelSerializer):
     class Meta:
         model = Promotion
         fields = '__all__'
+        read_only_fields = ['starts_at', 'expires_at']
 
     def validate(self, attrs):
         super().validate(attrs)
@@ -724,15 +805,69 @@ class PromotionSerializer(ModelSerializer):
         return attrs
 
     def create(self, validated_data):
+        starts_at = timezone.now()
         instance = Promotion.objects.create(
             chessboard_flat=self.context.get('chessboard_flat'),
             promotion_type=self.context.get('promotion_type'),
+            starts_at=starts_at,
+            expires_at=starts_at + timedelta(days=self.context.get('promotion_type').duration),
             **validated_data
         )
 
         return instance
 
 
+class ModerationClaimSerializer(Serializer):
+    amount = IntegerField(min_value=1, max_value=MODERATION_BATCH_MAX_SIZE, default=10)
+
+
+class ModerationApproveItemSerializer(Serializer):
+    id = IntegerField(min_value=1)
+    flat = IntegerField(min_value=1)
+
+
+class ModerationApproveSerializer(Serializer):
+    announcements = ModerationApproveItemSerializer(many=True, allow_empty=False,
+                                                    max_length=MODERATION_BATCH_MAX_SIZE)
+
+
+class ModerationCallOffSerializer(Serializer):
+    announcements = ListField(child=IntegerField(min_value=1), max_length=MODERATION_BATCH_MAX_SIZE,
+                              allow_empty=False)
+    rejection_reason = ChoiceField(choices=ChessBoardFlat.RejectionOptions.choices)
+
+
+class ModerationDeleteSerializer(Serializer):
+    announcements = ListField(child=IntegerField(min_value=1), max_length=MODERATION_BATCH_MAX_SIZE,
+                              allow_empty=False)
+
+
+MAX_ANNOUNCEMENT_ID = 2 ** 63 - 1    # ids beyond bigint are rejected before they reach redis or database
+
+
+class DeckSeenSerializer(Serializer):
+    """
+    List of announcements, which user has swiped.
+    """
+    announcements = ListField(child=IntegerField(min_value=1, max_value=MAX_ANNOUNCEMENT_ID), max_length=500,
+                              allow_empty=False)
+
+
+class SwipeEventSerializer(Serializer):
+    event_id = UUIDField(required=False)
+    announcement = IntegerField(min_value=1, max_value=MAX_ANNOUNCEMENT_ID)
+    action = ChoiceField(choices=SwipeEvent.ActionChoice.choices)
+    created_at = DateTimeField(required=False)
+
+
+class SwipeEventBatchSerializer(Serializer):
+    """
+    Batch of swipes, sent by client. Announcements are not checked against
+    database here, as events are written there asynchronously.
+    """
+    events = SwipeEventSerializer(many=True, allow_empty=False, max_length=500)
+
+
 class FavoriteChessBoardFlatSerializer(ModelSerializer):
     chessboard_flat = ChessBoardFlatAnnouncementListSerializer()
 
@@ -756,9 +891,8 @@ class FavoriteChessBoardFlatSerializer(ModelSerializer):
         if not isinstance(chessboard_flat_pk, int):
             raise error
 
-        try:
-            ret['chessboard_flat'] = ChessBoardFlat.objects.get(pk=chessboard_flat_pk)
-        except ChessBoardFlat.DoesNotExist:
+        ret['chessboard_flat'] = get_loader().load(ChessBoardFlat.objects.all(), chessboard_flat_pk)
+        if ret['chessboard_flat'] is None:
             raise error
 
         return ret
@@ -787,9 +921,103 @@ class FavoriteResidentialComplexSerializer(ModelSerializer):
         if not isinstance(residential_complex_pk, int):
             raise error
 
-        try:
-            ret['residential_complex'] = ResidentialComplex.objects.get(pk=residential_complex_pk)
-        except ResidentialComplex.DoesNotExist:
+        ret['residential_complex'] = get_loader().load(ResidentialComplex.objects.all(), residential_complex_pk)
+        if ret['residential_complex'] is None:
             raise error
 
         return ret
+
+
+class SyncFavoriteSerializer(ModelSerializer):
+
+    class Meta:
+        model = Favorite
+        fields = ['id', 'chessboard_flat', 'residential_complex', 'updated_at']
+
+
+class SyncDeletedSerializer(Serializer):
+    announcements = ListField(child=IntegerField())
+    favorites = ListField(child=IntegerField())
+    residential_complexes = ListField(child=IntegerField())
+
+
+class SyncSerializer(Serializer):
+    """
+    Changes since previous sync. Client should apply deletions first and
+    then upsert changed objects; if reset is true, cache should be dropped.
+    """
+    token = CharField()
+    reset = BooleanField()
+    has_more = BooleanField()
+    announcements = ChessBoardFlatAnnouncementListSerializer(many=True)
+    favorites = SyncFavoriteSerializer(many=True)
+    deleted = SyncDeletedSerializer()
+
+
+FLAT_IMPORT_MAX_FILE_SIZE = 5 * 1024 * 1024
+
+
+class FlatImportRowSerializer(Serializer):
+    """
+    Validates one row of CSV file with flats. Corps, section and floor are
+    given by names and resolved by the import itself.
+    """
+    corps = CharField(max_length=200)
+    section = CharField(max_length=200)
+    floor = CharField(max_length=200)
+    district = CharField(max_length=200)
+    micro_district = CharField(max_length=200)
+    room_amount = IntegerField(min_value=1, max_value=6)
+    square = IntegerField(min_value=1)
+    price = IntegerField(min_value=1)
+    condition = ChoiceField(choices=Flat.ConditionType.choices)
+
+
+class FlatImportSerializer(ModelSerializer):
+    file = FileField(write_only=True)
+
+    class Meta:
+        model = FlatImport
+        fields = ['id', 'file', 'status', 'total_rows', 'processed_rows', 'created_rows', 'errors', 'created_at',
+                  'finished_at']
+        read_only_fields = ['status', 'total_rows', 'processed_rows', 'created_rows', 'errors', 'finished_at']
+
+    def validate_file(self, value):
+        if value.size > FLAT_IMPORT_MAX_FILE_SIZE:
+            raise ValidationError(_('Файл завеликий.'))
+        if not value.name.lower().endswith('.csv'):
+            raise ValidationError(_('Файл має бути у форматі CSV.'))
+        return value
+
+    def create(self, validated_data):
+        return FlatImport.objects.create(
+            residential_complex=self.context.get('residential_complex'),
+            creator=self.context.get('user'),
+            **validated_data
+        )
+
+
+class ArchivedPromotionSerializer(ModelSerializer):
+    promotion_type = PromotionTypeDisplaySerializer(read_only=True)
+
+    class Meta:
+        model = ArchivedPromotion
+        exclude = ['chessboard_flat']
+
+
+class ArchivedAnnouncementSerializer(ModelSerializer):
+    residential_complex = ResidentialComplexDisplaySerializer(read_only=True)
+    promotion = ArchivedPromotionSerializer(read_only=True)
+    gallery_photos = PhotoSerializer(source='gallery.photo_set', many=True, read_only=True)
+
+    class Meta:
+        model = ArchivedAnnouncement
+        exclude = ['gallery']
+
+
+class ArchivedAnnouncementListSerializer(ModelSerializer):
+
+    class Meta:
+        model = ArchivedAnnouncement
+        fields = ['id', 'residential_complex', 'creator', 'main_photo', 'address', 'price', 'accepted', 'called_off',
+                  'rejection_reason', 'created_at', 'archived_at']
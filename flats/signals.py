@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import ChessBoardFlat, Favorite, ResidentialComplex, Tombstone
+from .sync import record_tombstones
+
+
+@receiver(post_delete, sender=ChessBoardFlat)
+def record_announcement_deletion(sender, instance, **kwargs):
+    if instance.accepted and not instance.called_off:
+        record_tombstones(Tombstone.KindChoice.announcement, [instance.id])
+
+
+@receiver(post_delete, sender=Favorite)
+def record_favorite_deletion(sender, instance, **kwargs):
+    record_tombstones(Tombstone.KindChoice.favorite, [instance.id], user_id=instance.user_id)
+
+
+@receiver(post_delete, sender=ResidentialComplex)
+def record_residential_complex_deletion(sender, instance, **kwargs):
+    record_tombstones(Tombstone.KindChoice.residential_complex, [instance.id])
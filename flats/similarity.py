@@ -0,0 +1,308 @@
+import json
+import os
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ChessBoardFlat
+
+
+NUMERIC_FEATURES = ['price', 'overall_square', 'kitchen_square', 'room_amount']
+PLANNING_CHOICES = [value for value, _ in ChessBoardFlat.PlanningChoice.choices]
+HOUSE_CONDITION_CHOICES = [value for value, _ in ChessBoardFlat.HouseCondition.choices]
+DISTRICT_BUCKETS = 16
+COMPLEX_BUCKETS = 32
+
+NUMERIC_WEIGHT = 1.0
+CATEGORICAL_WEIGHT = 0.5
+COMPLEX_WEIGHT = 0.3
+
+FEATURES_AMOUNT = len(NUMERIC_FEATURES) + len(PLANNING_CHOICES) + len(HOUSE_CONDITION_CHOICES) \
+    + DISTRICT_BUCKETS + COMPLEX_BUCKETS
+
+BUILD_CHUNK_SIZE = 5000
+
+
+def get_similarity_queryset():
+    return ChessBoardFlat.objects \
+        .filter(accepted=True, called_off=False) \
+        .order_by('id') \
+        .values_list('id', *NUMERIC_FEATURES, 'planning', 'house_condition', 'flat__district',
+                     'residential_complex_id')
+
+
+def get_bucket(value, buckets: int) -> int:
+    # crc32 is stable between processes, unlike built-in hash() of strings
+    return zlib.crc32(str(value or '').strip().lower().encode()) % buckets
+
+
+def build_vectors(rows: list, minimums: np.ndarray, maximums: np.ndarray) -> np.ndarray:
+    """
+    Converts rows of get_similarity_queryset() into matrix of weighted
+    features. Numeric features are scaled into [0, 1], categorical ones are
+    one-hot encoded.
+    :param rows: list of tuples
+    :param minimums: minimal values of numeric features
+    :param maximums: maximal values of numeric features
+    :return: float32 matrix of shape (len(rows), FEATURES_AMOUNT)
+    """
+    vectors = np.zeros((len(rows), FEATURES_AMOUNT), dtype=np.float32)
+    if not rows:
+        return vectors
+
+    numeric_end = len(NUMERIC_FEATURES)
+    numeric = np.array([row[1:numeric_end + 1] for row in rows], dtype=np.float64)
+    numeric[:, 0] = np.log1p(numeric[:, 0])    # prices differ in orders of magnitude
+    spread = np.where(maximums > minimums, maximums - minimums, 1.0)
+    vectors[:, :numeric_end] = NUMERIC_WEIGHT * np.clip((numeric - minimums) / spread, 0.0, 1.0)
+
+    row_indexes = np.arange(len(rows))
+    offset = numeric_end
+    planning = [PLANNING_CHOICES.index(row[5]) if row[5] in PLANNING_CHOICES else -1 for row in rows]
+    condition = [HOUSE_CONDITION_CHOICES.index(row[6]) if row[6] in HOUSE_CONDITION_CHOICES else -1 for row in rows]
+    for values, width, weight in ((planning, len(PLANNING_CHOICES), CATEGORICAL_WEIGHT),
+                                  (condition, len(HOUSE_CONDITION_CHOICES), CATEGORICAL_WEIGHT)):
+        values = np.array(values)
+        known = values >= 0
+        vectors[row_indexes[known], offset + values[known]] = weight
+        offset += width
+
+    vectors[row_indexes, offset + np.array([get_bucket(row[7], DISTRICT_BUCKETS) for row in rows])] = \
+        CATEGORICAL_WEIGHT
+    offset += DISTRICT_BUCKETS
+    vectors[row_indexes, offset + np.array([get_bucket(row[8], COMPLEX_BUCKETS) for row in rows])] = \
+        COMPLEX_WEIGHT
+    return vectors
+
+
+def get_numeric_bounds(queryset) -> tuple:
+    numeric = np.array(list(queryset.values_list(*NUMERIC_FEATURES)), dtype=np.float64) \
+        .reshape(-1, len(NUMERIC_FEATURES))
+    if not len(numeric):
+        return np.zeros(len(NUMERIC_FEATURES)), np.ones(len(NUMERIC_FEATURES))
+    numeric[:, 0] = np.log1p(numeric[:, 0])
+    return numeric.min(axis=0), numeric.max(axis=0)
+
+
+METRICS = ['cosine', 'l2']
+
+
+def top_k(matrix: np.ndarray, norms: np.ndarray, ids: np.ndarray, queries: np.ndarray, k: int,
+          metric: str = 'cosine', exclude=None) -> list:
+    """
+    Finds k nearest rows of matrix for every query vector. Both metrics are
+    derived from one matrix multiplication of the whole batch of queries.
+    :param matrix: vectors of shape (n, d)
+    :param norms: lengths of rows of matrix
+    :param ids: sorted ids of rows of matrix
+    :param queries: vectors of shape (b, d)
+    :param k: amount of neighbours
+    :param metric: 'cosine' or 'l2'
+    :param exclude: ids to exclude from result of every query, e.g. itself
+    :return: list of lists of ids, most similar first
+    """
+    if not len(ids) or not k:
+        return [[] for _ in range(len(queries))]
+    dot = queries @ matrix.T     # (b, n)
+    query_norms = np.linalg.norm(queries, axis=1)
+    if metric == 'l2':
+        # ||q - m||^2 = ||q||^2 + ||m||^2 - 2 q.m, negated so that bigger is closer
+        scores = 2 * dot - query_norms[:, None] ** 2 - norms[None, :] ** 2
+    else:
+        scores = dot / np.maximum(query_norms[:, None] * norms[None, :], 1e-12)
+
+    if exclude is not None:
+        positions = np.searchsorted(ids, exclude)
+        valid = (positions < len(ids)) & (ids[np.minimum(positions, len(ids) - 1)] == exclude)
+        scores[np.arange(len(queries))[valid], positions[valid]] = -np.inf
+
+    k = min(k, scores.shape[1])
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    result = []
+    for row, row_candidates in enumerate(candidates):
+        ordered = row_candidates[np.argsort(-scores[row, row_candidates])]
+        result.append([int(ids[index]) for index in ordered if np.isfinite(scores[row, index])])
+    return result
+
+
+class SimilarityIndex:
+    """
+    Matrix of features of announcements of the feed, stored in files and
+    memory-mapped by every process, so the OS shares one copy of it between
+    workers. Files are rebuilt by Celery: new announcements are appended
+    into reserved capacity, while full rebuild replaces files atomically.
+    """
+    directory = settings.SIMILARITY_INDEX_DIR
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or self.directory
+        # (meta, matrix, ids, norms), replaced by one assignment, so concurrent threads never see a mix of versions
+        self._state = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._path('meta.json')) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, meta: dict) -> None:
+        temporary_path = self._path('meta.json.tmp')
+        with open(temporary_path, 'w') as file:
+            json.dump(meta, file)
+        os.replace(temporary_path, self._path('meta.json'))
+
+    def load(self):
+        """
+        Maps files into memory, if they were changed since last load.
+        :return: state (meta, matrix, ids, norms) or None, if index does not exist
+        """
+        meta = self._read_meta()
+        if meta is None:
+            return None
+        state = self._state
+        if state is None or (state[0].get('version'), state[0].get('size')) != (meta.get('version'), meta.get('size')):
+            size = meta.get('size')
+            matrix = np.load(self._path(meta.get('matrix')), mmap_mode='r')[:size]
+            ids = np.load(self._path(meta.get('ids')), mmap_mode='r')[:size]
+            state = (meta, matrix, ids, np.linalg.norm(matrix, axis=1))
+            self._state = state
+        return state
+
+    def rebuild(self) -> int:
+        """
+        Builds index of all announcements of the feed from scratch.
+        :return: amount of indexed announcements
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        queryset = get_similarity_queryset()
+        minimums, maximums = get_numeric_bounds(queryset)
+        amount = queryset.count()
+        capacity = max(int(amount * 1.5), 1024)
+        version = timezone.now().strftime('%Y%m%d%H%M%S%f')
+        matrix_name, ids_name = f'matrix-{version}.npy', f'ids-{version}.npy'
+
+        matrix = np.lib.format.open_memmap(self._path(matrix_name), mode='w+', dtype=np.float32,
+                                           shape=(capacity, FEATURES_AMOUNT))
+        ids = np.lib.format.open_memmap(self._path(ids_name), mode='w+', dtype=np.int64, shape=(capacity,))
+        size = 0
+        chunk = []
+        for row in queryset.iterator(chunk_size=BUILD_CHUNK_SIZE):
+            chunk.append(row)
+            if len(chunk) == BUILD_CHUNK_SIZE or size + len(chunk) == capacity:
+                size = self._write_rows(matrix, ids, size, chunk, minimums, maximums)
+                chunk = []
+                if size == capacity:
+                    break
+        size = self._write_rows(matrix, ids, size, chunk, minimums, maximums)
+        matrix.flush()
+        ids.flush()
+
+        old_meta = self._read_meta()
+        self._write_meta({
+            'version': version,
+            'matrix': matrix_name,
+            'ids': ids_name,
+            'size': size,
+            'capacity': capacity,
+            'last_id': int(ids[size - 1]) if size else 0,
+            'minimums': minimums.tolist(),
+            'maximums': maximums.tolist(),
+        })
+        if old_meta:
+            for name in (old_meta.get('matrix'), old_meta.get('ids')):
+                try:
+                    os.remove(self._path(name))
+                except FileNotFoundError:
+                    pass
+        return size
+
+    def update(self) -> int:
+        """
+        Appends announcements, created since last build, into reserved
+        capacity of the files. Falls back to full rebuild, when there is no
+        index yet or capacity is exhausted. Changed and removed announcements
+        are refreshed by periodic full rebuild.
+        :return: amount of appended announcements
+        """
+        meta = self._read_meta()
+        if meta is None:
+            return self.rebuild()
+
+        rows = list(get_similarity_queryset().filter(id__gt=meta.get('last_id')))
+        if not rows:
+            return 0
+        if meta.get('size') + len(rows) > meta.get('capacity'):
+            return self.rebuild()
+
+        matrix = np.load(self._path(meta.get('matrix')), mmap_mode='r+')
+        ids = np.load(self._path(meta.get('ids')), mmap_mode='r+')
+        size = self._write_rows(matrix, ids, meta.get('size'), rows,
+                                np.array(meta.get('minimums')), np.array(meta.get('maximums')))
+        matrix.flush()
+        ids.flush()
+
+        meta.update({'size': size, 'last_id': int(ids[size - 1])})
+        self._write_meta(meta)
+        return len(rows)
+
+    @staticmethod
+    def _write_rows(matrix, ids, size: int, rows: list, minimums, maximums) -> int:
+        if not rows:
+            return size
+        matrix[size:size + len(rows)] = build_vectors(rows, minimums, maximums)
+        ids[size:size + len(rows)] = [row[0] for row in rows]
+        return size + len(rows)
+
+    @staticmethod
+    def get_vectors(state: tuple, announcement_ids: list) -> tuple:
+        """
+        Returns vectors of announcements: from the matrix for indexed ones,
+        and built from database for ones appeared since last update.
+        :param state: (meta, matrix, ids, norms) returned by load()
+        :param announcement_ids: list of ids
+        :return: (found ids, matrix of their vectors)
+        """
+        meta, matrix, ids, _ = state
+        announcement_ids = np.array(sorted(set(announcement_ids)), dtype=np.int64)
+        positions = np.searchsorted(ids, announcement_ids)
+        indexed = (positions < len(ids)) \
+            & (ids[np.minimum(positions, max(len(ids) - 1, 0))] == announcement_ids) \
+            if len(ids) else np.zeros(len(announcement_ids), dtype=bool)
+
+        found_ids = list(announcement_ids[indexed])
+        vectors = [np.asarray(matrix[positions[indexed]])]
+        missing = announcement_ids[~indexed]
+        if len(missing):
+            rows = list(get_similarity_queryset().filter(id__in=missing.tolist()))
+            found_ids += [row[0] for row in rows]
+            vectors.append(build_vectors(rows, np.array(meta.get('minimums')),
+                                         np.array(meta.get('maximums'))))
+        return [int(pk) for pk in found_ids], np.vstack(vectors)
+
+    def similar(self, announcement_ids: list, k: int = 10, metric: str = 'cosine') -> dict:
+        """
+        Finds k most similar announcements for each of given ones in one
+        batched matrix multiplication.
+        :param announcement_ids: list of ids
+        :param k: amount of neighbours
+        :param metric: 'cosine' or 'l2'
+        :return: dict id -> list of similar ids, most similar first
+        """
+        state = self.load()
+        if state is None:
+            return {pk: [] for pk in announcement_ids}
+        _, matrix, ids, norms = state
+        found_ids, vectors = self.get_vectors(state, announcement_ids)
+        neighbours = top_k(matrix, norms, ids, vectors, k, metric, exclude=np.array(found_ids, dtype=np.int64))
+        result = {pk: [] for pk in announcement_ids}
+        result.update(dict(zip(found_ids, neighbours)))
+        return result
+
+
+similarity_index = SimilarityIndex()
@@ -0,0 +1,133 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import ForeignKey, OneToOneField
+
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer, ModelSerializer
+
+
+def parse_field_tree(value: str) -> dict:
+    """
+    Parses comma-separated list of dotted paths into tree, e.g.
+    'id,creator.name' -> {'id': {}, 'creator': {'name': {}}}.
+    :param value: str
+    :return: dict
+    """
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in filter(None, path.strip().split('.')):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def prune_serializer(serializer, tree: dict, expand: dict) -> None:
+    """
+    Leaves in serializer only fields from the tree. Nested serializers,
+    which are neither expanded nor narrowed down by dotted path, are
+    replaced with primary key of the relation.
+    :param serializer: Serializer
+    :param tree: requested fields
+    :param expand: nested fields to render as objects
+    :return: None
+    """
+    fields = serializer.fields
+    for name in list(fields):
+        if name not in tree:
+            fields.pop(name)
+
+    for name, field in list(fields.items()):
+        nested = field.child if isinstance(field, ListSerializer) else field
+        if not isinstance(nested, BaseSerializer) or field.source == '*':
+            continue
+        if tree.get(name):
+            prune_serializer(nested, tree.get(name), expand.get(name, {}))
+        elif name in expand:
+            if expand.get(name):
+                prune_serializer(nested, {key: {} for key in nested.fields}, expand.get(name))
+        elif isinstance(field, ModelSerializer) and '.' not in field.source:
+            source = {'source': field.source} if field.source != name else {}
+            fields[name] = PrimaryKeyRelatedField(read_only=True, **source)
+
+
+def get_projection(serializer, model, prefix: str = ''):
+    """
+    Collects columns and relations, which serializer reads from the model.
+    Returns None if some field reads anything, that can not be told from
+    its source, so that queryset is left as it is.
+    :param serializer: Serializer
+    :param model: Model
+    :param prefix: lookup path to the model
+    :return: (list of columns for only(), list of relations for select_related()) or None
+    """
+    only, select_related = [f'{prefix}{model._meta.pk.name}'], []
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*' or len(field.source_attrs) != 1:
+            return None
+        try:
+            model_field = model._meta.get_field(field.source_attrs[0])
+        except FieldDoesNotExist:
+            return None
+        lookup = f'{prefix}{model_field.name}'
+        if not model_field.is_relation:
+            only.append(lookup)
+        elif isinstance(field, PrimaryKeyRelatedField) and model_field.concrete:
+            only.append(lookup)
+        elif isinstance(field, BaseSerializer) and isinstance(model_field, (ForeignKey, OneToOneField)) \
+                and not isinstance(field, ListSerializer):
+            nested = get_projection(field, model_field.related_model, prefix=f'{lookup}__')
+            if nested is None:
+                return None
+            only.append(lookup)
+            only.extend(nested[0])
+            select_related.append(lookup)
+            select_related.extend(nested[1])
+        else:
+            return None
+    return only, select_related
+
+
+class SparseFieldsMixin:
+    """
+    Lets clients choose fields of responses of read actions by query params:
+    ?fields=id,price,creator.name&expand=residential_complex. Unlisted
+    fields are removed from serializer and, where possible, from SQL by
+    only(). Without params responses are unchanged.
+    """
+    sparse_actions = ()
+
+    def get_field_trees(self):
+        """
+        :return: (fields tree, expand tree) or None if fields are not chosen
+        """
+        if self.request is None or self.request.method != 'GET' or self.action not in self.sparse_actions \
+                or not self.request.query_params.get('fields'):
+            return None
+        return parse_field_tree(self.request.query_params.get('fields')), \
+            parse_field_tree(self.request.query_params.get('expand', ''))
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        trees = self.get_field_trees()
+        if trees is not None:
+            prune_serializer(serializer.child if isinstance(serializer, ListSerializer) else serializer, *trees)
+        return serializer
+
+    def project_queryset(self, queryset):
+        """
+        Restricts queryset to columns, which are rendered by chosen fields.
+        :param queryset: QuerySet
+        :return: QuerySet
+        """
+        if self.get_field_trees() is None:
+            return queryset
+        projection = get_projection(self.get_serializer(), queryset.model)
+        if projection is None:
+            return queryset
+        only, select_related = projection
+        queryset = queryset.select_related(None).prefetch_related(None)
+        # select_related() without arguments would follow every relation
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        return queryset.only(*only)
@@ -0,0 +1,363 @@
+import json
+import uuid
+
+import redis
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from users.models import User
+from .models import ChessBoardFlat, Favorite, SwipeEvent
+
+
+_connection = None
+
+
+def get_redis_connection() -> redis.Redis:
+    """
+    Returns Redis connection shared inside the process. Connection pool of
+    redis-py is thread-safe, so one client is enough.
+    :return: Redis
+    """
+    global _connection
+    if _connection is None:
+        _connection = redis.Redis.from_url(settings.REDIS_URL)
+    return _connection
+
+
+class SeenSet:
+    """
+    Set of announcements, which user has already swiped. Stored as Redis
+    bitmaps, where bit with number of announcement's id is set. Bitmap is
+    split into chunks of CHUNK_SIZE bits, so memory is spent only on ranges
+    of ids, which user has actually seen, and never exceeds 1 bit per id.
+    """
+    CHUNK_SIZE = 2 ** 16    # 8 KB of memory per chunk
+    KEY_PREFIX = 'swipe:seen'
+
+    def __init__(self, user_id: int, connection: redis.Redis = None):
+        self.user_id = user_id
+        self.connection = connection or get_redis_connection()
+
+    def _get_key(self, chunk: int) -> str:
+        return f'{self.KEY_PREFIX}:{self.user_id}:{chunk}'
+
+    def _get_chunks_key(self) -> str:
+        return f'{self.KEY_PREFIX}:{self.user_id}:chunks'
+
+    def add(self, ids, pipeline=None) -> None:
+        """
+        Marks announcements as seen in one round trip.
+        :param ids: iterable of ids of announcements
+        :param pipeline: if given, commands are only queued into it
+        :return: None
+        """
+        execute = pipeline is None
+        pipeline = pipeline or self.connection.pipeline(transaction=False)
+        chunks = set()
+        for pk in ids:
+            chunk, offset = divmod(int(pk), self.CHUNK_SIZE)
+            pipeline.setbit(self._get_key(chunk), offset, 1)
+            chunks.add(chunk)
+        if chunks:
+            pipeline.sadd(self._get_chunks_key(), *chunks)
+            if execute:
+                pipeline.execute()
+
+    def contains(self, ids) -> list:
+        """
+        Checks whether each of announcements is seen, in one round trip.
+        :param ids: list of ids of announcements
+        :return: list of booleans in the same order as ids
+        """
+        if not ids:
+            return []
+        pipeline = self.connection.pipeline(transaction=False)
+        for pk in ids:
+            chunk, offset = divmod(int(pk), self.CHUNK_SIZE)
+            pipeline.getbit(self._get_key(chunk), offset)
+        return [bool(bit) for bit in pipeline.execute()]
+
+    def filter_unseen(self, ids) -> list:
+        """
+        :param ids: list of ids of announcements
+        :return: ids, which user has not seen yet, in the same order
+        """
+        return [pk for pk, seen in zip(ids, self.contains(ids)) if not seen]
+
+    def clear(self) -> None:
+        chunks = self.connection.smembers(self._get_chunks_key())
+        keys = [self._get_key(int(chunk)) for chunk in chunks]
+        self.connection.delete(self._get_chunks_key(), *keys)
+
+
+DECK_SCAN_FACTOR = 3
+DECK_MAX_SCANS = 10
+DECK_MAX_BATCH = 5000
+
+
+class DeckCursor:
+    """
+    Position in the feed, before which user has swiped every announcement,
+    stored per user and set of filters. Deck is collected from it, so
+    announcements seen long ago are not scanned again on every request.
+    Ranks are recomputed, so the cursor expires and the scan starts from
+    the top of the feed again when it runs out of announcements.
+    """
+    KEY_PREFIX = 'swipe:deck'
+    TTL = 60 * 60   # seconds
+
+    def __init__(self, user_id: int, scope: str = '', connection: redis.Redis = None):
+        self.key = f'{self.KEY_PREFIX}:{user_id}:{scope}'
+        self.connection = connection or get_redis_connection()
+
+    def get(self):
+        """
+        :return: (id, rank_score) of the last passed announcement or None
+        """
+        value = self.connection.get(self.key)
+        if value is None:
+            return None
+        pk, rank_score = value.decode().split(':')
+        return int(pk), float(rank_score)
+
+    def set(self, position) -> None:
+        if position is None:
+            self.connection.delete(self.key)
+        else:
+            self.connection.set(self.key, f'{position[0]}:{position[1]!r}', ex=self.TTL)
+
+
+def collect_deck(queryset, seen_set: SeenSet, size: int, cursor: DeckCursor = None) -> list:
+    """
+    Walks through the feed in its index order by keyset pagination and
+    collects ids of announcements, which user has not swiped yet. Every
+    step fetches only ids and scores, and checks them against seen-set in
+    one round trip. Batches grow while they contain only seen announcements,
+    and the walk starts from the cursor, so cost depends on size of the
+    deck rather than on how many announcements user has already seen.
+    :param queryset: feed QuerySet ordered by (-rank_score, -id)
+    :param seen_set: SeenSet
+    :param size: amount of announcements in the deck
+    :param cursor: DeckCursor, which is moved past announcements seen from its position
+    :return: list of ids
+    """
+    deck = []
+    start = cursor.get() if cursor is not None else None
+    last = passed = start
+    batch_size = size * DECK_SCAN_FACTOR
+    wrapped = start is None
+
+    for _ in range(DECK_MAX_SCANS):
+        page = queryset
+        if last is not None:
+            page = page.filter(Q(rank_score__lt=last[1]) | Q(rank_score=last[1], id__lt=last[0]))
+        candidates = list(page.values_list('id', 'rank_score')[:batch_size])
+        if not candidates:
+            if wrapped:
+                break
+            # announcements, whose rank has risen above the cursor, are found from the top
+            wrapped = True
+            last = None
+            if not deck:
+                passed = None
+            continue
+
+        for candidate, seen in zip(candidates, seen_set.contains([pk for pk, _ in candidates])):
+            if not seen:
+                if candidate[0] not in deck:    # already found below the cursor before wrapping
+                    deck.append(candidate[0])
+            elif not deck:
+                passed = candidate
+            if len(deck) >= size:
+                break
+        if len(deck) >= size:
+            break
+        last = candidates[-1]
+        batch_size = min(batch_size * 2, DECK_MAX_BATCH)
+
+    if cursor is not None and passed != start:
+        cursor.set(passed)
+    return deck
+
+
+class SwipeEventBuffer:
+    """
+    Redis stream, which buffers swipe events between requests and database.
+    Requests only append batches of events to the stream, while Celery
+    consumer reads it through consumer group and writes events into
+    SwipeEvent table in bulk. Entries are acknowledged only after their
+    events are committed, so every event is stored at least once, and
+    redelivered duplicates are dropped by unique event_id.
+    """
+    STREAM_KEY = 'swipe:events'
+    DEAD_LETTER_KEY = 'swipe:events:dead'
+    DEAD_LETTER_MAX_LENGTH = 10000
+    GROUP_NAME = 'swipe-events-flushers'
+    MAX_BACKLOG = 100000    # entries, above it new batches are rejected
+    READ_COUNT = 200        # entries per one flush
+    CLAIM_IDLE_TIME = 60000     # ms, after which entry of fallen consumer is taken over
+
+    def __init__(self, connection: redis.Redis = None):
+        self.connection = connection or get_redis_connection()
+
+    def is_overloaded(self) -> bool:
+        """
+        Consumer deletes flushed entries, so length of the stream is the
+        amount of events waiting for database.
+        :return: bool
+        """
+        return self.connection.xlen(self.STREAM_KEY) >= self.MAX_BACKLOG
+
+    def push(self, user_id: int, events: list) -> None:
+        """
+        Appends batch of events of one user to the stream and marks swiped
+        announcements as seen, in one round trip.
+        :param user_id: int
+        :param events: list of validated events
+        :return: None
+        """
+        now = timezone.now()
+        payload = [
+            {
+                'event_id': str(event.get('event_id') or uuid.uuid4()),
+                'announcement': event.get('announcement'),
+                'action': event.get('action'),
+                'created_at': (event.get('created_at') or now).isoformat(),
+            }
+            for event in events
+        ]
+        pipeline = self.connection.pipeline(transaction=False)
+        pipeline.xadd(self.STREAM_KEY, {'user': user_id, 'events': json.dumps(payload)})
+        SeenSet(user_id, self.connection).add([event.get('announcement') for event in events], pipeline=pipeline)
+        pipeline.execute()
+
+    def ensure_group(self) -> None:
+        try:
+            self.connection.xgroup_create(self.STREAM_KEY, self.GROUP_NAME, id='0', mkstream=True)
+        except redis.ResponseError as error:
+            if 'BUSYGROUP' not in str(error):
+                raise
+
+    def read(self, consumer: str) -> list:
+        """
+        Returns entries, which were delivered to fallen consumer and were
+        not acknowledged for a long time, or new entries otherwise.
+        :param consumer: name of consumer
+        :return: list of (entry_id, fields)
+        """
+        claimed = self.connection.xautoclaim(self.STREAM_KEY, self.GROUP_NAME, consumer,
+                                             min_idle_time=self.CLAIM_IDLE_TIME, count=self.READ_COUNT)
+        if claimed[1]:
+            return claimed[1]
+
+        response = self.connection.xreadgroup(self.GROUP_NAME, consumer, {self.STREAM_KEY: '>'},
+                                              count=self.READ_COUNT)
+        return response[0][1] if response else []
+
+    def dead_letter(self, entry_id, fields: dict, error: Exception) -> None:
+        """
+        Keeps entry, which can not be stored, in separate capped stream for
+        inspection, so it does not block entries read together with it.
+        """
+        self.connection.xadd(self.DEAD_LETTER_KEY, {**fields, 'entry_id': entry_id, 'error': str(error)[:500]},
+                             maxlen=self.DEAD_LETTER_MAX_LENGTH, approximate=True)
+
+    def ack(self, entry_ids: list) -> None:
+        pipeline = self.connection.pipeline(transaction=False)
+        pipeline.xack(self.STREAM_KEY, self.GROUP_NAME, *entry_ids)
+        pipeline.xdel(self.STREAM_KEY, *entry_ids)
+        pipeline.execute()
+
+
+def store_favorites(events: list) -> None:
+    """
+    Adds announcements, swiped as favorite, to favorites of users, skipping
+    ones already added and ones deleted meanwhile.
+    :param events: list of SwipeEvent
+    :return: None
+    """
+    pairs = {(event.user_id, event.chessboard_flat_id)
+             for event in events if event.action == SwipeEvent.ActionChoice.favorite}
+    if not pairs:
+        return
+
+    existing_users = set(User.objects
+                         .filter(id__in={user_id for user_id, _ in pairs})
+                         .values_list('id', flat=True))
+    existing_flats = set(ChessBoardFlat.objects
+                         .filter(id__in={chessboard_flat_id for _, chessboard_flat_id in pairs})
+                         .values_list('id', flat=True))
+    existing_favorites = set(Favorite.objects
+                             .filter(user_id__in={user_id for user_id, _ in pairs},
+                                     chessboard_flat_id__in=existing_flats)
+                             .values_list('user_id', 'chessboard_flat_id'))
+    Favorite.objects.bulk_create([
+        Favorite(user_id=user_id, chessboard_flat_id=chessboard_flat_id)
+        for user_id, chessboard_flat_id in pairs - existing_favorites
+        if user_id in existing_users and chessboard_flat_id in existing_flats
+    ])
+
+
+def parse_entry(fields: dict) -> list:
+    """
+    :param fields: fields of stream entry
+    :return: list of unsaved SwipeEvent
+    """
+    user_id = int(fields[b'user'])
+    return [SwipeEvent(event_id=event.get('event_id'),
+                       user_id=user_id,
+                       chessboard_flat_id=event.get('announcement'),
+                       action=event.get('action'),
+                       created_at=parse_datetime(event.get('created_at')))
+            for event in json.loads(fields[b'events'])]
+
+
+def store_events(entries: list) -> int:
+    """
+    :param entries: list of (entry_id, fields)
+    :return: amount of stored events
+    """
+    events = [event for _, fields in entries for event in parse_entry(fields)]
+    with transaction.atomic():
+        SwipeEvent.objects.bulk_create(events, batch_size=1000, ignore_conflicts=True)
+        store_favorites(events)
+    return len(events)
+
+
+def flush_buffered_swipe_events(consumer: str, buffer: SwipeEventBuffer = None, max_reads: int = 50) -> int:
+    """
+    Moves events from the stream to the database in batches. If batch can
+    not be stored, its entries are stored one by one, and the ones, which
+    fail again, are moved to the dead letter stream, so a broken entry is
+    never redelivered together with valid ones.
+    :param consumer: name of consumer inside consumer group
+    :param buffer: SwipeEventBuffer
+    :param max_reads: limit of batches per call, so that task is short
+    :return: amount of flushed events
+    """
+    buffer = buffer or SwipeEventBuffer()
+    buffer.ensure_group()
+    flushed = 0
+
+    for _ in range(max_reads):
+        entries = buffer.read(consumer)
+        if not entries:
+            break
+
+        # entry without fields was deleted after delivery to fallen consumer
+        entries_with_fields = [(entry_id, fields) for entry_id, fields in entries if fields]
+        try:
+            flushed += store_events(entries_with_fields)
+        except (DatabaseError, ValueError, TypeError, KeyError, AttributeError):
+            for entry in entries_with_fields:
+                try:
+                    flushed += store_events([entry])
+                except (DatabaseError, ValueError, TypeError, KeyError, AttributeError) as error:
+                    buffer.dead_letter(*entry, error)
+        buffer.ack([entry_id for entry_id, _ in entries])
+
+    return flushed
@@ -0,0 +1,126 @@
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import ValidationError
+
+from .models import ChessBoardFlat, Favorite, Tombstone
+
+
+SYNC_PAGE_SIZE = 200                            # rows of every stream per response
+SYNC_SAFETY_MARGIN = timedelta(seconds=5)       # rows newer than that may be not committed yet
+TOMBSTONE_TTL = timedelta(days=30)
+
+# stream name -> kind of tombstones
+DELETED_STREAMS = {
+    'announcements': Tombstone.KindChoice.announcement,
+    'favorites': Tombstone.KindChoice.favorite,
+    'residential_complexes': Tombstone.KindChoice.residential_complex,
+}
+
+
+def record_tombstones(kind: str, ids, user_id: int = None) -> None:
+    """
+    :param kind: Tombstone.KindChoice
+    :param ids: ids of disappeared objects
+    :param user_id: owner of objects, if only the owner can see them
+    :return: None
+    """
+    Tombstone.objects.bulk_create([Tombstone(kind=kind, object_id=pk, user_id=user_id) for pk in ids])
+
+
+def encode_sync_token(cursors: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(cursors).encode()).decode()
+
+
+def decode_sync_token(token: str) -> dict:
+    """
+    Token keeps position of the client in every stream as [timestamp, id]
+    of the last row, which client has received.
+    :param token: str
+    :return: dict stream -> (datetime, id)
+    """
+    error = ValidationError({'since': _('Неправильний токен синхронізації.')})
+    try:
+        raw_cursors = json.loads(base64.urlsafe_b64decode(token.encode()))
+        cursors = {stream: (parse_datetime(value[0]), int(value[1])) for stream, value in raw_cursors.items()}
+    except (ValueError, TypeError, AttributeError, IndexError, binascii.Error):
+        raise error
+    if set(cursors) != {'announcements', 'favorites', 'deleted'} \
+            or any(moment is None for moment, pk in cursors.values()):
+        raise error
+    return cursors
+
+
+def read_page(queryset, field: str, cursor, until) -> list:
+    """
+    Reads next page of the stream in (field, id) order, starting after cursor.
+    :return: list of objects
+    """
+    if cursor is not None:
+        moment, pk = cursor
+        queryset = queryset.filter(Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'id__gt': pk}))
+    return list(queryset.filter(**{f'{field}__lte': until}).order_by(field, 'id')[:SYNC_PAGE_SIZE])
+
+
+def collect_changes(user, token: str = None) -> dict:
+    """
+    Returns announcements of the feed and favorites of the user, changed
+    since the token, and ids of objects, which have disappeared since then.
+    Without token, or with token older than tombstones are kept, client
+    receives full snapshot and has to drop its cache.
+    :param user: User
+    :param token: token from previous response
+    :return: dict
+    """
+    until = timezone.now() - SYNC_SAFETY_MARGIN
+    cursors = decode_sync_token(token) if token else {}
+    reset = not cursors or cursors.get('deleted')[0] < timezone.now() - TOMBSTONE_TTL
+    if reset:
+        cursors = {}
+
+    announcements = read_page(
+        ChessBoardFlat.objects
+        .select_related('residential_complex', 'creator', 'chessboard__corps', 'chessboard__section')
+        .filter(accepted=True, called_off=False),
+        'updated_at', cursors.get('announcements'), until
+    )
+    favorites = read_page(Favorite.objects.filter(user=user), 'updated_at', cursors.get('favorites'), until)
+    # snapshot already contains only existing objects
+    tombstones = read_page(Tombstone.objects.filter(Q(user__isnull=True) | Q(user=user)),
+                           'created_at', cursors.get('deleted'), until) if not reset else []
+
+    deleted = {stream: [] for stream in DELETED_STREAMS}
+    kinds = {kind: stream for stream, kind in DELETED_STREAMS.items()}
+    for tombstone in tombstones:
+        deleted[kinds[tombstone.kind]].append(tombstone.object_id)
+
+    def get_cursor(page, field):
+        if len(page) == SYNC_PAGE_SIZE:
+            return [getattr(page[-1], field).isoformat(), page[-1].id]
+        # stream is read up to the bound completely
+        return [until.isoformat(), 0]
+
+    return {
+        'token': encode_sync_token({
+            'announcements': get_cursor(announcements, 'updated_at'),
+            'favorites': get_cursor(favorites, 'updated_at'),
+            'deleted': get_cursor(tombstones, 'created_at'),
+        }),
+        'reset': reset,
+        'has_more': any(len(page) == SYNC_PAGE_SIZE for page in (announcements, favorites, tombstones)),
+        'announcements': announcements,
+        'favorites': favorites,
+        'deleted': deleted,
+    }
+
+
+def remove_old_tombstones() -> int:
+    deleted, details = Tombstone.objects.filter(created_at__lt=timezone.now() - TOMBSTONE_TTL).delete()
+    return deleted
@@ -0,0 +1,115 @@
+from django.db import transaction
+from django.utils import timezone
+
+from api_swipe.celery import app
+from flats.archive import archive_announcements
+from flats.deletion import purge_residential_complex, purge_user
+from flats.imports import run_flat_import
+from flats.models import Promotion, ResidentialComplex
+from flats.ranking import refresh_rank_scores
+from flats.similarity import similarity_index
+from flats.swipes import flush_buffered_swipe_events
+from flats.sync import remove_old_tombstones
+from users.models import User
+
+
+PROMOTION_EXPIRATION_BATCH_SIZE = 500
+PURGE_RETRY_DELAY = 60    # in seconds
+
+
+@app.task
+def recompute_rank_scores():
+    return refresh_rank_scores()
+
+
+@app.task
+def expire_promotions():
+    """
+    Removes promotions, which validity window has ended, in batches. Every
+    batch is deleted together with recalculation of rank scores of its
+    announcements in one transaction, so the feed never shows expired
+    promotion on the top. Rows locked by concurrent run are skipped.
+    :return: amount of expired promotions
+    """
+    now = timezone.now()
+    expired = 0
+
+    while True:
+        with transaction.atomic():
+            batch = list(Promotion.objects
+                         .select_for_update(skip_locked=True)
+                         .filter(expires_at__lte=now)
+                         .order_by('expires_at')
+                         .values_list('id', 'chessboard_flat_id')[:PROMOTION_EXPIRATION_BATCH_SIZE])
+            if not batch:
+                break
+
+            Promotion.objects.filter(id__in=[promotion_id for promotion_id, _ in batch]).delete()
+            refresh_rank_scores(ids=[chessboard_flat_id for _, chessboard_flat_id in batch])
+        expired += len(batch)
+
+    return expired
+
+
+@app.task(bind=True)
+def flush_swipe_events(self):
+    return flush_buffered_swipe_events(consumer=self.request.hostname or 'swipe-events-flusher')
+
+
+@app.task
+def update_similarity_index():
+    return similarity_index.update()
+
+
+@app.task
+def rebuild_similarity_index():
+    return similarity_index.rebuild()
+
+
+@app.task
+def clean_tombstones():
+    return remove_old_tombstones()
+
+
+@app.task
+def archive_dead_announcements():
+    return archive_announcements()
+
+
+@app.task
+def import_flats(flat_import_id: int):
+    return run_flat_import(flat_import_id).status
+
+
+@app.task(bind=True, max_retries=5)
+def purge_deleted_user(self, user_id: int):
+    try:
+        return purge_user(user_id)
+    except Exception as exc:
+        # every chunk is committed separately, so retry continues from the rest
+        raise self.retry(exc=exc, countdown=PURGE_RETRY_DELAY)
+
+
+@app.task(bind=True, max_retries=5)
+def purge_deleted_residential_complex(self, residential_complex_id: int):
+    try:
+        return purge_residential_complex(residential_complex_id)
+    except Exception as exc:
+        raise self.retry(exc=exc, countdown=PURGE_RETRY_DELAY)
+
+
+@app.task
+def resume_purges():
+    """
+    Schedules purge of users and RCs, which are still pending deletion, e.g.
+    after the task has run out of retries or was lost by the broker.
+    :return: amount of scheduled purges
+    """
+    user_ids = list(User.all_objects.filter(pending_deletion=True).values_list('id', flat=True))
+    residential_complex_ids = list(ResidentialComplex.all_objects.filter(pending_deletion=True)
+                                   .values_list('id', flat=True))
+    for user_id in user_ids:
+        purge_deleted_user.delay(user_id)
+    for residential_complex_id in residential_complex_ids:
+        purge_deleted_residential_complex.delay(residential_complex_id)
+    return len(user_ids) + len(residential_complex_ids)
@@ -1,19 +1,43 @@
 import os.path
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
 
+import numpy as np
 import pytest
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
 import base64
 
 from pytest_django.fixtures import _django_db_helper
 
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 from faker import Faker
 
 from random import choice, randint
 
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
-from flats.models import ResidentialComplex, Addition, ChessBoardFlat, PromotionType
-from users.tests import login_user, fill_db
+from flats.models import ResidentialComplex, Addition, ChessBoard, ChessBoardFlat, Flat, PromotionType, Promotion, \
+    Photo, Section, Floor, Corps, Gallery
+from flats.archive import ARCHIVE_RETENTION, archive_announcements
+from flats.export import EXPORT_CHUNK_SIZE, EXPORT_COLUMNS, iter_csv
+from flats.geo import encode_geohash
+from flats.imports import run_flat_import, validate_rows
+from flats.ranking import compute_rank_score
+from flats.similarity import SimilarityIndex, build_vectors, top_k
+from flats.sparse import parse_field_tree
+from flats.swipes import SeenSet, flush_buffered_swipe_events
+from flats.sync import decode_sync_token, encode_sync_token
+from flats.tasks import expire_promotions
+from users.models import User
+from users.tests import login_user, fill_db, create_announcement
+from api_swipe.loaders import Loader
+from api_swipe.parsers import MessagePackParser, ORJSONParser
+from api_swipe.renderers import MessagePackRenderer, ORJSONRenderer
 from api_swipe.settings import BASE_DIR
 
 
@@ -140,6 +164,17 @@ class TestingFlatsAndRC:
         assert response_corps.status_code == status.HTTP_201_CREATED and response_section.status_code == status.HTTP_201_CREATED \
             and response_floor.status_code == status.HTTP_201_CREATED
 
+    def test_batch_floors_creation(self):
+        response = client.post('/api/v1/floors/my/create/', data={'count': 3}, format='json')
+        assert response.status_code == status.HTTP_201_CREATED and len(response.data) == 3
+        numbers = [int(floor.get('name').split()[-1]) for floor in response.data]
+        assert numbers == list(range(numbers[0], numbers[0] + 3))
+
+        response = client.post('/api/v1/sections/my/create/', data={'names': ['Секція А', 'Секція Б']}, format='json')
+        assert [section.get('name') for section in response.data] == ['Секція А', 'Секція Б']
+        response = client.post('/api/v1/sections/my/create/', data={'names': ['Секція А']}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
     def test_flat_creation(self):
         user = login_user("builder")
         client.credentials(HTTP_AUTHORIZATION=f'Bearer {user.get("access_token")}')
@@ -187,6 +222,44 @@ class TestingFlatsAndRC:
 
         assert response.status_code == status.HTTP_201_CREATED
 
+    def test_batch_announcements(self):
+        residential_complex = ResidentialComplex.objects.first()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("user").get("access_token")}')
+        announcement = {
+            "main_photo": get_image(),
+            "residential_complex": residential_complex.id,
+            "address": faker.address(),
+            "purpose": "apartments",
+            "room_amount": 2,
+            "planning": "studio",
+            "house_condition": "good",
+            "overall_square": 60,
+            "kitchen_square": 12,
+            "heating_type": "gas",
+            "payment_option": "parent-capital",
+            "agent_commission": 100,
+            "communication_method": "phone",
+            "description": "string",
+            "price": 90000,
+            "gallery_photos": [{"photo": get_image()}]
+        }
+        response = client.post('/api/v1/announcements/batch/',
+                               data=[announcement, {**announcement, "price": 0}],
+                               format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert [item.get('status') for item in response.data] == ['valid', 'invalid']
+
+        response = client.post('/api/v1/announcements/batch/', data=[announcement] * 3, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        ids = [item.get('id') for item in response.data]
+        assert Photo.objects.filter(gallery__chessboardflat__id__in=ids).count() == 3
+
+        response = client.patch('/api/v1/announcements/my/batch/',
+                                data=[{'id': pk, 'price': 95000} for pk in ids],
+                                format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert set(ChessBoardFlat.objects.filter(id__in=ids).values_list('price', flat=True)) == {95000}
+
     def test_get_announcements_to_approve(self):
         client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("builder").get("access_token")}')
         response = client.get('/api/v1/announcements-approval/requests/')
@@ -207,6 +280,73 @@ class TestingFlatsAndRC:
 
         assert response.status_code == status.HTTP_200_OK
 
+    def test_moderation_queue(self):
+        residential_complex = ResidentialComplex.objects.get(owner__email='simplebuilder@gmail.com')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("user").get("access_token")}')
+        announcement = {
+            "main_photo": get_image(),
+            "residential_complex": residential_complex.id,
+            "address": faker.address(),
+            "purpose": "apartments",
+            "room_amount": 2,
+            "planning": "studio",
+            "house_condition": "good",
+            "overall_square": 60,
+            "kitchen_square": 12,
+            "heating_type": "gas",
+            "payment_option": "parent-capital",
+            "agent_commission": 100,
+            "communication_method": "phone",
+            "description": "string",
+            "price": 90000
+        }
+        response = client.post('/api/v1/announcements/batch/', data=[announcement] * 3, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+
+        builder = login_user("builder")
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {builder.get("access_token")}')
+        response = client.post('/api/v1/announcements-approval/queue/claim/', data={'amount': 2}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+        ids = [item.get('id') for item in response.data]
+        assert len(ids) == 2
+        assert ChessBoardFlat.objects.filter(id__in=ids, claimed_by_id=builder.get('user').get('pk')).count() == 2
+
+        # other moderator and the next claim of the same moderator get other announcements
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("admin").get("access_token")}')
+        response = client.post('/api/v1/announcements-approval/queue/claim/', data={'amount': 1}, format='json')
+        admin_ids = [item.get('id') for item in response.data]
+        assert len(admin_ids) == 1 and not set(admin_ids) & set(ids)
+
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {builder.get("access_token")}')
+        response = client.post('/api/v1/announcements-approval/queue/claim/', data={'amount': 100}, format='json')
+        assert not {item.get('id') for item in response.data} & set(ids + admin_ids)
+
+        # flat of the same RC, which is already bound to other announcement
+        bound_flat = Flat.objects.create(
+            residential_complex=residential_complex,
+            floor=Floor.objects.create(residential_complex=residential_complex, name='1'),
+            section=Section.objects.create(residential_complex=residential_complex, name='1'),
+            corps=Corps.objects.create(residential_complex=residential_complex, name='1'),
+            gallery=Gallery.objects.create(),
+            district=faker.city(),
+            micro_district=faker.street_name(),
+            room_amount=2,
+            scheme='flats/schemes/1.jpg',
+            square=60,
+            price=90000,
+            condition='draft'
+        )
+        ChessBoardFlat.objects.filter(id=create_announcement().id).update(flat=bound_flat)
+        response = client.post('/api/v1/announcements-approval/queue/approve/',
+                               data={'announcements': [{'id': ids[0], 'flat': bound_flat.id}]},
+                               format='json')
+        assert response.data == [{'id': ids[0], 'status': 'invalid_flat'}]
+
+        response = client.post('/api/v1/announcements-approval/queue/call-off/',
+                               data={'announcements': [ids[0], admin_ids[0]], 'rejection_reason': 'incorrect-price'},
+                               format='json')
+        assert response.data == [{'id': ids[0], 'status': 'called_off'}, {'id': admin_ids[0], 'status': 'not_claimed'}]
+
     def test_promotion_type_creation(self):
         client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("admin").get("access_token")}')
         response = client.post('/api/v1/promotion-types/',
@@ -255,3 +395,341 @@ class TestingFlatsAndRC:
         response = client.patch(f'/api/v1/announcements/{announcement.id}/allow/')
 
         assert response.status_code == status.HTTP_200_OK
+
+    def test_residential_complexes_map_clusters(self):
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("builder").get("access_token")}')
+        response = client.patch('/api/v1/residential-complex/my/update/',
+                                data={'latitude': 46.4825, 'longitude': 30.7233},
+                                format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data.get('geohash') == encode_geohash(46.4825, 30.7233)
+
+        response = client.get('/api/v1/residential-complex/map/',
+                              data={'min_latitude': 46.0, 'min_longitude': 30.0,
+                                    'max_latitude': 47.0, 'max_longitude': 31.0, 'zoom': 10})
+        assert response.status_code == status.HTTP_200_OK
+        assert sum(cluster.get('count') for cluster in response.data) >= 1
+
+    def test_expiring_promotions(self):
+        promotion = Promotion.objects.select_related('promotion_type').first()
+        assert promotion.expires_at == promotion.starts_at + timedelta(days=promotion.promotion_type.duration)
+
+        Promotion.objects.filter(id=promotion.id).update(expires_at=timezone.now() - timedelta(minutes=1))
+        assert expire_promotions() >= 1
+        assert not Promotion.objects.filter(id=promotion.id).exists()
+
+    def test_swipe_deck_excludes_seen_announcements(self):
+        # ids of the test database start over on every run, while seen-set in Redis survives
+        SeenSet(User.objects.get(email='oleksijkolotilo63@gmail.com').id).clear()
+        for _ in range(3):
+            create_announcement()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("user").get("access_token")}')
+        response = client.get('/api/v1/announcements/deck/', data={'size': 10})
+        assert response.status_code == status.HTTP_200_OK
+
+        seen_ids = [announcement.get('id') for announcement in response.data]
+        assert seen_ids
+        response = client.post('/api/v1/announcements/deck/seen/', data={'announcements': seen_ids}, format='json')
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+
+        response = client.get('/api/v1/announcements/deck/', data={'size': 10})
+        assert not set(seen_ids) & {announcement.get('id') for announcement in response.data}
+
+    def test_swipe_deck_reaches_announcements_below_seen_ones(self):
+        for _ in range(3):
+            create_announcement()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("user").get("access_token")}')
+        response = client.get('/api/v1/announcements/deck/', data={'size': 100})
+        ids = [announcement.get('id') for announcement in response.data]
+        assert len(ids) > 1
+
+        client.post('/api/v1/announcements/deck/seen/', data={'announcements': ids[:-1]}, format='json')
+        response = client.get('/api/v1/announcements/deck/', data={'size': 1})
+        assert [announcement.get('id') for announcement in response.data] == ids[-1:]
+
+    def test_swipe_events_ingestion(self):
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("user").get("access_token")}')
+        announcement = ChessBoardFlat.objects.first()
+        response = client.post('/api/v1/swipes/',
+                               data={'events': [{'announcement': announcement.id, 'action': 'right'},
+                                                {'announcement': announcement.id, 'action': 'favorite'}]},
+                               format='json')
+        assert response.status_code == status.HTTP_202_ACCEPTED
+
+        response = client.post('/api/v1/swipes/', data={'events': []}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = client.post('/api/v1/swipes/', data={'events': [{'announcement': 2 ** 63, 'action': 'left'}]},
+                               format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_delta_sync(self):
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("user").get("access_token")}')
+        response = client.get('/api/v1/sync/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data.get('reset')
+
+        response = client.get('/api/v1/sync/', data={'since': response.data.get('token')})
+        assert response.status_code == status.HTTP_200_OK
+        assert not response.data.get('reset')
+
+        response = client.get('/api/v1/sync/', data={'since': 'broken'})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_conditional_get(self):
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("user").get("access_token")}')
+        announcement = ChessBoardFlat.objects.filter(accepted=True).first()
+        response = client.get(f'/api/v1/announcements/{announcement.id}/')
+        assert response.status_code == status.HTTP_200_OK
+        etag = response['ETag']
+
+        response = client.get(f'/api/v1/announcements/{announcement.id}/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        ChessBoardFlat.objects.get(id=announcement.id).save()
+        response = client.get(f'/api/v1/announcements/{announcement.id}/', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+
+        response = client.get('/api/v1/news/')
+        assert response.status_code == status.HTTP_200_OK
+        response = client.get('/api/v1/news/', HTTP_IF_NONE_MATCH=response['ETag'])
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_sparse_fields(self):
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("user").get("access_token")}')
+        response = client.get('/api/v1/announcements/?fields=id,main_photo,residential_complex')
+        assert response.status_code == status.HTTP_200_OK
+        for announcement in response.data.get('results'):
+            assert set(announcement) == {'id', 'main_photo', 'residential_complex'}
+            assert isinstance(announcement.get('residential_complex'), int)
+
+        response = client.get('/api/v1/announcements/?fields=id,creator.email,chessboard&expand=chessboard')
+        assert response.status_code == status.HTTP_200_OK
+        for announcement in response.data.get('results'):
+            assert set(announcement.get('creator')) == {'email'}
+
+        announcement = ChessBoardFlat.objects.filter(accepted=True).first()
+        response = client.get(f'/api/v1/announcements/{announcement.id}/?fields=id')
+        assert response.data == {'id': announcement.id}
+
+    def test_chessboard_grid(self):
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("user").get("access_token")}')
+        residential_complex = ResidentialComplex.objects.filter(corps__isnull=False, section__isnull=False).first()
+        chessboard = ChessBoard.objects.create(residential_complex=residential_complex,
+                                               section=residential_complex.section_set.first(),
+                                               corps=residential_complex.corps_set.first())
+        announcement = ChessBoardFlat.objects.filter(accepted=True, called_off=False).first()
+        ChessBoardFlat.objects.filter(id=announcement.id).update(chessboard=chessboard)
+
+        response = client.get(f'/api/v1/chessboards/{chessboard.id}/grid/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data.get('ids') == [[announcement.id]] and response.data.get('statuses') == [[2]]
+
+        ChessBoardFlat.objects.filter(id=announcement.id).update(price=announcement.price + 1, updated_at=timezone.now())
+        response = client.get(f'/api/v1/chessboards/{chessboard.id}/grid/')
+        assert response.data.get('prices') == [[announcement.price + 1]]
+        ChessBoardFlat.objects.filter(id=announcement.id).update(chessboard=None)
+
+    def test_announcements_export(self):
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("admin").get("access_token")}')
+        response = client.get('/api/v1/announcements/export/?file_format=ndjson')
+        assert response.status_code == status.HTTP_200_OK
+        lines = b''.join(response.streaming_content).splitlines()
+        assert len(lines) == ChessBoardFlat.objects.count()
+        assert ORJSONParser().parse(BytesIO(lines[0])).get('id') == ChessBoardFlat.objects.order_by('id').first().id
+
+        response = client.get('/api/v1/announcements/export/')
+        assert response['Content-Type'].startswith('text/csv')
+        assert b''.join(response.streaming_content).decode().startswith('id,residential_complex,')
+
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("user").get("access_token")}')
+        assert client.get('/api/v1/announcements/export/').status_code == status.HTTP_403_FORBIDDEN
+
+    def test_flat_import(self):
+        user = login_user('builder')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {user.get("access_token")}')
+        residential_complex = ResidentialComplex.objects.get(owner_id=user.get('user').get('pk'))
+        corps = residential_complex.corps_set.first()
+        section = residential_complex.section_set.first()
+        floor = residential_complex.floor_set.first()
+        content = 'corps,section,floor,district,micro_district,room_amount,square,price,condition\n' \
+            f'{corps.name},{section.name},{floor.name},Приморський,Центр,2,54,1500000,draft\n' \
+            f'{corps.name},{section.name},{floor.name},Приморський,Центр,3,72,2100000,living-condition\n'
+        flats_amount = Flat.objects.filter(residential_complex=residential_complex).count()
+
+        response = client.post('/api/v1/flat-imports/',
+                               data={'file': SimpleUploadedFile('flats.csv', content.encode())},
+                               format='multipart')
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        flat_import_id = response.data.get('id')
+        run_flat_import(flat_import_id)
+
+        response = client.get(f'/api/v1/flat-imports/{flat_import_id}/')
+        assert response.data.get('status') == 'done' and response.data.get('created_rows') == 2
+        assert Flat.objects.filter(residential_complex=residential_complex).count() == flats_amount + 2
+
+        # redelivered task does not import flats again
+        run_flat_import(flat_import_id)
+        assert Flat.objects.filter(residential_complex=residential_complex).count() == flats_amount + 2
+
+    def test_announcements_archive(self):
+        announcement = ChessBoardFlat.objects.select_related('creator').first()
+        ChessBoardFlat.objects.filter(id=announcement.id).update(called_off=True,
+                                                                 updated_at=timezone.now() - ARCHIVE_RETENTION * 2)
+        pending = ChessBoardFlat.objects.filter(accepted=False, called_off=False).first()
+        if pending is not None:
+            ChessBoardFlat.objects.filter(id=pending.id).update(updated_at=timezone.now() - ARCHIVE_RETENTION * 2)
+        assert archive_announcements() >= 1
+        assert not ChessBoardFlat.objects.filter(id=announcement.id).exists()
+        # announcements waiting for moderation stay in the queue
+        assert pending is None or ChessBoardFlat.objects.filter(id=pending.id).exists()
+
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("admin").get("access_token")}')
+        response = client.get(f'/api/v1/announcements-archive/{announcement.id}/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data.get('called_off') and response.data.get('price') == announcement.price
+
+
+def test_encode_geohash():
+    assert encode_geohash(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+
+
+def test_compute_rank_score():
+    now = timezone.now()
+    promoted = compute_rank_score(efficiency=1, created_at=now - timedelta(days=30), now=now)
+    fresh = compute_rank_score(efficiency=None, created_at=now, now=now)
+    old = compute_rank_score(efficiency=None, created_at=now - timedelta(days=30), now=now)
+    assert promoted > fresh > old
+
+
+def test_similar_announcements_top_k():
+    rows = [
+        (1, 1000000, 50, 10, 2, 'studio', 'repair-required', 'Приморський', 1),
+        (2, 1050000, 52, 10, 2, 'studio', 'repair-required', 'Приморський', 1),
+        (3, 9000000, 180, 30, 5, 'studio', 'repair-required', 'Київський', 2),
+    ]
+    matrix = build_vectors(rows, np.array([np.log1p(1000000), 50, 10, 2]), np.array([np.log1p(9000000), 180, 30, 5]))
+    ids = np.array([1, 2, 3])
+    norms = np.linalg.norm(matrix, axis=1)
+    for metric in ('cosine', 'l2'):
+        assert top_k(matrix, norms, ids, matrix[[0, 2]], k=2, metric=metric, exclude=np.array([1, 3])) == [[2, 3], [2, 1]]
+
+
+def test_similarity_index_without_files(tmp_path):
+    assert SimilarityIndex(directory=str(tmp_path)).similar([1, 2]) == {1: [], 2: []}
+
+
+def test_similarity_index_reloads_whole_state(tmp_path):
+    index = SimilarityIndex(directory=str(tmp_path))
+
+    def write_index(version, matrix, ids):
+        np.save(tmp_path / f'matrix-{version}.npy', np.array(matrix, dtype=np.float32))
+        np.save(tmp_path / f'ids-{version}.npy', np.array(ids, dtype=np.int64))
+        index._write_meta({'version': version, 'matrix': f'matrix-{version}.npy', 'ids': f'ids-{version}.npy',
+                           'size': len(ids), 'capacity': len(ids), 'last_id': ids[-1]})
+
+    write_index('1', [[1, 0], [0.9, 0.1], [0, 1]], [1, 2, 3])
+    state = index.load()
+    assert index.load() is state
+    assert index.similar([1], k=1) == {1: [2]}
+
+    write_index('2', [[1, 0], [0, 1], [0.9, 0.1]], [1, 2, 3])
+    meta, matrix, ids, norms = index.load()
+    assert meta.get('version') == '2' and len(matrix) == len(ids) == len(norms) == 3
+    assert state[0].get('version') == '1'
+    assert index.similar([1], k=1) == {1: [3]}
+
+
+def test_sync_token():
+    now = timezone.now()
+    cursors = {'announcements': [now.isoformat(), 5], 'favorites': [now.isoformat(), 0], 'deleted': [now.isoformat(), 7]}
+    assert decode_sync_token(encode_sync_token(cursors)) == {'announcements': (now, 5), 'favorites': (now, 0),
+                                                              'deleted': (now, 7)}
+
+
+def test_parse_field_tree():
+    assert parse_field_tree('id, creator.email,creator.name,,chessboard.corps.name') == {
+        'id': {}, 'creator': {'email': {}, 'name': {}}, 'chessboard': {'corps': {'name': {}}}
+    }
+
+
+def test_orjson_renderer():
+    data = {'detail': _('Вказаної об`яви не існує.'), 'price': Decimal('1.50'), 'created_at': timezone.now(),
+            'ids': (1, 2), 1: None, 'text': 'a b'}
+    assert ORJSONRenderer().render(data, 'application/json') == JSONRenderer().render(data, 'application/json')
+    assert ORJSONParser().parse(BytesIO(b'{"ids": [1, 2]}')) == {'ids': [1, 2]}
+
+
+def test_msgpack_renderer():
+    data = {'detail': _('Вказаної об`яви не існує.'), 'price': Decimal('1.50'), 'created_at': timezone.now(),
+            'ids': (1, 2), 'photos': [{'id': 1, 'photo': None}]}
+    content = MessagePackRenderer().render(data, MessagePackRenderer.media_type)
+    assert MessagePackParser().parse(BytesIO(content)) == ORJSONParser().parse(
+        BytesIO(ORJSONRenderer().render(data, 'application/json'))
+    )
+
+
+def test_export_csv_chunks():
+    rows = [(pk, timezone.now()) + (None,) * (len(EXPORT_COLUMNS) - 2) for pk in range(EXPORT_CHUNK_SIZE + 1)]
+    chunks = list(iter_csv(rows))
+    assert len(chunks) == 2
+    assert ''.join(chunks).count('\n') == len(rows) + 1
+
+
+def test_flat_import_validation():
+    names = {'corps': {'Корпус 1': 1}, 'section': {'Секція 1': 2, 'Секція 2': None}, 'floor': {'Поверх 1': 3}}
+    row = {'corps': 'Корпус 1', 'section': 'Секція 1', 'floor': 'Поверх 1', 'district': 'Приморський',
+           'micro_district': 'Центр', 'room_amount': '2', 'square': '54', 'price': '1500000', 'condition': 'draft'}
+    validated, errors = validate_rows([row, {**row, 'section': 'Секція 2', 'price': '0'}, {**row, 'floor': 'Поверх 9'}],
+                                      names)
+    assert validated == [{'corps_id': 1, 'section_id': 2, 'floor_id': 3, 'district': 'Приморський',
+                          'micro_district': 'Центр', 'room_amount': 2, 'square': 54, 'price': 1500000,
+                          'condition': 'draft'}]
+    assert [error.get('row') for error in errors] == [3, 4]
+    assert set(errors[0].get('errors')) == {'section', 'price'} and set(errors[1].get('errors')) == {'floor'}
+
+
+def test_request_loader():
+    class SectionQuerySet:
+        model = Section
+        calls = []
+
+        def in_bulk(self, keys, field_name):
+            self.calls.append(set(keys))
+            return {key: f'section-{key}' for key in keys if key != 3}
+
+    loader, queryset = Loader(), SectionQuerySet()
+    loader.register(queryset, [1, '2', 2, 3])
+    assert loader.load(queryset, '1') == 'section-1'
+    assert loader.load(queryset, 2) == 'section-2' and loader.load(queryset, 3) is None
+    assert loader.load(queryset, 'first') is None
+    assert queryset.calls == [{1, 2, 3}]
+
+
+def test_swipe_flush_dead_letters_broken_entries(monkeypatch):
+    class Buffer:
+        batches = [[(b'1-0', {b'user': b'1', b'events': b'[]'}), (b'2-0', {b'user': b'2', b'events': b'broken'}),
+                    (b'3-0', {})]]
+        acked, dead = [], []
+
+        def ensure_group(self):
+            pass
+
+        def read(self, consumer):
+            return self.batches.pop() if self.batches else []
+
+        def ack(self, entry_ids):
+            self.acked.extend(entry_ids)
+
+        def dead_letter(self, entry_id, fields, error):
+            self.dead.append(entry_id)
+
+    def store_events(entries):
+        if any(fields.get(b'events') == b'broken' for _, fields in entries):
+            raise ValueError('broken entry')
+        return len(entries)
+
+    monkeypatch.setattr('flats.swipes.store_events', store_events)
+    buffer = Buffer()
+    assert flush_buffered_swipe_events('consumer', buffer=buffer) == 1
+    assert buffer.dead == [b'2-0'] and buffer.acked == [b'1-0', b'2-0', b'3-0']
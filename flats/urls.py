@@ -11,16 +11,20 @@ router.register(r'corps', CorpsAPIViewSet, basename='corps')
 router.register(r'documents', DocumentAPIViewSet, basename='documents')
 router.register(r'news', NewsAPIViewSet, basename='news')
 router.register(r'flats', FlatAPIViewSet, basename='flats')
+router.register(r'flat-imports', FlatImportAPIViewSet, basename='flat-imports')
 router.register(r'sections', SectionAPIViewSet, basename='sections')
 router.register(r'photo', PhotoAPIDeleteViews, basename='photo')
 router.register(r'floors', FloorAPIViewSet, basename='floors')
 router.register(r'promotion-types', PromotionTypeAPIViewSet, basename='promotion-types')
 router.register(r'chessboards', ChessBoardAPIViewSet, basename='chessboards')
 router.register(r'announcements', ChessBoardFlatAnnouncementAPIViewSet, basename='announcements')
+router.register(r'announcements-archive', ArchivedAnnouncementAPIViewSet, basename='announcements-archive')
 router.register(r'announcements-approval', ChessBoardFlatApprovingAPIViewSet, basename='announcements-approve')
 router.register(r'announcement-promotion', AnnouncementPromotionAPIViewSet, basename='announcement-promotion')
 router.register(r'favorite-announcements', FavoriteChessBoardFlatAPIViewSet, basename='favorite-announcements')
 router.register(r'favorite-residential-complexes', FavoriteResidentialComplexAPIViewSet, basename='favorite-residential-complexes')
+router.register(r'swipes', SwipeEventAPIViewSet, basename='swipes')
+router.register(r'sync', SyncAPIViewSet, basename='sync')
 
 
 urlpatterns = [
@@ -1,6 +1,11 @@
-from django.db.models import ProtectedError, Q
+import hashlib
+
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.db.models import Count, Max, ProtectedError, Q
 from rest_framework.decorators import action
-from rest_framework.fields import URLField, FileField, ChoiceField
+from rest_framework.fields import URLField, FileField, ChoiceField, FloatField, DictField
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.generics import ListAPIView, \
@@ -10,6 +15,7 @@ from rest_framework.generics import ListAPIView, \
     DestroyAPIView
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
 
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter, inline_serializer
 
 from django.utils.translation import gettext_lazy as _
@@ -17,10 +23,26 @@ from django_filters.rest_framework import DjangoFilterBackend
 
 from drf_psq import Rule, PsqMixin
 
+from users.matching import unmatch_announcements
+from users.tasks import match_saved_filters
+from .conditional import ConditionalGetMixin
+from .deletion import mark_for_deletion
+from .export import EXPORT_CONTENT_TYPES, EXPORT_FORMATS, export_announcements
 from .filters import AnnouncementsFilterSet
+from .functions import create_numbered_objects
+from .geo import get_map_parameters, filter_by_bounding_box, cluster_queryset
+from .grid import get_grid
+from .moderation import approve_announcements, call_off_announcements, claim_announcements, \
+    delete_announcements, get_claimed_queryset, get_moderation_queryset
+from .ranking import refresh_rank_score, refresh_rank_scores
+from .similarity import METRICS, similarity_index
+from .sparse import SparseFieldsMixin
+from .swipes import DeckCursor, SeenSet, SwipeEventBuffer, collect_deck
+from .sync import collect_changes, record_tombstones
 from .paginators import CustomPageNumberPagination
 from .permissions import *
 from .serializers import *
+from .tasks import import_flats, purge_deleted_residential_complex
 
 
 @extend_schema(tags=['Corps'], description='Creation, deletion and updating corps')
@@ -95,16 +117,28 @@ class CorpsAPIViewSet(PsqMixin,
                                          many=True)
         return self.get_paginated_response(data=serializer.data)
 
+    @extend_schema(
+        request=NumberedObjectsCreationSerializer,
+        responses={
+            '201': CorpsSerializer(many=True)
+        },
+        description='Creates one corps, or several ones by count or list of names; list is returned then.'
+    )
     @action(methods=['POST'], detail=False, url_path='my/create')
     def corps_create(self, request, *args, **kwargs):
-        residential_complex = ResidentialComplex.objects \
-            .prefetch_related('corps_set') \
-            .get(owner=request.user)
-        instance = Corps.objects.create(
-            name=f'Корпус {residential_complex.corps_set.all().count() + 1}',
-            residential_complex=residential_complex
-        )
-        serializer = self.get_serializer(instance=instance)
+        creation = NumberedObjectsCreationSerializer(data=request.data)
+        if not creation.is_valid():
+            return Response(data=creation.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            residential_complex = ResidentialComplex.objects.get(owner=request.user)
+        except ResidentialComplex.DoesNotExist:
+            raise ValidationError({'detail': _('На вас не зареєстровано жодного ЖК.')})
+        instances = create_numbered_objects(Corps, residential_complex, 'Корпус',
+                                            count=creation.validated_data.get('count', 1),
+                                            names=creation.validated_data.get('names'))
+        # without count and names single object is returned, as before
+        serializer = self.get_serializer(instance=instances if creation.validated_data else instances[0],
+                                         many=bool(creation.validated_data))
         return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
     @action(methods=['DELETE'], detail=True, url_path='my/delete')
@@ -118,12 +152,16 @@ class CorpsAPIViewSet(PsqMixin,
 
 
 @extend_schema(tags=['Residential Complexes'])
-class ResidentialComplexAPIViewSet(PsqMixin,
+class ResidentialComplexAPIViewSet(ConditionalGetMixin,
+                                   SparseFieldsMixin,
+                                   PsqMixin,
                                    ListAPIView,
                                    GenericViewSet):
     serializer_class = ResidentialComplexSerializer
     pagination_class = CustomPageNumberPagination
     http_method_names = ['get', 'post', 'patch', 'delete']
+    conditional_actions = ('retrieve',)
+    sparse_actions = ('list', 'retrieve')
 
     psq_rules = {
         ('list',): [
@@ -142,6 +180,9 @@ class ResidentialComplexAPIViewSet(PsqMixin,
         ('list_self',): [
             Rule([IsBuilderPermission])
         ],
+        ('map_clusters',): [
+            Rule([CustomIsAuthenticated])
+        ],
         ('update_complex', 'delete_self_complex'): [
             Rule([IsBuilderPermission])
         ],
@@ -152,7 +193,7 @@ class ResidentialComplexAPIViewSet(PsqMixin,
             .prefetch_related('gallery__photo_set') \
             .select_related('owner') \
             .all()
-        return queryset
+        return self.project_queryset(queryset)
 
     def get_object(self, *args, **kwargs):
         try:
@@ -174,12 +215,26 @@ class ResidentialComplexAPIViewSet(PsqMixin,
                                   code=status.HTTP_400_BAD_REQUEST)
 
     def delete_obj(self, obj: ResidentialComplex):
-        try:
-            obj.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        except ProtectedError:
-            raise ValidationError({'detail': _('Ймовірно до вашого ЖК прив`язані квартири. Видалити не вдалося.')},
-                                  code=status.HTTP_409_CONFLICT)
+        """
+        Hides RC at once, its flats, announcements and files are purged by
+        background task.
+        """
+        with transaction.atomic():
+            mark_for_deletion(obj)
+            transaction.on_commit(lambda: purge_deleted_residential_complex.delay(obj.id))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def get_retrieve_validator(self):
+        values = ResidentialComplex.objects \
+            .filter(pk=self.kwargs.get(self.lookup_field)) \
+            .annotate(photos_amount=Count('gallery__photo', distinct=True),
+                      last_photo_id=Max('gallery__photo__id'),
+                      flats_amount=Count('flat', distinct=True),
+                      flats_updated_at=Max('flat__updated_at')) \
+            .values_list('updated_at', 'photos_amount', 'last_photo_id', 'flats_amount', 'flats_updated_at',
+                         'owner__email', 'owner__name', 'owner__surname') \
+            .first()
+        return (values, None) if values else None
 
     def retrieve(self, request, *args, **kwargs):
         residential_complex = self.get_object()
@@ -187,7 +242,7 @@ class ResidentialComplexAPIViewSet(PsqMixin,
         return Response(data=serializer.data, status=status.HTTP_200_OK)
 
     def create(self, request, *args, **kwargs):
-        if ResidentialComplex.objects.filter(owner=request.user).exists():
+        if ResidentialComplex.all_objects.filter(owner=request.user).exists():
             raise ValidationError({'detail': _('Ви можете володіти лише одним ЖК.')})
         serializer = self.get_serializer(data=request.data, context={'user': request.user})
         if serializer.is_valid():
@@ -219,6 +274,39 @@ class ResidentialComplexAPIViewSet(PsqMixin,
     def delete_self_complex(self, request, *args, **kwargs):
         return self.delete_obj(self.get_own_obj())
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='min_latitude', type=float, required=True),
+            OpenApiParameter(name='min_longitude', type=float, required=True),
+            OpenApiParameter(name='max_latitude', type=float, required=True),
+            OpenApiParameter(name='max_longitude', type=float, required=True),
+            OpenApiParameter(name='zoom', type=int, description='Zoom level of the map, from 0 to 20'),
+            OpenApiParameter(name='geohash', type=str, description='Geohash prefix of the opened cluster'),
+        ],
+        responses={
+            '200': inline_serializer(
+                name='Residential complexes clusters',
+                fields={
+                    'geohash': CharField(),
+                    'count': IntegerField(),
+                    'latitude': FloatField(),
+                    'longitude': FloatField(),
+                    'id': IntegerField(allow_null=True)
+                },
+                many=True
+            )
+        }
+    )
+    @action(methods=['GET'], detail=False, url_path='map')
+    def map_clusters(self, request, *args, **kwargs):
+        """
+        Returns pins of RCs, visible in the map viewport, aggregated into
+        clusters according to zoom level.
+        """
+        parameters = get_map_parameters(request.query_params)
+        queryset = filter_by_bounding_box(ResidentialComplex.objects.all(), **parameters)
+        return Response(data=cluster_queryset(queryset, zoom=parameters.get('zoom')), status=status.HTTP_200_OK)
+
 
 @extend_schema(tags=['Additions'])
 class AdditionAPIViewSet(PsqMixin, ModelViewSet):
@@ -481,7 +569,8 @@ class DocumentAPIViewSet(PsqMixin,
 
 
 @extend_schema(tags=['News'])
-class NewsAPIViewSet(PsqMixin,
+class NewsAPIViewSet(ConditionalGetMixin,
+                     PsqMixin,
                      ListCreateAPIView,
                      RetrieveUpdateAPIView,
                      DestroyAPIView,
@@ -489,6 +578,7 @@ class NewsAPIViewSet(PsqMixin,
     serializer_class = NewsSerializer
     http_method_names = ['get', 'post', 'patch', 'delete']
     pagination_class = CustomPageNumberPagination
+    conditional_actions = ('list', 'retrieve')
 
     psq_rules = {
         ('create', 'partial_update', 'destroy'):
@@ -507,6 +597,15 @@ class NewsAPIViewSet(PsqMixin,
         queryset = News.objects.filter(residential_complex__owner=self.request.user)
         return queryset
 
+    def get_list_validator(self):
+        # deletion changes amount of news, so only ETag is reliable here
+        aggregate = self.get_queryset().aggregate(amount=Count('id'), last_id=Max('id'), updated_at=Max('updated_at'))
+        return (aggregate.get('amount'), aggregate.get('last_id'), aggregate.get('updated_at')), None
+
+    def get_retrieve_validator(self):
+        values = News.objects.filter(pk=self.kwargs.get(self.lookup_field)).values_list('updated_at').first()
+        return (values, values[0]) if values else None
+
     def list(self, request, *args, **kwargs):
         queryset = self.paginate_queryset(self.get_queryset())
         serializer = self.get_serializer(instance=queryset, many=True)
@@ -651,19 +750,28 @@ class SectionAPIViewSet(PsqMixin,
         serializer = self.get_serializer(instance=queryset, many=True)
         return self.get_paginated_response(data=serializer.data)
 
+    @extend_schema(
+        request=NumberedObjectsCreationSerializer,
+        responses={
+            '201': SectionSerializer(many=True)
+        },
+        description='Creates one section, or several ones by count or list of names; list is returned then.'
+    )
     @action(methods=['POST'], detail=False, url_path='my/create')
     def sections_create(self, request, *args, **kwargs):
+        creation = NumberedObjectsCreationSerializer(data=request.data)
+        if not creation.is_valid():
+            return Response(data=creation.errors, status=status.HTTP_400_BAD_REQUEST)
         try:
-            residential_complex = ResidentialComplex.objects \
-                .prefetch_related('section_set') \
-                .get(owner=request.user)
+            residential_complex = ResidentialComplex.objects.get(owner=request.user)
         except ResidentialComplex.DoesNotExist:
             raise ValidationError({'detail': _('На вас не зареєстровано жодного ЖК.')})
-        instance = Section.objects.create(
-            name=f'Секція {residential_complex.section_set.all().count() + 1}',
-            residential_complex=residential_complex
-        )
-        serializer = self.get_serializer(instance=instance)
+        instances = create_numbered_objects(Section, residential_complex, 'Секція',
+                                            count=creation.validated_data.get('count', 1),
+                                            names=creation.validated_data.get('names'))
+        # without count and names single object is returned, as before
+        serializer = self.get_serializer(instance=instances if creation.validated_data else instances[0],
+                                         many=bool(creation.validated_data))
         return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
     @action(methods=['DELETE'], detail=True, url_path='my/delete')
@@ -796,19 +904,28 @@ class FloorAPIViewSet(PsqMixin,
         serializer = self.get_serializer(instance=queryset, many=True)
         return self.get_paginated_response(data=serializer.data)
 
+    @extend_schema(
+        request=NumberedObjectsCreationSerializer,
+        responses={
+            '201': FloorSerializer(many=True)
+        },
+        description='Creates one floor, or several ones by count or list of names; list is returned then.'
+    )
     @action(methods=['POST'], detail=False, url_path='my/create')
     def floors_create(self, request, *args, **kwargs):
+        creation = NumberedObjectsCreationSerializer(data=request.data)
+        if not creation.is_valid():
+            return Response(data=creation.errors, status=status.HTTP_400_BAD_REQUEST)
         try:
-            residential_complex = ResidentialComplex.objects \
-                .prefetch_related('floor_set') \
-                .get(owner=request.user)
+            residential_complex = ResidentialComplex.objects.get(owner=request.user)
         except ResidentialComplex.DoesNotExist:
             raise ValidationError({'detail': _('На вас не зареєстровано жодного ЖК.')})
-        instance = Floor.objects.create(
-            name=f'Поверх {residential_complex.floor_set.all().count() + 1}',
-            residential_complex=residential_complex
-        )
-        serializer = self.get_serializer(instance=instance)
+        instances = create_numbered_objects(Floor, residential_complex, 'Поверх',
+                                            count=creation.validated_data.get('count', 1),
+                                            names=creation.validated_data.get('names'))
+        # without count and names single object is returned, as before
+        serializer = self.get_serializer(instance=instances if creation.validated_data else instances[0],
+                                         many=bool(creation.validated_data))
         return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
     @action(methods=['DELETE'], detail=True, url_path='my/delete')
@@ -973,7 +1090,8 @@ class FlatAPIViewSet(PsqMixin,
 
 
 @extend_schema(tags=['ChessBoards'])
-class ChessBoardAPIViewSet(PsqMixin,
+class ChessBoardAPIViewSet(ConditionalGetMixin,
+                           PsqMixin,
                            DestroyAPIView,
                            GenericViewSet):
     """
@@ -981,12 +1099,13 @@ class ChessBoardAPIViewSet(PsqMixin,
     """
     serializer_class = ChessBoardSerializer
     pagination_class = CustomPageNumberPagination
+    conditional_actions = ('retrieve', 'grid')
 
     psq_rules = {
         'list_chessboard_by_residential': [
             Rule([CustomIsAuthenticated], ChessBoardListSerializer)
         ],
-        'retrieve': [
+        ('retrieve', 'grid'): [
             Rule([CustomIsAuthenticated])
         ],
         'destroy': [
@@ -1103,10 +1222,55 @@ class ChessBoardAPIViewSet(PsqMixin,
         serializer = self.get_serializer(instance=queryset, many=True)
         return self.get_paginated_response(serializer.data)
 
+    def get_retrieve_validator(self):
+        values = ChessBoard.objects \
+            .filter(pk=self.kwargs.get(self.lookup_field)) \
+            .annotate(flats_amount=Count('chessboardflat'),
+                      last_flat_id=Max('chessboardflat__id'),
+                      flats_updated_at=Max('chessboardflat__updated_at'),
+                      flat_flats_updated_at=Max('chessboardflat__flat__updated_at')) \
+            .values_list('section__name', 'corps__name', 'flats_amount', 'last_flat_id', 'flats_updated_at',
+                         'flat_flats_updated_at') \
+            .first()
+        return (values, None) if values else None
+
     def retrieve(self, request, *args, **kwargs):
         serializer = self.get_serializer(instance=self.get_object())
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    def get_grid_validator(self):
+        return self.get_retrieve_validator()
+
+    @extend_schema(
+        responses={
+            '200': inline_serializer(
+                name='ChessBoard grid',
+                fields={
+                    'id': IntegerField(),
+                    'floors': ListField(child=IntegerField(allow_null=True)),
+                    'floor_names': ListField(child=CharField(allow_null=True)),
+                    'width': IntegerField(),
+                    'ids': ListField(child=ListField(child=IntegerField())),
+                    'prices': ListField(child=ListField(child=IntegerField())),
+                    'price_per_meter': ListField(child=ListField(child=FloatField())),
+                    'statuses': ListField(child=ListField(child=IntegerField()),
+                                          help_text='0 - empty, 1 - on moderation, 2 - published, 3 - called off')
+                }
+            )
+        }
+    )
+    @action(methods=['GET'], detail=True, url_path='grid')
+    def grid(self, request, *args, **kwargs):
+        """
+        Returns chessboard as floor x position matrices of announcements'
+        ids, prices, prices per meter and statuses. Grid is cached until any
+        announcement of the chessboard or its flat changes.
+        """
+        if self.conditional_validator is None:
+            raise ValidationError({'detail': _('Вказаної шахматки не існує.')})
+        values, last_modified = self.conditional_validator
+        return Response(data=get_grid(int(self.kwargs.get(self.lookup_field)), values), status=status.HTTP_200_OK)
+
     @extend_schema(
         request=inline_serializer(
             name='ChessBoard',
@@ -1135,7 +1299,9 @@ class ChessBoardAPIViewSet(PsqMixin,
 
 
 @extend_schema(tags=['Announcements'])
-class ChessBoardFlatAnnouncementAPIViewSet(PsqMixin,
+class ChessBoardFlatAnnouncementAPIViewSet(ConditionalGetMixin,
+                                           SparseFieldsMixin,
+                                           PsqMixin,
                                            ListAPIView,
                                            RetrieveAPIView,
                                            DestroyAPIView,
@@ -1151,7 +1317,7 @@ class ChessBoardFlatAnnouncementAPIViewSet(PsqMixin,
     filterset_class = AnnouncementsFilterSet
 
     psq_rules = {
-        ('destroy', 'list_all_announcements'): [
+        ('destroy', 'list_all_announcements', 'export'): [
             Rule([IsAdminPermission], ChessBoardFlatAnnouncementListSerializer),
             Rule([IsManagerPermission], ChessBoardFlatAnnouncementListSerializer)
         ],
@@ -1163,9 +1329,12 @@ class ChessBoardFlatAnnouncementAPIViewSet(PsqMixin,
             Rule([IsUserPermission | IsAdminPermission | IsManagerPermission | IsBuilderPermission],
                  ChessBoardFlatAnnouncementListSerializer)
         ],
-        'create_announcement': [
+        ('create_announcement', 'create_announcements_batch'): [
             Rule([IsUserPermission])
         ],
+        'update_own_announcements_batch': [
+            Rule([IsUserPermission], ChessBoardFlatAnnouncementSerializer)
+        ],
         ('list_own_announcements',): [
             Rule([IsUserPermission], ChessBoardFlatAnnouncementListSerializer)
         ],
@@ -1174,14 +1343,34 @@ class ChessBoardFlatAnnouncementAPIViewSet(PsqMixin,
         ],
         'call_off_announcement': [
             Rule([IsAdminPermission | IsManagerPermission], CallOffAnnouncementSerializer)
+        ],
+        'map_clusters': [
+            Rule([IsUserPermission | IsAdminPermission | IsManagerPermission | IsBuilderPermission])
+        ],
+        'deck': [
+            Rule([IsUserPermission], ChessBoardFlatAnnouncementListSerializer)
+        ],
+        'deck_seen': [
+            Rule([IsUserPermission])
+        ],
+        'similar': [
+            Rule([IsUserPermission | IsAdminPermission | IsManagerPermission | IsBuilderPermission],
+                 ChessBoardFlatAnnouncementListSerializer)
         ]
     }
 
+    deck_default_size = 20
+    deck_max_size = 100
+    similar_default_amount = 10
+    similar_max_amount = 50
+    conditional_actions = ('retrieve',)
+    sparse_actions = ('list', 'retrieve', 'deck', 'similar', 'list_own_announcements')
+
     def get_queryset(self):
         queryset = ChessBoardFlat.objects\
             .select_related('residential_complex', 'creator', 'promotion__promotion_type')\
             .filter(accepted=True, called_off=False)\
-            .order_by('promotion__promotion_type__efficiency', 'created_at')
+            .order_by('-rank_score', '-id')
         return queryset
 
     def get_object(self, *args, **kwargs):
@@ -1207,7 +1396,9 @@ class ChessBoardFlatAnnouncementAPIViewSet(PsqMixin,
 
     def destroy_object(self, obj):
         try:
-            obj.delete()
+            with transaction.atomic():
+                unmatch_announcements([obj.id])
+                obj.delete()
         except ProtectedError:
             raise ValidationError({'detail': _('Видалити об`яву не вдалося.')})
 
@@ -1223,15 +1414,28 @@ class ChessBoardFlatAnnouncementAPIViewSet(PsqMixin,
             OpenApiParameter(name='square_to', type=int),
             OpenApiParameter(name='purpose', type=str),
             OpenApiParameter(name='payment_option', type=str),
-            OpenApiParameter(name='housing_condition', type=str)
+            OpenApiParameter(name='housing_condition', type=str),
+            OpenApiParameter(name='fields', type=str, description='Fields to return, e.g. id,price,creator.name'),
+            OpenApiParameter(name='expand', type=str, description='Nested objects to return instead of their ids')
         ]
     )
     def list(self, request, *args, **kwargs):
-        filtered_queryset = self.filter_queryset(self.get_queryset())
+        filtered_queryset = self.project_queryset(self.filter_queryset(self.get_queryset()))
         serializer = self.get_serializer(instance=self.paginate_queryset(filtered_queryset),
                                          many=True)
         return self.get_paginated_response(serializer.data)
 
+    def get_retrieve_validator(self):
+        values = ChessBoardFlat.objects \
+            .filter(pk=self.kwargs.get(self.lookup_field)) \
+            .annotate(photos_amount=Count('gallery__photo'), last_photo_id=Max('gallery__photo__id')) \
+            .values_list('updated_at', 'rank_score', 'photos_amount', 'last_photo_id', 'chessboard_id',
+                         'residential_complex__name', 'creator__email', 'creator__name', 'creator__surname',
+                         'promotion__promotion_type__name', 'promotion__promotion_type__price',
+                         'promotion__promotion_type__efficiency', 'promotion__promotion_type__duration') \
+            .first()
+        return (values, None) if values else None
+
     def retrieve(self, request, *args, **kwargs):
         """
         Retrieve method for all authenticated users.
@@ -1248,12 +1452,190 @@ class ChessBoardFlatAnnouncementAPIViewSet(PsqMixin,
         self.destroy_object(obj)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='min_latitude', type=float, required=True),
+            OpenApiParameter(name='min_longitude', type=float, required=True),
+            OpenApiParameter(name='max_latitude', type=float, required=True),
+            OpenApiParameter(name='max_longitude', type=float, required=True),
+            OpenApiParameter(name='zoom', type=int, description='Zoom level of the map, from 0 to 20'),
+            OpenApiParameter(name='geohash', type=str, description='Geohash prefix of the opened cluster'),
+        ],
+        responses={
+            '200': inline_serializer(
+                name='Announcements clusters',
+                fields={
+                    'geohash': CharField(),
+                    'count': IntegerField(),
+                    'latitude': FloatField(),
+                    'longitude': FloatField(),
+                    'id': IntegerField(allow_null=True)
+                },
+                many=True
+            )
+        }
+    )
+    @action(methods=['GET'], detail=False, url_path='map')
+    def map_clusters(self, request, *args, **kwargs):
+        """
+        Returns announcements of the feed, visible in the map viewport,
+        aggregated into clusters according to zoom level. Announcements take
+        coordinates of their RC. Filters of the feed are applied as well.
+        """
+        parameters = get_map_parameters(request.query_params)
+        queryset = filter_by_bounding_box(self.filter_queryset(self.get_queryset()),
+                                          prefix='residential_complex__',
+                                          **parameters)
+        clusters = cluster_queryset(queryset, zoom=parameters.get('zoom'), prefix='residential_complex__')
+        return Response(data=clusters, status=status.HTTP_200_OK)
+
+    def get_deck_size(self) -> int:
+        try:
+            size = int(self.request.query_params.get('size', self.deck_default_size))
+        except ValueError:
+            raise ValidationError({'size': _('Неправильно вказано розмір.')})
+        return max(1, min(size, self.deck_max_size))
+
+    def get_deck_cursor(self) -> DeckCursor:
+        """
+        :return: DeckCursor of current user for filters of the request
+        """
+        filters = sorted((key, value) for key, value in self.request.query_params.lists() if key != 'size')
+        return DeckCursor(self.request.user.id, scope=hashlib.md5(repr(filters).encode()).hexdigest())
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='size', type=int, description='Amount of announcements in the deck, up to 100'),
+            OpenApiParameter(name='house_status', type=str),
+            OpenApiParameter(name='district', type=str),
+            OpenApiParameter(name='micro_district', type=str),
+            OpenApiParameter(name='room_amount', type=int),
+            OpenApiParameter(name='price_from', type=int),
+            OpenApiParameter(name='price_to', type=int),
+            OpenApiParameter(name='square_from', type=int),
+            OpenApiParameter(name='square_to', type=int),
+            OpenApiParameter(name='purpose', type=str),
+            OpenApiParameter(name='payment_option', type=str),
+            OpenApiParameter(name='housing_condition', type=str)
+        ],
+        responses={
+            '200': ChessBoardFlatAnnouncementListSerializer(many=True)
+        }
+    )
+    @action(methods=['GET'], detail=False, url_path='deck')
+    def deck(self, request, *args, **kwargs):
+        """
+        Returns next batch of announcements of the feed, which user has not
+        swiped yet, in the order of the feed.
+        """
+        ids = collect_deck(self.filter_queryset(self.get_queryset()),
+                           seen_set=SeenSet(request.user.id),
+                           size=self.get_deck_size(),
+                           cursor=self.get_deck_cursor())
+        announcements = self.project_queryset(
+            self.get_queryset().select_related('chessboard__corps', 'chessboard__section')
+        ).in_bulk(ids)
+        serializer = self.get_serializer(instance=[announcements[pk] for pk in ids if pk in announcements],
+                                         many=True)
+        return Response(data=serializer.data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        request=DeckSeenSerializer,
+        responses={
+            '204': None
+        }
+    )
+    @action(methods=['POST'], detail=False, url_path='deck/seen')
+    def deck_seen(self, request, *args, **kwargs):
+        """
+        Marks announcements as swiped, so they are excluded from the deck.
+        """
+        serializer = DeckSeenSerializer(data=request.data)
+        if serializer.is_valid():
+            SeenSet(request.user.id).add(serializer.validated_data.get('announcements'))
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='k', type=int, description='Amount of similar announcements, up to 50'),
+            OpenApiParameter(name='metric', type=str, enum=METRICS, description='Distance metric, cosine by default'),
+        ],
+        responses={
+            '200': ChessBoardFlatAnnouncementListSerializer(many=True)
+        }
+    )
+    @action(methods=['GET'], detail=True, url_path='similar')
+    def similar(self, request, *args, **kwargs):
+        """
+        Returns announcements of the feed, which are the most similar to the
+        given one by price, squares, rooms, planning, condition, district and
+        RC. Neighbours are searched in the memory-mapped similarity index.
+        """
+        try:
+            k = max(1, min(int(request.query_params.get('k', self.similar_default_amount)),
+                           self.similar_max_amount))
+        except ValueError:
+            raise ValidationError({'k': _('Неправильно вказано кількість.')})
+        metric = request.query_params.get('metric', 'cosine')
+        if metric not in METRICS:
+            raise ValidationError({'metric': _('Неправильно вказано метрику.')})
+
+        pk = self.get_object().pk
+        # index is refreshed periodically, so ask for spare neighbours in case
+        # some of them have left the feed since then
+        ids = similarity_index.similar([pk], k=k * 2, metric=metric).get(pk)
+        announcements = self.project_queryset(self.get_queryset()).in_bulk(ids)
+        serializer = self.get_serializer(instance=[announcements[pk] for pk in ids if pk in announcements][:k],
+                                         many=True)
+        return Response(data=serializer.data, status=status.HTTP_200_OK)
+
     @action(methods=['GET'], detail=False, url_path='all')
     def list_all_announcements(self, request, *args, **kwargs):
         queryset = self.paginate_queryset(self.get_all_queryset())
         serializer = self.get_serializer(instance=queryset, many=True)
         return self.get_paginated_response(serializer.data)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='file_format', type=str, enum=EXPORT_FORMATS, description='csv by default'),
+            OpenApiParameter(name='house_status', type=str),
+            OpenApiParameter(name='district', type=str),
+            OpenApiParameter(name='micro_district', type=str),
+            OpenApiParameter(name='room_amount', type=int),
+            OpenApiParameter(name='price_from', type=int),
+            OpenApiParameter(name='price_to', type=int),
+            OpenApiParameter(name='square_from', type=int),
+            OpenApiParameter(name='square_to', type=int),
+            OpenApiParameter(name='purpose', type=str),
+            OpenApiParameter(name='payment_option', type=str),
+            OpenApiParameter(name='housing_condition', type=str)
+        ],
+        responses={
+            (200, 'text/csv'): OpenApiTypes.BINARY,
+            (200, 'application/x-ndjson'): OpenApiTypes.BINARY,
+        }
+    )
+    @action(methods=['GET'], detail=False, url_path='export')
+    def export(self, request, *args, **kwargs):
+        """
+        Streams all announcements, filtered as the feed, as CSV or NDJSON
+        file. Rows are read by server-side cursor, so memory does not grow
+        with the catalog.
+        """
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            raise ValidationError({'file_format': _('Неправильно вказано формат файлу.')})
+
+        queryset = self.filter_queryset(ChessBoardFlat.objects.all())
+        response = StreamingHttpResponse(export_announcements(queryset, file_format),
+                                         content_type=EXPORT_CONTENT_TYPES.get(file_format))
+        response['Content-Disposition'] = \
+            f'attachment; filename="announcements-{timezone.now():%Y-%m-%d}.{file_format}"'
+        # let nginx pass chunks to the client as they are produced
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
     @extend_schema(
         responses={
             '200': ChessBoardFlatAnnouncementListSerializer(many=True)
@@ -1261,7 +1643,7 @@ class ChessBoardFlatAnnouncementAPIViewSet(PsqMixin,
     )
     @action(methods=['GET'], detail=False, url_path='my')
     def list_own_announcements(self, request, *args, **kwargs):
-        queryset = self.paginate_queryset(self.get_owner_queryset())
+        queryset = self.paginate_queryset(self.project_queryset(self.get_owner_queryset()))
         serializer = self.get_serializer(instance=queryset, many=True)
         return self.get_paginated_response(serializer.data)
 
@@ -1287,6 +1669,105 @@ class ChessBoardFlatAnnouncementAPIViewSet(PsqMixin,
         self.destroy_object(obj)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def get_batch_items(self) -> list:
+        items = self.request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError({'detail': _('Очікується непорожній список оголошень.')})
+        if len(items) > ANNOUNCEMENT_BATCH_MAX_SIZE:
+            raise ValidationError({'detail': _('Можна передати не більше %(amount)s оголошень.')
+                                             % {'amount': ANNOUNCEMENT_BATCH_MAX_SIZE}})
+        return items
+
+    @staticmethod
+    def get_batch_statuses(errors: list) -> list:
+        """
+        :param errors: errors of ListSerializer, empty dict for valid items
+        :return: status of every item, nothing of batch is saved
+        """
+        return [{'index': index, 'status': 'invalid', 'errors': item_errors} if item_errors
+                else {'index': index, 'status': 'valid'}
+                for index, item_errors in enumerate(errors)]
+
+    @extend_schema(
+        request=ChessBoardFlatAnnouncementSerializer(many=True),
+        responses={
+            '201': inline_serializer(
+                name='Batch status',
+                fields={
+                    'index': IntegerField(),
+                    'status': CharField(),
+                    'id': IntegerField(required=False),
+                    'errors': DictField(required=False)
+                },
+                many=True
+            )
+        }
+    )
+    @action(methods=['POST'], detail=False, url_path='batch')
+    def create_announcements_batch(self, request, *args, **kwargs):
+        """
+        Creates up to 100 announcements at once. Announcements are validated
+        together and saved only if all of them are valid, otherwise status
+        of every announcement is returned.
+        """
+        serializer = self.get_serializer(data=self.get_batch_items(), many=True, context={'user': request.user})
+        if serializer.is_valid():
+            instances = serializer.save()
+            return Response(data=[{'index': index, 'status': 'created', 'id': instance.id}
+                                  for index, instance in enumerate(instances)],
+                            status=status.HTTP_201_CREATED)
+        return Response(data=self.get_batch_statuses(serializer.errors), status=status.HTTP_400_BAD_REQUEST)
+
+    @extend_schema(
+        request=inline_serializer(
+            name='Batch announcement update',
+            fields={
+                'id': IntegerField(),
+            },
+            many=True
+        ),
+        responses={
+            '200': inline_serializer(
+                name='Batch update status',
+                fields={
+                    'index': IntegerField(),
+                    'status': CharField(),
+                    'id': IntegerField(required=False),
+                    'errors': DictField(required=False)
+                },
+                many=True
+            )
+        }
+    )
+    @action(methods=['PATCH'], detail=False, url_path='my/batch')
+    def update_own_announcements_batch(self, request, *args, **kwargs):
+        """
+        Partially updates up to 100 own announcements at once, every item
+        contains id of the announcement. Nothing is saved, unless all items
+        are valid.
+        """
+        items = self.get_batch_items()
+        ids = []
+        for item in items:
+            try:
+                ids.append(int(item.get('id')))
+            except (AttributeError, TypeError, ValueError):
+                ids.append(None)
+        instances = self.get_owner_queryset().in_bulk([pk for pk in ids if pk is not None])
+        missing = [{'index': index, 'status': 'not_found'} for index, pk in enumerate(ids) if pk not in instances]
+        if missing:
+            return Response(data=missing, status=status.HTTP_400_BAD_REQUEST)
+        if len(set(ids)) != len(ids):
+            raise ValidationError({'detail': _('Оголошення не можуть повторюватися.')})
+
+        serializer = self.get_serializer(instance=[instances[pk] for pk in ids], data=items, many=True,
+                                         partial=True)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(data=[{'index': index, 'status': 'updated', 'id': pk} for index, pk in enumerate(ids)],
+                            status=status.HTTP_200_OK)
+        return Response(data=self.get_batch_statuses(serializer.errors), status=status.HTTP_400_BAD_REQUEST)
+
     @extend_schema(
         request=inline_serializer(
             name='Call off announcement',
@@ -1308,7 +1789,12 @@ class ChessBoardFlatAnnouncementAPIViewSet(PsqMixin,
     def call_off_announcement(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data, instance=self.get_object(), partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                instance = serializer.save()
+                if instance.called_off:
+                    unmatch_announcements([instance.id])
+                    record_tombstones(Tombstone.KindChoice.announcement, [instance.id])
+            refresh_rank_score(instance.id)
             return Response(data={'detail': _('Оголошення успішно відхилено.')}, status=status.HTTP_200_OK)
         return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -1330,10 +1816,22 @@ class ChessBoardFlatAnnouncementAPIViewSet(PsqMixin,
             instance.called_off = False
             instance.rejection_reason = None
             instance.save()
+            refresh_rank_score(instance.id)
+            transaction.on_commit(lambda: match_saved_filters.delay([instance.id]))
             return Response(data={'detail': _('Оголошення успішно розблоковано.')}, status=status.HTTP_200_OK)
         return Response(data={'detail': _('Оголошення не є заблокованим.')}, status=status.HTTP_400_BAD_REQUEST)
 
 
+MODERATION_STATUS_SCHEMA = inline_serializer(
+    name='Moderation status',
+    fields={
+        'id': IntegerField(),
+        'status': CharField()
+    },
+    many=True
+)
+
+
 @extend_schema(tags=['Announcement Approval'])
 class ChessBoardFlatApprovingAPIViewSet(PsqMixin,
                                         ListAPIView,
@@ -1352,6 +1850,21 @@ class ChessBoardFlatApprovingAPIViewSet(PsqMixin,
         ],
         ('approve_announcement', 'announcement_detail', 'delete_announcement'): [
             Rule([IsBuilderPermission, IsOwnerPermission])
+        ],
+        'claim_announcements': [
+            Rule([IsBuilderPermission | IsAdminPermission | IsManagerPermission], ModerationClaimSerializer)
+        ],
+        'claimed_announcements': [
+            Rule([IsBuilderPermission | IsAdminPermission | IsManagerPermission], AnnouncementListSerializer)
+        ],
+        'approve_claimed_announcements': [
+            Rule([IsBuilderPermission | IsAdminPermission | IsManagerPermission], ModerationApproveSerializer)
+        ],
+        'call_off_claimed_announcements': [
+            Rule([IsBuilderPermission | IsAdminPermission | IsManagerPermission], ModerationCallOffSerializer)
+        ],
+        'delete_claimed_announcements': [
+            Rule([IsBuilderPermission | IsAdminPermission | IsManagerPermission], ModerationDeleteSerializer)
         ]
     }
 
@@ -1446,16 +1959,147 @@ class ChessBoardFlatApprovingAPIViewSet(PsqMixin,
     def approve_announcement(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data, instance=self.get_object(), partial=True)
         if serializer.is_valid():
-            serializer.save()
+            instance = serializer.save()
+            refresh_rank_score(instance.id)
+            if instance.accepted:
+                transaction.on_commit(lambda: match_saved_filters.delay([instance.id]))
             return Response(data=serializer.data, status=status.HTTP_200_OK)
         return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @action(methods=['DELETE'], detail=True, url_path='delete')
     def delete_announcement(self, request, *args, **kwargs):
         obj: ChessBoardFlat = self.get_object()
-        obj.delete()
+        with transaction.atomic():
+            unmatch_announcements([obj.id])
+            obj.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @extend_schema(
+        responses={
+            '200': AnnouncementListSerializer(many=True)
+        }
+    )
+    @action(methods=['POST'], detail=False, url_path='queue/claim')
+    def claim_announcements(self, request, *args, **kwargs):
+        """
+        Claims next announcements of the moderation queue for 15 minutes.
+        Announcements, claimed by other moderators or by the same moderator
+        before, are skipped. Builder moderates the queue of own RC, admins
+        and managers moderate the queue of all RCs.
+        """
+        serializer = self.get_serializer(data=request.data)
+        if serializer.is_valid():
+            owner = self.get_moderation_owner()
+            ids = claim_announcements(owner, request.user, serializer.validated_data.get('amount'))
+            announcements = get_moderation_queryset(owner).in_bulk(ids)
+            return Response(data=AnnouncementListSerializer([announcements[pk] for pk in ids if pk in announcements],
+                                                            many=True).data,
+                            status=status.HTTP_200_OK)
+        return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=['GET'], detail=False, url_path='queue/my')
+    def claimed_announcements(self, request, *args, **kwargs):
+        """
+        Returns announcements, which are still claimed by current moderator.
+        """
+        queryset = get_claimed_queryset(self.get_moderation_owner(), request.user).order_by('created_at', 'id')
+        serializer = self.get_serializer(instance=self.paginate_queryset(queryset), many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def get_moderation_owner(self):
+        """
+        :return: builder, whose queue is moderated, or None for admins and managers
+        """
+        return self.request.user if self.request.user.role.role == 'builder' else None
+
+    def moderate(self, handler) -> Response:
+        """
+        :param handler: function of moderation, which takes validated data and returns status of every announcement
+        :return: Response with list of statuses
+        """
+        serializer = self.get_serializer(data=self.request.data)
+        if serializer.is_valid():
+            statuses = handler(self.get_moderation_owner(), self.request.user, **serializer.validated_data)
+            return Response(data=[{'id': pk, 'status': value} for pk, value in statuses.items()],
+                            status=status.HTTP_200_OK)
+        return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @extend_schema(
+        responses={
+            '200': MODERATION_STATUS_SCHEMA
+        }
+    )
+    @action(methods=['POST'], detail=False, url_path='queue/approve')
+    def approve_claimed_announcements(self, request, *args, **kwargs):
+        """
+        Approves claimed announcements, binding each of them to the given
+        flat. Chessboards of corps and sections are created if necessary.
+        """
+        return self.moderate(approve_announcements)
+
+    @extend_schema(
+        responses={
+            '200': MODERATION_STATUS_SCHEMA
+        }
+    )
+    @action(methods=['POST'], detail=False, url_path='queue/call-off')
+    def call_off_claimed_announcements(self, request, *args, **kwargs):
+        return self.moderate(call_off_announcements)
+
+    @extend_schema(
+        responses={
+            '200': MODERATION_STATUS_SCHEMA
+        }
+    )
+    @action(methods=['POST'], detail=False, url_path='queue/delete')
+    def delete_claimed_announcements(self, request, *args, **kwargs):
+        return self.moderate(delete_announcements)
+
+
+@extend_schema(tags=['Announcements Archive'])
+class ArchivedAnnouncementAPIViewSet(PsqMixin,
+                                     GenericViewSet):
+    """
+    Read-only access to archived announcements. Users see announcements
+    they have created, builders see announcements of their RC.
+    """
+    serializer_class = ArchivedAnnouncementSerializer
+    pagination_class = CustomPageNumberPagination
+
+    psq_rules = {
+        'list': [
+            Rule([IsUserPermission | IsBuilderPermission | IsAdminPermission | IsManagerPermission],
+                 ArchivedAnnouncementListSerializer)
+        ],
+        'retrieve': [
+            Rule([IsUserPermission | IsBuilderPermission | IsAdminPermission | IsManagerPermission])
+        ]
+    }
+
+    def get_queryset(self):
+        queryset = ArchivedAnnouncement.objects.order_by('-archived_at', '-id')
+        if self.request.user.role.role in ('admin', 'manager'):
+            return queryset
+        return queryset.filter(Q(creator=self.request.user) | Q(residential_complex__owner=self.request.user))
+
+    def get_object(self, *args, **kwargs):
+        try:
+            return self.get_queryset() \
+                .select_related('residential_complex', 'promotion__promotion_type') \
+                .prefetch_related('gallery__photo_set') \
+                .get(pk=self.kwargs.get(self.lookup_field))
+        except ArchivedAnnouncement.DoesNotExist:
+            raise ValidationError({'detail': _('Вказаного оголошення не існує.')})
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(instance=queryset, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        serializer = self.get_serializer(instance=self.get_object())
+        return Response(data=serializer.data, status=status.HTTP_200_OK)
+
 
 @extend_schema(tags=['Promotions'])
 class PromotionTypeAPIViewSet(PsqMixin,
@@ -1490,7 +2134,11 @@ class PromotionTypeAPIViewSet(PsqMixin,
     def partial_update(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data, instance=self.get_object(), partial=True)
         if serializer.is_valid():
-            serializer.save()
+            instance = serializer.save()
+            if 'efficiency' in serializer.validated_data:
+                refresh_rank_scores(ids=ChessBoardFlat.objects
+                                    .filter(promotion__promotion_type=instance)
+                                    .values_list('id', flat=True))
             return Response(data=serializer.data, status=status.HTTP_200_OK)
         return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -1548,6 +2196,7 @@ class AnnouncementPromotionAPIViewSet(PsqMixin,
         )
         if serializer.is_valid():
             serializer.save()
+            refresh_rank_score(self.obj.id)
             return Response(status=status.HTTP_201_CREATED)
         return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -1563,6 +2212,7 @@ class AnnouncementPromotionAPIViewSet(PsqMixin,
     def destroy_promotion(self, request, *args, **kwargs):
         chessboard_flat = self.get_chessboard_flat_object()
         chessboard_flat.promotion.delete()
+        refresh_rank_score(chessboard_flat.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -1645,3 +2295,148 @@ class FavoriteResidentialComplexAPIViewSet(PsqMixin,
             return Response(data=serializer.data, status=status.HTTP_200_OK)
         return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+
+@extend_schema(tags=['Swipes'])
+class SwipeEventAPIViewSet(PsqMixin,
+                           GenericViewSet):
+    """
+    ViewSet for ingestion of swipes. Events are only appended to the buffer
+    here and are written to database by Celery consumer.
+    """
+    serializer_class = SwipeEventBatchSerializer
+
+    psq_rules = {
+        'create': [
+            Rule([IsUserPermission])
+        ]
+    }
+
+    retry_after = 5     # seconds
+
+    @extend_schema(
+        responses={
+            '202': None,
+            '503': inline_serializer(
+                name='Swipes buffer is overloaded',
+                fields={
+                    'detail': CharField(default=_('Сервер перевантажений. Спробуйте пізніше.'))
+                }
+            )
+        }
+    )
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        buffer = SwipeEventBuffer()
+        if buffer.is_overloaded():
+            return Response(data={'detail': _('Сервер перевантажений. Спробуйте пізніше.')},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            headers={'Retry-After': str(self.retry_after)})
+
+        buffer.push(request.user.id, serializer.validated_data.get('events'))
+        return Response(status=status.HTTP_202_ACCEPTED)
+
+
+@extend_schema(tags=['Sync'])
+class SyncAPIViewSet(PsqMixin,
+                     GenericViewSet):
+    """
+    ViewSet for delta synchronization of offline cache of mobile clients.
+    """
+    serializer_class = SyncSerializer
+
+    psq_rules = {
+        'list': [
+            Rule([IsUserPermission])
+        ]
+    }
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='since', type=str, description='Token from previous sync, full snapshot if absent')
+        ]
+    )
+    def list(self, request, *args, **kwargs):
+        """
+        Returns announcements of the feed and favorites, changed since the
+        token, and ids of deleted ones. Should be repeated with new token
+        while has_more is true.
+        """
+        changes = collect_changes(request.user, request.query_params.get('since'))
+        serializer = self.get_serializer(instance=changes)
+        return Response(data=serializer.data, status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=['Flats'])
+class FlatImportAPIViewSet(PsqMixin,
+                           GenericViewSet):
+    """
+    ViewSet for bulk creation of flats of builder's RC from CSV file.
+    """
+    serializer_class = FlatImportSerializer
+    pagination_class = CustomPageNumberPagination
+
+    psq_rules = {
+        ('list', 'retrieve', 'create'): [
+            Rule([IsBuilderPermission])
+        ]
+    }
+
+    def get_queryset(self):
+        queryset = FlatImport.objects.filter(creator=self.request.user).order_by('-id')
+        return queryset
+
+    def get_object(self, *args, **kwargs):
+        try:
+            return self.get_queryset().get(pk=self.kwargs.get(self.lookup_field))
+        except FlatImport.DoesNotExist:
+            raise ValidationError({'detail': _('Вказаного імпорту не існує.')})
+
+    def get_residential_complex(self):
+        try:
+            return ResidentialComplex.objects.get(owner=self.request.user)
+        except ResidentialComplex.DoesNotExist:
+            raise ValidationError({'detail': _('На вас не зареєстровано жодного ЖК.')})
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(instance=queryset, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Returns status and progress of the import, and errors of rows, if
+        file has not passed validation.
+        """
+        serializer = self.get_serializer(instance=self.get_object())
+        return Response(data=serializer.data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        request={
+            'multipart/form-data': inline_serializer(
+                name='Flat import',
+                fields={
+                    'file': FileField(help_text='CSV with columns corps, section, floor, district, '
+                                                'micro_district, room_amount, square, price, condition')
+                }
+            )
+        },
+        responses={
+            '202': FlatImportSerializer
+        }
+    )
+    def create(self, request, *args, **kwargs):
+        """
+        Accepts CSV file with flats, which is validated and imported in
+        background. Corps, section and floor are given by their names.
+        """
+        serializer = self.get_serializer(data=request.data,
+                                         context={'residential_complex': self.get_residential_complex(),
+                                                  'user': request.user})
+        if serializer.is_valid():
+            instance = serializer.save()
+            transaction.on_commit(lambda: import_flats.delay(instance.id))
+            return Response(data=serializer.data, status=status.HTTP_202_ACCEPTED)
+        return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,65 @@
+from django.db.models import F
+
+from .models import Conversation, Message
+
+
+def get_side(user) -> str:
+    """
+    :return: 'manager' for managers and admins, 'user' for others
+    """
+    return 'manager' if user.role.role in ['admin', 'manager'] else 'user'
+
+
+def record_message(message: Message) -> None:
+    """
+    Moves last message of the conversation to the new one and increases
+    unread counter of receiver. Should be called in the transaction, which
+    creates the message, the row of conversation is locked until commit.
+    :param message: Message
+    :return: None
+    """
+    sender_side = get_side(message.sender)
+    unread = 'manager_unread' if sender_side == 'user' else 'user_unread'
+    values = {
+        'last_message': message,
+        'last_message_text': message.text,
+        'last_message_at': message.created_at,
+    }
+
+    conversations = Conversation.objects.filter(key=message.conversation_key)
+    if conversations.update(**values, **{unread: F(unread) + 1}):
+        return
+
+    user, manager = (message.sender, message.receiver) if sender_side == 'user' \
+        else (message.receiver, message.sender)
+    _, created = Conversation.objects.get_or_create(key=message.conversation_key,
+                                                    defaults={'user': user, 'manager': manager, unread: 1, **values})
+    if not created:
+        # created by concurrent message after the update above
+        conversations.update(**values, **{unread: F(unread) + 1})
+
+
+def mark_conversation_read(key: str, side: str) -> None:
+    """
+    :param key: conversation_key
+    :param side: 'user' or 'manager', who has read the conversation
+    :return: None
+    """
+    unread = f'{side}_unread'
+    Conversation.objects.filter(key=key, **{f'{unread}__gt': 0}).update(**{unread: 0})
+
+
+def refresh_last_message(key: str, deleted_id: int) -> None:
+    """
+    Moves last message of the conversation to the previous one, if the
+    deleted message was the last.
+    :param key: conversation_key
+    :param deleted_id: id of deleted Message
+    :return: None
+    """
+    conversations = Conversation.objects.filter(key=key, last_message_id=deleted_id)
+    last = Message.objects.filter(conversation_key=key).order_by('-created_at', '-id').first()
+    if last is None:
+        conversations.update(last_message=None, last_message_text='')
+    else:
+        conversations.update(last_message=last, last_message_text=last.text, last_message_at=last.created_at)
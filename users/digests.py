@@ -0,0 +1,108 @@
+import time
+from functools import lru_cache
+
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import SavedFilterMatch, User
+
+
+DIGEST_USERS_CHUNK_SIZE = 50        # users per one send_messages() call
+DIGEST_MAX_ANNOUNCEMENTS = 20       # announcements listed in one email
+DIGEST_MESSAGES_PER_SECOND = 5
+DIGEST_SUBJECT = 'Нові оголошення за вашими фільтрами.'
+
+
+@lru_cache(maxsize=None)
+def get_digest_template():
+    """
+    Template is compiled once per process instead of once per email.
+    :return: Template
+    """
+    return get_template('account/email/saved_filter_digest.html')
+
+
+def build_digest(user: User, announcements: list) -> EmailMessage:
+    """
+    :param user: User
+    :param announcements: list of dicts, newest first
+    :return: EmailMessage
+    """
+    html_message = get_digest_template().render({
+        'name': user.name,
+        'announcements': announcements[:DIGEST_MAX_ANNOUNCEMENTS],
+        'more_amount': max(len(announcements) - DIGEST_MAX_ANNOUNCEMENTS, 0),
+    })
+    email = EmailMessage(subject=DIGEST_SUBJECT, body=html_message, to=[user.email])
+    email.content_subtype = 'html'
+    return email
+
+
+def send_saved_filter_digests(connection=None, chunk_size: int = DIGEST_USERS_CHUNK_SIZE,
+                              messages_per_second: float = DIGEST_MESSAGES_PER_SECOND) -> int:
+    """
+    Sends one email per user with all announcements, which matched their saved
+    filters since previous digest. Users are processed in chunks by id through
+    one SMTP connection. Matches are marked as notified right after their
+    chunk is sent, so interrupted run is continued by the next one and
+    resends at most one chunk.
+    :param connection: email backend, opened one is created if None
+    :param chunk_size: amount of users per chunk
+    :param messages_per_second: sending rate limit
+    :return: amount of sent emails
+    """
+    pending = SavedFilterMatch.objects.filter(notified_at__isnull=True)
+    connection = connection or get_connection()
+    connection.open()
+    sent = 0
+    last_user_id = 0
+
+    try:
+        while True:
+            user_ids = list(pending
+                            .filter(saved_filter__user_id__gt=last_user_id)
+                            .order_by('saved_filter__user_id')
+                            .values_list('saved_filter__user_id', flat=True)
+                            .distinct()[:chunk_size])
+            if not user_ids:
+                break
+            started = time.monotonic()
+
+            rows = pending \
+                .filter(saved_filter__user_id__in=user_ids) \
+                .order_by('-created_at') \
+                .values_list('id', 'saved_filter__user_id', 'chessboard_flat_id', 'chessboard_flat__address',
+                             'chessboard_flat__price', 'chessboard_flat__room_amount',
+                             'chessboard_flat__overall_square')
+            match_ids = []
+            announcements = {user_id: {} for user_id in user_ids}
+            for pk, user_id, chessboard_flat_id, address, price, room_amount, overall_square in rows:
+                match_ids.append(pk)
+                # announcement can match several filters of the same user
+                announcements[user_id].setdefault(chessboard_flat_id, {
+                    'address': address,
+                    'price': price,
+                    'room_amount': room_amount,
+                    'overall_square': overall_square,
+                })
+
+            users = User.objects.only('name', 'email', 'notifications').in_bulk(user_ids)
+            messages = [build_digest(users[user_id], list(announcements[user_id].values()))
+                        for user_id in user_ids
+                        if user_id in users
+                        and users[user_id].notifications != User.NotificationChoices.disabled]
+            if messages:
+                connection.send_messages(messages)
+            SavedFilterMatch.objects.filter(id__in=match_ids).update(notified_at=timezone.now())
+
+            sent += len(messages)
+            last_user_id = user_ids[-1]
+
+            pause = len(messages) / messages_per_second - (time.monotonic() - started)
+            if pause > 0:
+                time.sleep(pause)
+    finally:
+        connection.close()
+
+    return sent
@@ -2,16 +2,19 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.serializers import Field
 from django.utils.translation import gettext_lazy as _
 
+from api_swipe.loaders import LoadedRelationMixin
 from .models import Role
 
 
-class RoleField(Field):
+class RoleField(LoadedRelationMixin, Field):
+    loader_queryset = Role.objects.all()
+    loader_field = 'role'
 
     def to_internal_value(self, data: str) -> Role:
-        try:
-            return Role.objects.get(role=data)
-        except Role.DoesNotExist:
+        role = self.load(data)
+        if role is None:
             raise ValidationError(_('Choose existing type of user'))
+        return role
 
     def to_representation(self, value: Role) -> str:
         return value.role
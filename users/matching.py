@@ -0,0 +1,366 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from flats.models import ChessBoardFlat
+from flats.swipes import get_redis_connection
+from .models import SavedFilter, SavedFilterMatch
+
+
+# (field of SavedFilter, field of ChessBoardFlat). Empty value of the filter
+# means, that any value of announcement fits
+EQUALITY_KEYS = [
+    ('district', 'flat__district'),
+    ('micro_district', 'flat__micro_district'),
+    ('house_type', 'residential_complex__house_type'),
+    ('payment_option', 'payment_option'),
+    ('housing_condition', 'house_condition'),
+    ('room_amount', 'flat__room_amount'),
+    ('purpose', 'purpose'),
+]
+# (lower bound, upper bound, field of ChessBoardFlat)
+INTERVAL_KEYS = [
+    ('price_from', 'price_to', 'price'),
+    ('square_from', 'square_to', 'overall_square'),
+]
+
+VERSION_KEY = 'saved-filters:version'
+
+
+def normalize(value):
+    if isinstance(value, str):
+        return value.strip().lower()
+    return value
+
+
+class IntervalTree:
+    """
+    Centered interval tree. Finding all intervals, which contain a point,
+    costs O(log n + m), where m is amount of found intervals.
+    """
+
+    def __init__(self, intervals: list):
+        """
+        :param intervals: list of (low, high, id)
+        """
+        self.center = None
+        self.left = self.right = None
+        if not intervals:
+            return
+
+        points = sorted(point for low, high, _ in intervals for point in (low, high))
+        self.center = points[len(points) // 2]
+        left, right, overlapping = [], [], []
+        for interval in intervals:
+            if interval[1] < self.center:
+                left.append(interval)
+            elif interval[0] > self.center:
+                right.append(interval)
+            else:
+                overlapping.append(interval)
+
+        self.by_low = sorted(overlapping, key=lambda interval: interval[0])
+        self.by_high = sorted(overlapping, key=lambda interval: interval[1], reverse=True)
+        self.left = IntervalTree(left) if left else None
+        self.right = IntervalTree(right) if right else None
+
+    def stab(self, point) -> set:
+        """
+        :param point: number
+        :return: ids of intervals, which contain the point
+        """
+        result = set()
+        node = self
+        while node is not None and node.center is not None:
+            if point < node.center:
+                for low, _, pk in node.by_low:
+                    if low > point:
+                        break
+                    result.add(pk)
+                node = node.left
+            else:
+                for _, high, pk in node.by_high:
+                    if high < point:
+                        break
+                    result.add(pk)
+                node = node.right if point > node.center else None
+        return result
+
+
+class MatchingEngine:
+    """
+    Index over all saved filters, which finds filters matching an
+    announcement without looping over every filter. Equality criteria are
+    kept in inverted index value -> ids, ranges of price and square are kept
+    in interval trees. Candidates of the most selective criterion are
+    intersected with the rest, so cost depends on amount of matches.
+    """
+
+    def __init__(self, filters: list):
+        """
+        :param filters: dicts with fields of SavedFilter
+        """
+        self.inverted = {field: {} for field, _ in EQUALITY_KEYS}
+        self.wildcards = {field: set() for field, _ in EQUALITY_KEYS}
+        intervals = {low_field: [] for low_field, _, _ in INTERVAL_KEYS}
+
+        for saved_filter in filters:
+            pk = saved_filter.get('id')
+            for field, _ in EQUALITY_KEYS:
+                value = normalize(saved_filter.get(field))
+                if value in ('', None):
+                    self.wildcards[field].add(pk)
+                else:
+                    self.inverted[field].setdefault(value, set()).add(pk)
+            for low_field, high_field, _ in INTERVAL_KEYS:
+                # zero upper bound means, that range is not limited from above
+                high = saved_filter.get(high_field) or float('inf')
+                intervals[low_field].append((saved_filter.get(low_field) or 0, high, pk))
+
+        self.trees = {field: IntervalTree(field_intervals) for field, field_intervals in intervals.items()}
+
+    def match(self, announcement: dict) -> set:
+        """
+        :param announcement: dict with fields of ChessBoardFlat from EQUALITY_KEYS and INTERVAL_KEYS
+        :return: ids of matching saved filters
+        """
+        candidate_sets = []
+        for field, announcement_field in EQUALITY_KEYS:
+            exact = self.inverted[field].get(normalize(announcement.get(announcement_field)), set())
+            candidate_sets.append((len(exact) + len(self.wildcards[field]), exact, self.wildcards[field]))
+        candidate_sets.sort(key=lambda candidate: candidate[0])
+
+        _, exact, wildcards = candidate_sets[0]
+        result = exact | wildcards
+        for _, exact, wildcards in candidate_sets[1:]:
+            if not result:
+                return result
+            result = {pk for pk in result if pk in exact or pk in wildcards}
+
+        for low_field, _, announcement_field in INTERVAL_KEYS:
+            if not result:
+                return result
+            value = announcement.get(announcement_field)
+            if value is None:
+                return set()
+            result &= self.trees[low_field].stab(value)
+        return result
+
+
+_engine = None
+_engine_version = None
+
+
+def get_filters_version() -> int:
+    return int(get_redis_connection().get(VERSION_KEY) or 0)
+
+
+def invalidate_matching_engine() -> None:
+    """
+    Makes engines of all processes rebuild on next matching. Should be called
+    after saved filters are created or changed.
+    :return: None
+    """
+    transaction.on_commit(lambda: get_redis_connection().incr(VERSION_KEY))
+
+
+def get_matching_engine() -> MatchingEngine:
+    """
+    Returns engine cached inside the process, rebuilding it if saved
+    filters have changed since it was built.
+    :return: MatchingEngine
+    """
+    global _engine, _engine_version
+    version = get_filters_version()
+    if _engine is None or version != _engine_version:
+        filters = SavedFilter.objects.values('id', *[field for field, _ in EQUALITY_KEYS],
+                                             *[field for keys in INTERVAL_KEYS for field in keys[:2]])
+        _engine = MatchingEngine(list(filters))
+        _engine_version = version
+    return _engine
+
+
+def update_counters(changes: dict, sign: int = 1) -> None:
+    """
+    Shifts counters of saved filters. Filters with equal shift are updated by
+    one query.
+    :param changes: dict id of SavedFilter -> (shift of matches_count, shift of new_matches_count)
+    :param sign: 1 to increment, -1 to decrement
+    :return: None
+    """
+    groups = {}
+    for saved_filter_id, shift in changes.items():
+        groups.setdefault(shift, []).append(saved_filter_id)
+    for (total, new), saved_filter_ids in groups.items():
+        SavedFilter.objects.filter(id__in=saved_filter_ids).update(
+            matches_count=Greatest(F('matches_count') + sign * total, 0),
+            new_matches_count=Greatest(F('new_matches_count') + sign * new, 0)
+        )
+
+
+def match_announcements(ids: list) -> int:
+    """
+    Stores matches of approved announcements of the feed with saved filters
+    and increments counters of these filters.
+    :param ids: list of ids of ChessBoardFlat
+    :return: amount of new matches
+    """
+    engine = get_matching_engine()
+    announcements = ChessBoardFlat.objects \
+        .filter(id__in=ids, accepted=True, called_off=False) \
+        .values('id', *[field for _, field in EQUALITY_KEYS], *[keys[2] for keys in INTERVAL_KEYS])
+
+    pairs = {(saved_filter_id, announcement.get('id'))
+             for announcement in announcements for saved_filter_id in engine.match(announcement)}
+    if not pairs:
+        return 0
+
+    # engine may still contain filters deleted since it was built
+    existing = set(SavedFilter.objects
+                   .filter(id__in={saved_filter_id for saved_filter_id, _ in pairs})
+                   .values_list('id', flat=True))
+    stored = set(SavedFilterMatch.objects
+                 .filter(chessboard_flat_id__in={chessboard_flat_id for _, chessboard_flat_id in pairs})
+                 .values_list('saved_filter_id', 'chessboard_flat_id'))
+    new_pairs = [(saved_filter_id, chessboard_flat_id) for saved_filter_id, chessboard_flat_id in pairs - stored
+                 if saved_filter_id in existing]
+
+    with transaction.atomic():
+        SavedFilterMatch.objects.bulk_create(
+            [SavedFilterMatch(saved_filter_id=saved_filter_id, chessboard_flat_id=chessboard_flat_id)
+             for saved_filter_id, chessboard_flat_id in new_pairs],
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+        counter = Counter(saved_filter_id for saved_filter_id, _ in new_pairs)
+        update_counters({saved_filter_id: (amount, amount) for saved_filter_id, amount in counter.items()})
+    return len(new_pairs)
+
+
+def unmatch_announcements(ids: list) -> None:
+    """
+    Removes matches of announcements, which have left the feed, and
+    decrements counters of their saved filters. Should be called inside the
+    transaction, which removes announcements from the feed.
+    :param ids: list of ids of ChessBoardFlat
+    :return: None
+    """
+    matches = SavedFilterMatch.objects.filter(chessboard_flat_id__in=ids)
+    is_new = Q(saved_filter__last_seen_at__isnull=True) | Q(created_at__gt=F('saved_filter__last_seen_at'))
+    changes = matches \
+        .order_by() \
+        .values('saved_filter_id') \
+        .annotate(total=Count('id'), new=Count('id', filter=is_new))
+    update_counters({change.get('saved_filter_id'): (change.get('total'), change.get('new')) for change in changes},
+                    sign=-1)
+    matches.delete()
+
+
+def get_saved_filter_queryset(saved_filter: SavedFilter):
+    """
+    Translates saved filter into QuerySet of matching announcements of the
+    feed, following the same rules as MatchingEngine.
+    :param saved_filter: SavedFilter
+    :return: QuerySet
+    """
+    queryset = ChessBoardFlat.objects.filter(accepted=True, called_off=False)
+    for field, announcement_field in EQUALITY_KEYS:
+        value = getattr(saved_filter, field)
+        if isinstance(value, str) and value.strip():
+            queryset = queryset.filter(**{f'{announcement_field}__iexact': value.strip()})
+        elif value is not None and not isinstance(value, str):
+            queryset = queryset.filter(**{announcement_field: value})
+    for low_field, high_field, announcement_field in INTERVAL_KEYS:
+        queryset = queryset.filter(**{f'{announcement_field}__gte': getattr(saved_filter, low_field) or 0})
+        if getattr(saved_filter, high_field):
+            queryset = queryset.filter(**{f'{announcement_field}__lte': getattr(saved_filter, high_field)})
+    return queryset
+
+
+def match_saved_filter(saved_filter_id: int) -> int:
+    """
+    Fills matches and counters of just created saved filter with
+    announcements, which are already in the feed. They are not new for the
+    user and are not sent in digests.
+    :param saved_filter_id: int
+    :return: amount of matches
+    """
+    try:
+        saved_filter = SavedFilter.objects.get(id=saved_filter_id)
+    except SavedFilter.DoesNotExist:
+        return 0
+
+    with transaction.atomic():
+        SavedFilterMatch.objects.bulk_create(
+            [SavedFilterMatch(saved_filter_id=saved_filter_id, chessboard_flat_id=chessboard_flat_id,
+                              notified_at=timezone.now())
+             for chessboard_flat_id in get_saved_filter_queryset(saved_filter).values_list('id', flat=True)],
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+        SavedFilter.objects.filter(id=saved_filter_id).update(last_seen_at=timezone.now())
+    reconcile_saved_filter_counters(ids=[saved_filter_id])
+    return SavedFilter.objects.get(id=saved_filter_id).matches_count
+
+
+RECONCILE_BATCH_SIZE = 1000
+
+
+def reconcile_saved_filter_counters(ids: list = None, batch_size: int = RECONCILE_BATCH_SIZE) -> int:
+    """
+    Recalculates counters of saved filters from stored matches, correcting
+    drift of incremental updates. Matches of announcements, which are not
+    in the feed anymore, are removed. Filters are processed in batches by id.
+    :param ids: list of ids of SavedFilter, all if None
+    :param batch_size: int
+    :return: amount of processed filters
+    """
+    stale_matches = SavedFilterMatch.objects \
+        .filter(Q(chessboard_flat__accepted=False) | Q(chessboard_flat__called_off=True))
+    if ids is not None:
+        stale_matches = stale_matches.filter(saved_filter_id__in=ids)
+    stale_matches.delete()
+
+    def count_matches(condition: Q):
+        matches = SavedFilterMatch.objects \
+            .filter(condition, saved_filter_id=OuterRef('id')) \
+            .order_by() \
+            .values('saved_filter_id') \
+            .annotate(amount=Count('id')) \
+            .values('amount')
+        return Coalesce(Subquery(matches, output_field=IntegerField()), Value(0))
+
+    processed = 0
+    last_id = 0
+    while True:
+        queryset = SavedFilter.objects.filter(id__gt=last_id)
+        if ids is not None:
+            queryset = queryset.filter(id__in=ids)
+        batch = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not batch:
+            break
+
+        SavedFilter.objects.filter(id__in=batch).update(
+            matches_count=count_matches(Q()),
+            new_matches_count=count_matches(Q(saved_filter__last_seen_at__isnull=True)
+                                            | Q(created_at__gt=F('saved_filter__last_seen_at')))
+        )
+        processed += len(batch)
+        last_id = batch[-1]
+
+    return processed
+
+
+def mark_saved_filter_visited(saved_filter: SavedFilter) -> SavedFilter:
+    """
+    Resets amount of new matches, when user has looked through them.
+    :param saved_filter: SavedFilter
+    :return: SavedFilter
+    """
+    saved_filter.last_seen_at = timezone.now()
+    saved_filter.new_matches_count = 0
+    saved_filter.save(update_fields=['last_seen_at', 'new_matches_count'])
+    return saved_filter
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.15 on 2026-10-19 04:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flats', '0023_auto_20261019_0753'),
+        ('users', '0004_auto_20230403_1241'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedFilterMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('chessboard_flat', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='flats.chessboardflat')),
+                ('saved_filter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.savedfilter')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='savedfiltermatch',
+            constraint=models.UniqueConstraint(fields=('saved_filter', 'chessboard_flat'), name='unique_saved_filter_match'),
+        ),
+    ]
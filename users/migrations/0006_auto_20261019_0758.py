@@ -0,0 +1,22 @@
+# Generated by Django 3.2.15 on 2026-10-19 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_auto_20261019_0758'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='savedfiltermatch',
+            name='notified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='savedfiltermatch',
+            index=models.Index(condition=models.Q(('notified_at__isnull', True)), fields=['saved_filter'], name='saved_filter_match_pending_idx'),
+        ),
+    ]
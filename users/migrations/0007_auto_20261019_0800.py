@@ -0,0 +1,28 @@
+# Generated by Django 3.2.15 on 2026-10-19 05:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_auto_20261019_0758'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='savedfilter',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='savedfilter',
+            name='matches_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='savedfilter',
+            name='new_matches_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-19 05:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_auto_20261019_0800'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='pending_deletion',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 3.2.15 on 2026-10-19 05:26
+
+from django.db import migrations, models
+
+
+FILL_CONVERSATION_KEYS = """
+UPDATE users_message
+SET conversation_key = LEAST(sender_id, receiver_id)::text || ':' || GREATEST(sender_id, receiver_id)::text
+WHERE sender_id IS NOT NULL AND receiver_id IS NOT NULL;
+"""
+
+# monthly partitions are created from the first message up to two months ahead,
+# later ones are created by users.tasks.create_message_partitions
+CREATE_PARTITIONS = """
+DO $$
+DECLARE
+    month date := date_trunc('month', COALESCE((SELECT min(created_at) FROM {source}), now()))::date;
+BEGIN
+    WHILE month <= date_trunc('month', now() + interval '2 months') LOOP
+        EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF users_message FOR VALUES FROM (%L) TO (%L)',
+                       'users_message_' || to_char(month, 'YYYY_MM'), month, month + interval '1 month');
+        month := month + interval '1 month';
+    END LOOP;
+END $$;
+"""
+
+PARTITION_MESSAGES = """
+ALTER TABLE users_message RENAME TO users_message_unpartitioned;
+
+CREATE TABLE users_message (LIKE users_message_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at);
+ALTER SEQUENCE users_message_id_seq OWNED BY users_message.id;
+ALTER TABLE users_message ADD CONSTRAINT users_message_pkey_partitioned PRIMARY KEY (id, created_at);
+ALTER TABLE users_message ADD CONSTRAINT users_message_sender_id_fk_users_user_id
+    FOREIGN KEY (sender_id) REFERENCES users_user (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE users_message ADD CONSTRAINT users_message_receiver_id_fk_users_user_id
+    FOREIGN KEY (receiver_id) REFERENCES users_user (id) DEFERRABLE INITIALLY DEFERRED;
+CREATE INDEX users_message_sender_id_idx ON users_message (sender_id);
+CREATE INDEX users_message_receiver_id_idx ON users_message (receiver_id);
+CREATE INDEX message_conversation_idx ON users_message (conversation_key, created_at, id);
+CREATE TABLE users_message_default PARTITION OF users_message DEFAULT;
+""" + CREATE_PARTITIONS.format(source='users_message_unpartitioned') + """
+INSERT INTO users_message SELECT * FROM users_message_unpartitioned;
+DROP TABLE users_message_unpartitioned;
+"""
+
+UNPARTITION_MESSAGES = """
+ALTER TABLE users_message RENAME TO users_message_partitioned;
+DROP INDEX users_message_sender_id_idx, users_message_receiver_id_idx;
+
+CREATE TABLE users_message (LIKE users_message_partitioned INCLUDING DEFAULTS);
+ALTER SEQUENCE users_message_id_seq OWNED BY users_message.id;
+ALTER TABLE users_message ADD PRIMARY KEY (id);
+ALTER TABLE users_message ADD CONSTRAINT users_message_sender_id_fk_users_user_id
+    FOREIGN KEY (sender_id) REFERENCES users_user (id) DEFERRABLE INITIALLY DEFERRED;
+ALTER TABLE users_message ADD CONSTRAINT users_message_receiver_id_fk_users_user_id
+    FOREIGN KEY (receiver_id) REFERENCES users_user (id) DEFERRABLE INITIALLY DEFERRED;
+CREATE INDEX users_message_sender_id_idx ON users_message (sender_id);
+CREATE INDEX users_message_receiver_id_idx ON users_message (receiver_id);
+INSERT INTO users_message SELECT * FROM users_message_partitioned;
+DROP TABLE users_message_partitioned;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_user_pending_deletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='conversation_key',
+            field=models.CharField(default='', max_length=41),
+        ),
+        migrations.RunSQL(FILL_CONVERSATION_KEYS, migrations.RunSQL.noop),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='message',
+                    index=models.Index(fields=['conversation_key', 'created_at', 'id'],
+                                       name='message_conversation_idx'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(PARTITION_MESSAGES, UNPARTITION_MESSAGES),
+            ],
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.15 on 2026-10-19 05:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# conversations of existing messages start without unread ones, as messages have no read state
+FILL_CONVERSATIONS = """
+INSERT INTO users_conversation (key, user_id, manager_id, last_message_id, last_message_text, last_message_at,
+                                user_unread, manager_unread, created_at)
+SELECT DISTINCT ON (message.conversation_key)
+       message.conversation_key,
+       CASE WHEN role.role = 'user' THEN message.sender_id ELSE message.receiver_id END,
+       CASE WHEN role.role = 'user' THEN message.receiver_id ELSE message.sender_id END,
+       message.id, message.text, message.created_at, 0, 0, now()
+FROM users_message message
+JOIN users_user sender ON sender.id = message.sender_id
+JOIN users_role role ON role.id = sender.role_id
+WHERE message.receiver_id IS NOT NULL AND message.conversation_key <> ''
+ORDER BY message.conversation_key, message.created_at DESC, message.id DESC;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_message_partitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=41, unique=True)),
+                ('last_message_text', models.TextField(blank=True, default='')),
+                ('last_message_at', models.DateTimeField()),
+                ('user_unread', models.IntegerField(default=0)),
+                ('manager_unread', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_message', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='users.message')),
+                ('manager', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='manager_conversations', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='user_conversations', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['user', '-last_message_at', '-id'], name='conversation_user_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['manager', '-last_message_at', '-id'], name='conversation_manager_inbox_idx'),
+        ),
+        migrations.RunSQL(FILL_CONVERSATIONS, migrations.RunSQL.noop),
+    ]
@@ -20,6 +20,10 @@ class Role(models.Model):
 
 class UserManager(BaseUserManager):
 
+    def get_queryset(self):
+        # users pending deletion are purged by background task, until then they are hidden
+        return super().get_queryset().filter(pending_deletion=False)
+
     def create_user(self, email, password, **extra_fields):
         if not email:
             raise ValueError(_('The Email must be set.'))
@@ -56,6 +60,7 @@ class User(AbstractBaseUser):
 
     notifications = models.CharField(max_length=15, choices=NotificationChoices.choices, default='me')
     turn_calls_to_agent = models.BooleanField(default=False)
+    pending_deletion = models.BooleanField(default=False)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['password', 'name', 'surname']
@@ -64,6 +69,7 @@ class User(AbstractBaseUser):
         return self.email
 
     objects = UserManager()
+    all_objects = models.Manager()
 
 
 class Notary(models.Model):
@@ -91,10 +97,58 @@ class UserSubscription(models.Model):
 
 
 class Message(models.Model):
+    """
+    Table is partitioned by month of created_at, see users.partitions.
+    Primary key of partitioned table is (id, created_at), ids are still
+    unique as they come from one sequence.
+    """
     sender = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='sender', blank=True, null=True)
     receiver = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='receiver', blank=True, null=True)
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # '<smaller id>:<bigger id>' of sender and receiver, the same for both directions of the conversation
+    conversation_key = models.CharField(max_length=41, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['conversation_key', 'created_at', 'id'], name='message_conversation_idx'),
+        ]
+
+    @staticmethod
+    def get_conversation_key(first_user_id: int, second_user_id: int) -> str:
+        return ':'.join(str(user_id) for user_id in sorted((first_user_id, second_user_id)))
+
+    def save(self, *args, **kwargs):
+        if not self.conversation_key and self.sender_id and self.receiver_id:
+            self.conversation_key = self.get_conversation_key(self.sender_id, self.receiver_id)
+        return super().save(*args, **kwargs)
+
+
+class Conversation(models.Model):
+    """
+    Last message and unread counters of conversation between user and
+    manager (or admin). Row is updated in the same transaction with every
+    sent message, so inbox is read without aggregating messages.
+    """
+    key = models.CharField(max_length=41, unique=True)     # conversation_key of messages
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='user_conversations',
+                             blank=True, null=True)
+    manager = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='manager_conversations',
+                                blank=True, null=True)
+    # not constrained, as primary key of partitioned messages is (id, created_at)
+    last_message = models.ForeignKey(Message, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+                                     related_name='+', blank=True, null=True)
+    last_message_text = models.TextField(blank=True, default='')
+    last_message_at = models.DateTimeField()
+    user_unread = models.IntegerField(default=0)
+    manager_unread = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-last_message_at', '-id'], name='conversation_user_inbox_idx'),
+            models.Index(fields=['manager', '-last_message_at', '-id'], name='conversation_manager_inbox_idx'),
+        ]
 
 
 class SavedFilter(models.Model):
@@ -133,3 +187,24 @@ class SavedFilter(models.Model):
         good = ('good', 'Задовільний')
 
     housing_condition = models.CharField(max_length=30, choices=HouseCondition.choices)
+
+    # counters of matching announcements of the feed, maintained by users.matching
+    matches_count = models.IntegerField(default=0)
+    new_matches_count = models.IntegerField(default=0)
+    last_seen_at = models.DateTimeField(blank=True, null=True)
+
+
+class SavedFilterMatch(models.Model):
+    saved_filter = models.ForeignKey(SavedFilter, on_delete=models.CASCADE)
+    chessboard_flat = models.ForeignKey('flats.ChessBoardFlat', on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    notified_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['saved_filter', 'chessboard_flat'], name='unique_saved_filter_match')
+        ]
+        indexes = [
+            models.Index(fields=['saved_filter'], name='saved_filter_match_pending_idx',
+                         condition=models.Q(notified_at__isnull=True))
+        ]
@@ -0,0 +1,64 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Message
+
+
+MESSAGE_PARTITIONS_AHEAD = 2    # months, for which partitions exist in advance
+
+
+def get_month_start(year: int, month: int) -> datetime:
+    # months outside 1..12 are carried into years
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return datetime(year, month, 1, tzinfo=dt_timezone.utc)
+
+
+def get_message_partitions(now=None, ahead: int = MESSAGE_PARTITIONS_AHEAD) -> list:
+    """
+    :param now: datetime
+    :param ahead: amount of months after the current one
+    :return: list of (name, start, end) of monthly partitions from the current month
+    """
+    now = (now or timezone.now()).astimezone(dt_timezone.utc)
+    partitions = []
+    for offset in range(ahead + 1):
+        start = get_month_start(now.year, now.month + offset)
+        end = get_month_start(now.year, now.month + offset + 1)
+        partitions.append((f'{Message._meta.db_table}_{start:%Y_%m}', start, end))
+    return partitions
+
+
+def create_message_partitions(now=None, ahead: int = MESSAGE_PARTITIONS_AHEAD) -> list:
+    """
+    Creates partitions of messages for the current and next months, if they
+    do not exist yet. Should run before the month begins, otherwise its
+    messages fall into the default partition. Such messages are moved to
+    the new partition, as postgres does not create partition, whose rows
+    are in the default one.
+    :return: list of names of partitions
+    """
+    partitions = get_message_partitions(now, ahead)
+    table = connection.ops.quote_name(Message._meta.db_table)
+    default = connection.ops.quote_name(f'{Message._meta.db_table}_default')
+    in_range = 'created_at >= %s AND created_at < %s'
+    with transaction.atomic(), connection.cursor() as cursor:
+        for name, start, end in partitions:
+            cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [name])
+            if cursor.fetchone()[0]:
+                continue
+
+            cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_range})', [start, end])
+            misplaced = cursor.fetchone()[0]
+            if misplaced:
+                cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {default}')
+            cursor.execute(
+                f'CREATE TABLE {connection.ops.quote_name(name)} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)',
+                [start, end]
+            )
+            if misplaced:
+                cursor.execute(f'INSERT INTO {table} SELECT * FROM {default} WHERE {in_range}', [start, end])
+                cursor.execute(f'DELETE FROM {default} WHERE {in_range}', [start, end])
+                cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT')
+    return [name for name, _, _ in partitions]
@@ -1,12 +1,14 @@
 from datetime import timedelta
 
 from allauth.account.models import EmailAddress
+from django.db import transaction
 from django.utils import timezone
 from django.utils.encoding import force_str
 from rest_framework import serializers, status
 from rest_framework.exceptions import ValidationError
 from rest_framework.serializers import ModelSerializer
 from rest_framework.serializers import CharField
+from rest_framework.validators import UniqueValidator
 
 from django.utils.translation import gettext_lazy as _
 
@@ -14,8 +16,11 @@ from dj_rest_auth.serializers import LoginSerializer, PasswordResetConfirmSerial
 
 from api_swipe import settings
 from users.fields import RoleField
+from users.conversations import record_message
 from users.forms import CustomSetPasswordForm
-from users.models import User, Role, Notary, Subscription, UserSubscription, SavedFilter, Message
+from users.matching import invalidate_matching_engine
+from users.tasks import match_new_saved_filter
+from users.models import User, Role, Notary, Subscription, UserSubscription, SavedFilter, Message, Conversation
 
 
 class AuthLoginSerializer(LoginSerializer):
@@ -36,6 +41,7 @@ class AuthRegistrationSerializer(ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'email', 'password', 'name', 'surname']
+        extra_kwargs = {'email': {'validators': [UniqueValidator(queryset=User.all_objects.all())]}}
 
     def save(self, *args, **kwargs):
         return self.create(self.validated_data)
@@ -86,12 +92,13 @@ class UserSerializer(ModelSerializer):
     class Meta:
         model = User
         exclude = ['is_active', 'is_blocked', 'last_login']
+        read_only_fields = ['pending_deletion']
         extra_kwargs = {
             'name': {'required': False},
             'surname': {'required': False},
             'logo': {'required': False},
             'phone': {'required': False},
-            'email': {'required': False},
+            'email': {'required': False, 'validators': [UniqueValidator(queryset=User.all_objects.all())]},
             'turn_calls_to_agent': {'required': False}
         }
 
@@ -127,6 +134,8 @@ class UserAdminSerializer(ModelSerializer):
     class Meta:
         model = User
         fields = '__all__'
+        read_only_fields = ['pending_deletion']
+        extra_kwargs = {'email': {'validators': [UniqueValidator(queryset=User.all_objects.all())]}}
 
     def create(self, validated_data):
         user = User.objects.create_user(**validated_data)
@@ -208,12 +217,15 @@ class FilterSerializer(ModelSerializer):
     class Meta:
         model = SavedFilter
         exclude = ['user']
+        read_only_fields = ['matches_count', 'new_matches_count', 'last_seen_at']
 
     def create(self, validated_data):
         instance = SavedFilter.objects.create(
             **self.context,
             **validated_data
         )
+        invalidate_matching_engine()
+        transaction.on_commit(lambda: match_new_saved_filter.delay(instance.id))
 
         return instance
 
@@ -244,10 +256,12 @@ class MessageSerializer(ModelSerializer):
         return attrs
 
     def create(self, validated_data):
-        instance = Message.objects.create(
-            **self.context,
-            **validated_data
-        )
+        with transaction.atomic():
+            instance = Message.objects.create(
+                **self.context,
+                **validated_data
+            )
+            record_message(instance)
 
         return instance
 
@@ -259,3 +273,20 @@ class MessageListSerializer(ModelSerializer):
     class Meta:
         model = Message
         fields = '__all__'
+
+
+class ConversationSerializer(ModelSerializer):
+
+    class Meta:
+        model = Conversation
+        fields = ['id', 'last_message', 'last_message_text', 'last_message_at']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if self.context.get('side') == 'manager':
+            interlocutor, unread = instance.user, instance.manager_unread
+        else:
+            interlocutor, unread = instance.manager, instance.user_unread
+        data['interlocutor'] = AuthRegistrationSerializer(instance=interlocutor).data if interlocutor else None
+        data['unread'] = unread
+        return data
@@ -5,7 +5,10 @@ from django.core.mail import EmailMessage
 from dateutil.relativedelta import relativedelta
 
 from api_swipe.celery import app
+from users.digests import send_saved_filter_digests
+from users.matching import match_announcements, match_saved_filter, reconcile_saved_filter_counters
 from users.models import UserSubscription
+from users.partitions import create_message_partitions
 
 
 @app.task
@@ -25,3 +28,28 @@ def deactivate_subscription():
     email.send()
 
     expired_subscriptions.delete()
+
+
+@app.task
+def match_saved_filters(chessboard_flat_ids: list):
+    return match_announcements(chessboard_flat_ids)
+
+
+@app.task
+def match_new_saved_filter(saved_filter_id: int):
+    return match_saved_filter(saved_filter_id)
+
+
+@app.task
+def reconcile_saved_filters():
+    return reconcile_saved_filter_counters()
+
+
+@app.task
+def send_saved_filter_digest_emails():
+    return send_saved_filter_digests()
+
+
+@app.task
+def create_upcoming_message_partitions():
+    return create_message_partitions()
@@ -1,4 +1,8 @@
+from datetime import datetime, timezone as dt_timezone
+
 import pytest
+from django.core import mail
+from django.core.mail import get_connection
 from pytest_django.fixtures import _django_db_helper
 
 from allauth.account.models import EmailAddress
@@ -6,7 +10,12 @@ from rest_framework import status
 from rest_framework.test import APIClient
 from faker import Faker
 
-from users.models import User, Role
+from flats.deletion import purge_user
+from flats.models import ChessBoardFlat, Gallery, ResidentialComplex
+from users.digests import DIGEST_MAX_ANNOUNCEMENTS, build_digest, send_saved_filter_digests
+from users.matching import IntervalTree, MatchingEngine, match_announcements, reconcile_saved_filter_counters
+from users.models import Conversation, Message, User, Role, SavedFilter, SavedFilterMatch
+from users.partitions import get_message_partitions
 
 
 faker = Faker('uk_UA')
@@ -82,6 +91,60 @@ def init_scripts():
         )
 
 
+def create_announcement(creator=None) -> ChessBoardFlat:
+    """
+    Creates accepted announcement in RC of the builder, creating RC first if it is absent.
+    :param creator: User, the default user if not given
+    :return: ChessBoardFlat
+    """
+    owner = User.objects.get(email='simplebuilder@gmail.com')
+    residential_complex = ResidentialComplex.objects.filter(owner=owner).first()
+    if residential_complex is None:
+        residential_complex = ResidentialComplex.objects.create(
+            owner=owner,
+            name=faker.company(),
+            address=faker.address(),
+            map_code='<div></div>',
+            description=faker.catch_phrase(),
+            photo='residential_complex/photos/1.jpg',
+            price_for_meter=40,
+            min_price=50000,
+            house_type='many-floors',
+            house_class='common',
+            building_technology='bricks',
+            territory_type='closed',
+            ceiling_altitude=3,
+            heating='centralized',
+            sewage='centralized',
+            water_supply='centralized',
+            arrangement='justice',
+            payment='parent-capital',
+            purpose='living-building',
+            sum_in_contract='full',
+            gallery=Gallery.objects.create()
+        )
+    return ChessBoardFlat.objects.create(
+        residential_complex=residential_complex,
+        gallery=Gallery.objects.create(),
+        accepted=True,
+        address=faker.address(),
+        purpose='apartments',
+        room_amount=2,
+        planning='studio',
+        house_condition='good',
+        overall_square=50,
+        kitchen_square=10,
+        heating_type='gas',
+        payment_option='parent-capital',
+        agent_commission=0,
+        communication_method='phone',
+        description=faker.catch_phrase(),
+        price=1500,
+        main_photo='chessboard/main_photos/1.jpg',
+        creator=creator or User.objects.get(email='oleksijkolotilo63@gmail.com')
+    )
+
+
 def login_user(role=None):
     if role == 'admin':
         response = client.post(path='/api/v1/users/auth/login/',
@@ -166,9 +229,12 @@ class TestingUsers:
                                 data={
                                     'name': faker.first_name(),
                                     'surname': faker.last_name(),
-                                    'turn_calls_to_agent': True
+                                    'turn_calls_to_agent': True,
+                                    'pending_deletion': True
                                 })
         assert response.status_code == status.HTTP_200_OK
+        # only account deletion marks the user for purge
+        assert not User.all_objects.get(email='oleksijkolotilo63@gmail.com').pending_deletion
 
     def test_creation_and_deletion_user(self):
         client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("admin").get("access_token")}')
@@ -187,7 +253,147 @@ class TestingUsers:
         response = client.delete(path=f'/api/v1/users/users/{user_id}/')
         assert response.status_code == status.HTTP_204_NO_CONTENT
 
+    def test_saved_filter_digests(self):
+        announcement = create_announcement()
+        saved_filter = SavedFilter.objects.create(user=User.objects.get(email='oleksijkolotilo63@gmail.com'),
+                                                  house_type='', house_status='rented', district='',
+                                                  micro_district='', price_from=0, price_to=0,
+                                                  square_from=0, square_to=0,
+                                                  payment_option=announcement.payment_option,
+                                                  housing_condition=announcement.house_condition)
+        assert match_announcements([announcement.id]) >= 1
+        assert SavedFilterMatch.objects.filter(saved_filter=saved_filter, chessboard_flat=announcement).exists()
+
+        mail.outbox = []
+        assert send_saved_filter_digests(messages_per_second=1000) == 1
+        assert mail.outbox[0].to == [saved_filter.user.email]
+        assert not SavedFilterMatch.objects.filter(saved_filter=saved_filter, notified_at__isnull=True).exists()
+        assert send_saved_filter_digests(messages_per_second=1000) == 0
+
+    def test_saved_filter_counters(self):
+        announcement = create_announcement()
+        saved_filter = SavedFilter.objects.create(user=User.objects.get(email='oleksijkolotilo63@gmail.com'),
+                                                  house_type='', house_status='rented', district='',
+                                                  micro_district='', price_from=0, price_to=0,
+                                                  square_from=0, square_to=0,
+                                                  payment_option=announcement.payment_option,
+                                                  housing_condition=announcement.house_condition)
+        match_announcements([announcement.id])
+        SavedFilter.objects.filter(id=saved_filter.id).update(matches_count=100, new_matches_count=100)
+        assert reconcile_saved_filter_counters(ids=[saved_filter.id]) == 1
+        saved_filter.refresh_from_db()
+        assert saved_filter.matches_count == SavedFilterMatch.objects.filter(saved_filter=saved_filter).count() >= 1
+
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user().get("access_token")}')
+        response = client.post(f'/api/v1/users/saved-filters/{saved_filter.id}/visit/')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data.get('new_matches_count') == 0
+
+    def test_conversations_inbox(self):
+        user = User.objects.get(email='oleksijkolotilo63@gmail.com')
+        admin = User.objects.get(email='superuser@gmail.com')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("admin").get("access_token")}')
+        for text in ('Перше', 'Друге'):
+            client.post(path=f'/api/v1/users/messages/{user.id}/manager/send/', data={'text': text}, format='json')
+
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user().get("access_token")}')
+        response = client.get(path='/api/v1/users/conversations/')
+        assert response.status_code == status.HTTP_200_OK
+        conversation = response.data.get('results')[0]
+        assert conversation.get('last_message_text') == 'Друге'
+        assert conversation.get('unread') == 2
+        assert conversation.get('interlocutor').get('id') == admin.id
+
+        client.get(path=f'/api/v1/users/messages/{admin.id}/')
+        client.post(path=f'/api/v1/users/messages/{admin.id}/send/', data={'text': 'Відповідь'}, format='json')
+        response = client.get(path='/api/v1/users/conversations/')
+        assert response.data.get('results')[0].get('unread') == 0
+        assert Conversation.objects.get(key=Message.get_conversation_key(user.id, admin.id)).manager_unread == 1
+
     def test_deletion_self_account(self):
         client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user().get("access_token")}')
         response = client.delete(path='/api/v1/users/users/me/delete/')
         assert response.status_code == status.HTTP_200_OK
+
+    def test_purge_deleted_user(self):
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_user("admin").get("access_token")}')
+        response = client.post(path='/api/v1/users/users/',
+                               data={
+                                   'password': '123qweasd',
+                                   'email': 'purged_user@gmail.com',
+                                   'role': 'user',
+                                   'name': 'Purged',
+                                   'surname': 'User'
+                               },
+                               format='json')
+        user_id = response.data.get('id')
+        announcement = create_announcement(creator=User.objects.get(id=user_id))
+        client.delete(path=f'/api/v1/users/users/{user_id}/')
+
+        assert not User.objects.filter(id=user_id).exists()
+        assert User.all_objects.filter(id=user_id, pending_deletion=True).exists()
+        assert not ChessBoardFlat.objects.filter(id=announcement.id).exists()
+
+        # email stays taken until the account is purged
+        response = client.post(path='/api/v1/users/users/',
+                               data={
+                                   'password': '123qweasd',
+                                   'email': 'purged_user@gmail.com',
+                                   'role': 'user',
+                                   'name': 'Purged',
+                                   'surname': 'User'
+                               },
+                               format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert purge_user(user_id)
+        assert not User.all_objects.filter(id=user_id).exists()
+        assert not ChessBoardFlat.all_objects.filter(id=announcement.id).exists()
+        assert not purge_user(user_id)
+
+
+def test_interval_tree_stab():
+    tree = IntervalTree([(0, 10, 1), (5, 15, 2), (20, 30, 3), (12, 12, 4)])
+    assert tree.stab(7) == {1, 2}
+    assert tree.stab(12) == {2, 4}
+    assert tree.stab(17) == set()
+    assert tree.stab(30) == {3}
+
+
+def test_saved_filters_matching():
+    base = {'district': '', 'micro_district': '', 'house_type': '', 'payment_option': 'parent-capital',
+            'housing_condition': 'good', 'room_amount': None, 'purpose': None,
+            'price_from': 0, 'price_to': 0, 'square_from': 0, 'square_to': 0}
+    engine = MatchingEngine([
+        {**base, 'id': 1},
+        {**base, 'id': 2, 'district': 'Приморський', 'price_from': 1000, 'price_to': 2000},
+        {**base, 'id': 3, 'district': 'Київський'},
+        {**base, 'id': 4, 'square_from': 60, 'square_to': 80},
+        {**base, 'id': 5, 'housing_condition': 'repair-required'},
+    ])
+    announcement = {'flat__district': 'приморський ', 'flat__micro_district': 'Центр',
+                    'residential_complex__house_type': 'many-floors', 'payment_option': 'parent-capital',
+                    'house_condition': 'good', 'flat__room_amount': 2, 'purpose': 'apartments',
+                    'price': 1500, 'overall_square': 50}
+    assert engine.match(announcement) == {1, 2}
+    assert engine.match({**announcement, 'price': 2500, 'overall_square': 70}) == {1, 4}
+
+
+def test_saved_filter_digest_rendering():
+    announcements = [{'address': f'Address {number}', 'price': 1000, 'room_amount': 2, 'overall_square': 50}
+                     for number in range(DIGEST_MAX_ANNOUNCEMENTS + 5)]
+    connection = get_connection('django.core.mail.backends.locmem.EmailBackend')
+    connection.send_messages([build_digest(User(name='Test', email='digest@gmail.com'), announcements)])
+
+    assert len(mail.outbox) == 1
+    assert mail.outbox[0].to == ['digest@gmail.com']
+    assert 'Address 0' in mail.outbox[0].body
+    assert f'Address {DIGEST_MAX_ANNOUNCEMENTS}' not in mail.outbox[0].body
+
+
+def test_message_partitions():
+    partitions = get_message_partitions(now=datetime(2026, 11, 20, tzinfo=dt_timezone.utc), ahead=2)
+    assert [name for name, _, _ in partitions] == ['users_message_2026_11', 'users_message_2026_12',
+                                                   'users_message_2027_01']
+    assert partitions[-1][1:] == (datetime(2027, 1, 1, tzinfo=dt_timezone.utc),
+                                  datetime(2027, 2, 1, tzinfo=dt_timezone.utc))
+    assert Message.get_conversation_key(12, 3) == Message.get_conversation_key(3, 12) == '3:12'
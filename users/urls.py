@@ -16,6 +16,7 @@ router.register(r'subscriptions', SubscriptionAPIViewSet, basename='subscription
 router.register(r'my/subscription', UserSubscriptionAPIViewSet, basename='user-subscription')
 router.register(r'saved-filters', FilterAPIViewSet, basename='saved-filters')
 router.register(r'messages', MessageAPIViewSet, basename='messages')
+router.register(r'conversations', ConversationAPIViewSet, basename='conversations')
 
 urlpatterns = [
     path('auth/login/', LoginView.as_view(), name='account_login'),
@@ -1,3 +1,4 @@
+from django.db import transaction
 from django.db.models import Q
 from django.views.generic.base import TemplateResponseMixin, View
 from django.utils.translation import gettext_lazy as _
@@ -10,11 +11,15 @@ from rest_framework.permissions import IsAuthenticated
 
 from dj_rest_auth.views import PasswordResetConfirmView
 
-from drf_spectacular.utils import extend_schema, inline_serializer
+from drf_spectacular.utils import extend_schema, inline_serializer, OpenApiParameter
 
 from drf_psq import PsqMixin, Rule
 
-from flats.paginators import CustomPageNumberPagination
+from flats.deletion import mark_for_deletion
+from flats.paginators import ConversationCursorPagination, CustomPageNumberPagination, MessageCursorPagination
+from flats.tasks import purge_deleted_user
+from .conversations import get_side, mark_conversation_read, refresh_last_message
+from .matching import mark_saved_filter_visited
 from .permissions import CustomIsAuthenticated
 from .serializers import *
 from flats.permissions import IsAdminPermission, IsManagerPermission, IsUserPermission, IsOwnerPermission
@@ -107,15 +112,22 @@ class UserAPIViewSet(PsqMixin,
             return Response(data=serializer.data, status=status.HTTP_200_OK)
         return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def delete_user(user: User) -> None:
+        """
+        Hides user at once, the account with all its data is purged by
+        background task.
+        """
+        with transaction.atomic():
+            mark_for_deletion(user)
+            transaction.on_commit(lambda: purge_deleted_user.delay(user.id))
+
     def destroy(self, request, *args, **kwargs):
         user = self.get_object()
         if user.email == 'superuser@gmail.com':
             return Response({'detail': _('Ви не можете видалити адміністратора.')}, status=status.HTTP_403_FORBIDDEN)
-        try:
-            user.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        except Exception as e:
-            return Response(data={'detail': _('Щось пішло не так.')}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.delete_user(user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @extend_schema(
         request={},
@@ -182,13 +194,10 @@ class UserAPIViewSet(PsqMixin,
         user = request.user
         if user.email == 'superuser@gmail.com':
             return Response({'detail': _('Ви не можете видалити адміністратора.')}, status=status.HTTP_403_FORBIDDEN)
-        try:
-            user.delete()
-            response = Response(data={'detail': _('Your account successfully deleted')}, status=status.HTTP_200_OK)
-            response.delete_cookie('access_token')
-            response.delete_cookie('refresh_token')
-        except Exception as e:
-            return Response(data={'detail': _('Щось пішло не так.')}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.delete_user(user)
+        response = Response(data={'detail': _('Your account successfully deleted')}, status=status.HTTP_200_OK)
+        response.delete_cookie('access_token')
+        response.delete_cookie('refresh_token')
         return response
 
     @action(methods=['GET'], detail=False, url_path='managers')
@@ -309,7 +318,7 @@ class FilterAPIViewSet(PsqMixin,
     pagination_class = CustomPageNumberPagination
 
     psq_rules = {
-        ('list', 'create', 'destroy'): [
+        ('list', 'create', 'destroy', 'visit'): [
             Rule([IsUserPermission, IsOwnerPermission])
         ]
     }
@@ -330,12 +339,24 @@ class FilterAPIViewSet(PsqMixin,
             return Response(data=serializer.data, status=status.HTTP_200_OK)
         return Response(data=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(request=None)
+    @action(methods=['POST'], detail=True, url_path='visit')
+    def visit(self, request, *args, **kwargs):
+        """
+        Marks matches of saved filter as seen, resetting amount of new ones.
+        """
+        saved_filter = self.get_object()
+        self.check_object_permissions(request, saved_filter)
+        serializer = self.get_serializer(instance=mark_saved_filter_visited(saved_filter))
+        return Response(data=serializer.data, status=status.HTTP_200_OK)
+
 
 @extend_schema(tags=['Messages'])
 class MessageAPIViewSet(PsqMixin,
                         GenericViewSet):
 
     serializer_class = MessageSerializer
+    pagination_class = MessageCursorPagination
 
     psq_rules = {
         'send_to_manager': [
@@ -353,19 +374,18 @@ class MessageAPIViewSet(PsqMixin,
         pass
 
     def get_queryset(self):
-        filtering_condition = None
-
+        """
+        :return: messages of conversation of current user with the user from url
+        """
         if self.request.user.role.role in ['admin', 'manager']:
-            filtering_condition = Q(receiver=self.request.user, sender=self.get_user_object())
-            filtering_condition.add(Q(receiver=self.get_user_object(), sender=self.request.user), Q.OR)
+            interlocutor = self.get_user_object()
+        else:
+            interlocutor = self.get_manager_object()
 
-        elif self.request.user.role.role == 'user':
-            filtering_condition = Q(receiver=self.request.user, sender=self.get_manager_object())
-            filtering_condition.add(Q(receiver=self.get_manager_object(), sender=self.request.user), Q.OR)
-
-        queryset = Message.objects \
-            .filter(filtering_condition).order_by('created_at')
-        return self.paginate_queryset(queryset)
+        self.conversation_key = Message.get_conversation_key(self.request.user.id, interlocutor.id)
+        return Message.objects \
+            .select_related('sender', 'receiver') \
+            .filter(conversation_key=self.conversation_key)
 
     def get_manager_object(self):
         try:
@@ -379,8 +399,21 @@ class MessageAPIViewSet(PsqMixin,
         except User.DoesNotExist:
             raise ValidationError({'detail': _('Користувача не існує.')})
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='cursor', type=str, description='Cursor of the page from next or previous link'),
+            OpenApiParameter(name='page_size', type=int, description='Amount of messages, up to 100')
+        ]
+    )
     def retrieve(self, request, *args, **kwargs):
-        serializer = self.get_serializer(instance=self.get_queryset(), many=True)
+        """
+        Returns messages of the conversation from the newest to older ones.
+        Reading the first page marks the conversation as read.
+        """
+        queryset = self.get_queryset()
+        if not request.query_params.get(self.paginator.cursor_query_param):
+            mark_conversation_read(self.conversation_key, get_side(request.user))
+        serializer = self.get_serializer(instance=self.paginate_queryset(queryset), many=True)
         return self.get_paginated_response(serializer.data)
 
     def get_message(self):
@@ -411,5 +444,45 @@ class MessageAPIViewSet(PsqMixin,
     @action(methods=['DELETE'], detail=True, url_path='delete')
     def delete_message(self, request, *args, **kwargs):
         obj = self.get_message()
-        obj.delete()
+        with transaction.atomic():
+            deleted_id = obj.id
+            obj.delete()
+            refresh_last_message(obj.conversation_key, deleted_id)
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@extend_schema(tags=['Messages'])
+class ConversationAPIViewSet(PsqMixin,
+                             GenericViewSet):
+
+    serializer_class = ConversationSerializer
+    pagination_class = ConversationCursorPagination
+
+    psq_rules = {
+        ('list',): [
+            Rule([IsManagerPermission | IsAdminPermission | IsUserPermission])
+        ]
+    }
+
+    def get_queryset(self):
+        """
+        :return: conversations of current user, read by index of its side
+        """
+        return Conversation.objects \
+            .select_related('user', 'manager') \
+            .filter(**{get_side(self.request.user): self.request.user})
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='cursor', type=str, description='Cursor of the page from next or previous link'),
+            OpenApiParameter(name='page_size', type=int, description='Amount of conversations, up to 100')
+        ]
+    )
+    def list(self, request, *args, **kwargs):
+        """
+        Inbox: conversations with last message and amount of unread messages,
+        from the most recently active one.
+        """
+        serializer = self.get_serializer(instance=self.paginate_queryset(self.get_queryset()), many=True,
+                                         context={'side': get_side(request.user)})
+        return self.get_paginated_response(serializer.data)